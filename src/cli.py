@@ -0,0 +1,211 @@
+"""cli.py: runs analyses from the command line or from a job file, without asking for any input, so many reports can be rendered in one process"""
+__author__ = "Anthony Rubick"
+
+import argparse
+import json
+import os
+import sys
+from contextlib import nullcontext
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List
+
+from data_profiler import Profiler
+from data_store import TimeSeriesStore
+from data_tail import Tail
+from definitions import ROOT_DIR, Configs, Data_Sensor_Type
+from wrapper import Wrapper
+
+#where reports are rendered to if neither the job nor the command line says otherwise
+DEFAULT_OUTPUT_DIR = os.path.join(ROOT_DIR, "reports")
+
+## job files are JSON, either a list of jobs or an object with a list of "jobs" and "defaults" that apply to every job, eg:
+## {
+##     "defaults": {"output_dir": "reports", "file_format": "png"},
+##     "jobs": [
+##         {"config": "almond", "start": "2022-04-01", "end": "2022-06-10", "sap": 2, "lux": 1},
+##         {"config": "pistachio", "start": "2022-07-28", "end": "2022-08-01", "sap": 1, "weather": 2, "lux": 1, "sync": true}
+##     ]
+## }
+## dates without a time start at 00:00:00 (start) or end at 23:59:59 (end), like the dates entered in main.py
+JOB_KEYS = ["config", "start", "end", "sap", "weather", "lux", "output_dir", "file_format", "downsample", "sync"]
+
+def parse_date(text:str, end_of_day:bool = False) -> datetime:
+    """parse an ISO 8601 date (and optionally time), if no time is given it's the start of the day, or the last second of it if end_of_day is true
+
+    raises RuntimeError: if text isn't a valid date"""
+    try:
+        date = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        raise RuntimeError("`{}` is not a valid date, expected YYYY-MM-DD or YYYY-MM-DDTHH:MM".format(text))
+    if end_of_day and len(text) <= len("YYYY-MM-DD"):
+        date = datetime.combine(date.date(), time(hour=23, minute=59, second=59))
+    return date
+
+def parse_config(name:str) -> Configs:
+    """the config with the given name (case insensitive)
+
+    raises RuntimeError: if there is no such config"""
+    try:
+        return Configs[str(name).upper()]
+    except KeyError:
+        raise RuntimeError("config `{}` not found, available configs are {}".format(name, [config.name.lower() for config in Configs]))
+
+def load_jobs(file_path:str) -> List[Dict[str, Any]]:
+    """read the jobs in a job file, with the file's defaults filled in
+
+    raises OSError: if the file can't be read
+    raises RuntimeError: if the file isn't a valid job file"""
+    with open(file_path, mode='r', encoding='utf-8') as jobfile:
+        try:
+            spec = json.load(jobfile)
+        except ValueError as e:
+            raise RuntimeError("job file {} is not valid JSON: {}".format(file_path, e))
+    if isinstance(spec, list):
+        spec = {"jobs": spec}
+    if not isinstance(spec, dict) or not isinstance(spec.get("jobs"), list):
+        raise RuntimeError("job file {} must hold a list of jobs, or an object with a list of \"jobs\"".format(file_path))
+
+    defaults = spec.get("defaults", {})
+    jobs = []
+    for i, job in enumerate(spec["jobs"]):
+        if not isinstance(job, dict):
+            raise RuntimeError("job {} in {} is not an object".format(i, file_path))
+        job = {**defaults, **job}
+        unknown = [key for key in job if key not in JOB_KEYS]
+        if unknown:
+            raise RuntimeError("job {} in {} has unknown keys {}, expected some of {}".format(i, file_path, unknown, JOB_KEYS))
+        for key in ["config", "start", "end"]:
+            if key not in job:
+                raise RuntimeError("job {} in {} is missing `{}`".format(i, file_path, key))
+        jobs.append(job)
+    return jobs
+
+def run_job(job:Dict[str, Any], output_dir:str | None) -> str | None:
+    """run one job (a dictionary with JOB_KEYS as keys), rendering it to a file in the job's output_dir (or output_dir),
+    or showing it in a window if neither is given. returns the path of the rendered file, if any
+
+    raises RuntimeError: if the job isn't valid, or its sensors can't be found"""
+    return Wrapper.run(parse_config(job["config"]), parse_date(job["start"]), parse_date(job["end"], end_of_day=True),
+                       sap_sensorid=job.get("sap"), weather_sensorid=job.get("weather"), lux_sensorid=job.get("lux"),
+                       sync=job.get("sync", False), output_dir=job.get("output_dir", output_dir),
+                       file_format=job.get("file_format", "png"), downsample=job.get("downsample", True))
+
+def run_batch(jobs:List[Dict[str, Any]], output_dir:str) -> int:
+    """run every job in order, rendering to files, returns the number of jobs that failed
+
+    parsed data is kept in memory between jobs (see Parser.memoize), so months read by several jobs are usually only parsed (or downloaded) once.
+    jobs that fail are skipped with an error message"""
+    failed = 0
+    for i, job in enumerate(jobs):
+        try:
+            path = run_job(job, output_dir)
+        except (OSError, RuntimeError) as e:
+            print("ERROR: job {} ({}): {}\n\tskipping...".format(i, job.get("config"), e))
+            failed += 1
+            continue
+        print("job {}/{}: {}".format(i+1, len(jobs), path))
+    return failed
+
+def run_import(config:Configs, startdate:datetime, enddate:datetime) -> int:
+    """import the readings of every sensor of config from startdate to enddate into the local time series store (see data_store.py),
+    returns the number of sensors that couldn't be imported"""
+    failed = 0
+    for (sensor_type, id), result in TimeSeriesStore(config).import_all(startdate, enddate).items():
+        name = "{} {}".format(sensor_type.name.lower(), id) if id is not None else sensor_type.name.lower()
+        if isinstance(result, Exception):
+            print("ERROR: {}: {}\n\tskipping...".format(name, result))
+            failed += 1
+        else:
+            print("{}: {} readings added".format(name, result))
+    return failed
+
+#sensor type of every sensor name accepted by the tail command
+TAIL_SENSORS = {"sap": Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR, "weather": Data_Sensor_Type.WEATHER_STATION, "lux": Data_Sensor_Type.LUX_SENSOR}
+
+def run_tail(config:Configs, sensor_type:Data_Sensor_Type, id:int | None, interval:timedelta, poll_interval:float | None) -> int:
+    """follow the given sensor's new readings (see data_tail.py) until interrupted, printing the newest bucket,
+    and for sap sensors the day's minT and the bucket's sap flux density, whenever there are any"""
+    def on_update(tail:Tail, added:int):
+        bucket = tail.get_day().take(slice(-1, None))
+        values = ", ".join("{}: {:.4g}".format(field, bucket[field][0]) for field in bucket.fields if field != "Date and Time")
+        print("{} (+{} readings) {}".format(bucket.timestamps[0], added, values), flush=True)
+    def on_error(error:Exception):
+        print("ERROR: {}\n\ttrying again...".format(error), file=sys.stderr)
+
+    tail = Tail(config, sensor_type, id, interval=interval)
+    if tail.get_day() is not None:
+        on_update(tail, len(tail.day_readings))
+    try:
+        tail.follow(on_update, poll_interval=poll_interval, on_error=on_error)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def get_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="analyze orchard sensor data without any prompts")
+    parser.add_argument("--profile", action="store_true", help="print the time, rows, and bytes read of every stage of the pipeline once done (to stderr)")
+    parser.add_argument("--profile-dump", metavar="FILE", help="also profile the command with cProfile, dumping its stats to FILE (implies --profile)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="analyze one range of one config's sensors")
+    run.add_argument("config", help="config to analyze ({})".format(", ".join(config.name.lower() for config in Configs)))
+    run.add_argument("--start", required=True, help="first day to analyze (YYYY-MM-DD, or YYYY-MM-DDTHH:MM)")
+    run.add_argument("--end", required=True, help="last day to analyze (YYYY-MM-DD, or YYYY-MM-DDTHH:MM)")
+    run.add_argument("--sap", type=int, help="id of the sap and moisture sensor")
+    run.add_argument("--weather", type=int, help="id of the weather station")
+    run.add_argument("--lux", type=int, help="id of the lux sensor")
+    run.add_argument("--output-dir", help="render to a file in this directory rather than showing a window")
+    run.add_argument("--format", default="png", dest="file_format", help="format of the rendered file (png, svg, pdf, ...)")
+    run.add_argument("--no-downsample", action="store_false", dest="downsample", help="plot every reading when rendering")
+    run.add_argument("--sync", action="store_true", help="sync downloaded data to a local store and read it from there")
+
+    batch = commands.add_parser("batch", help="run every job in a JSON job file, rendering each to a file")
+    batch.add_argument("job_file", help="JSON file listing the jobs to run")
+    batch.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="directory for jobs that don't set their own output_dir (default: %(default)s)")
+
+    store = commands.add_parser("import", help="import every sensor's readings in a range into the local time series store")
+    store.add_argument("config", help="config to import ({})".format(", ".join(config.name.lower() for config in Configs)))
+    store.add_argument("--start", required=True, help="first day to import (YYYY-MM-DD, or YYYY-MM-DDTHH:MM)")
+    store.add_argument("--end", required=True, help="last day to import (YYYY-MM-DD, or YYYY-MM-DDTHH:MM)")
+
+    tail = commands.add_parser("tail", help="follow a sensor's new readings as they're written, printing its newest bucket whenever there are any (until interrupted)")
+    tail.add_argument("config", help="config of the sensor ({})".format(", ".join(config.name.lower() for config in Configs)))
+    tail.add_argument("sensor", choices=list(TAIL_SENSORS), help="type of sensor to follow")
+    tail.add_argument("--id", type=int, help="id of the sensor, if its type has several")
+    tail.add_argument("--interval", type=int, default=60, help="minutes per bucket, must evenly divide a day (default: %(default)s)")
+    tail.add_argument("--poll", type=float, dest="poll_interval", help="seconds between checks for new readings (default: 0.5 for files, 60 for the webserver)")
+    return parser
+
+def main(argv:List[str] | None = None) -> int:
+    """entry point, returns the exit code"""
+    args = get_argument_parser().parse_args(argv)
+    profiler = Profiler(args.profile_dump) if args.profile or args.profile_dump is not None else None
+    try:
+        with profiler if profiler is not None else nullcontext():
+            return run_command(args)
+    except (OSError, RuntimeError) as e:
+        print("ERROR: {}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        if profiler is not None:
+            print(profiler.format_report(), file=sys.stderr)
+
+def run_command(args:argparse.Namespace) -> int:
+    """run the command parsed from the command line, returns the exit code"""
+    match args.command:
+        case "run":
+            path = run_job({key: value for key, value in vars(args).items() if key in JOB_KEYS}, args.output_dir)
+            if path is not None:
+                print(path)
+            return 0
+        case "batch":
+            failed = run_batch(load_jobs(args.job_file), args.output_dir)
+            return 1 if failed > 0 else 0
+        case "import":
+            failed = run_import(parse_config(args.config), parse_date(args.start), parse_date(args.end, end_of_day=True))
+            return 1 if failed > 0 else 0
+        case "tail":
+            return run_tail(parse_config(args.config), TAIL_SENSORS[args.sensor], args.id, timedelta(minutes=args.interval), args.poll_interval)
+
+if __name__ == "__main__":
+    sys.exit(main())
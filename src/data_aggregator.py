@@ -0,0 +1,78 @@
+"""data_aggregator.py: bins readings into fixed time intervals and aggregates every numeric field per interval"""
+__author__ = "Anthony Rubick"
+
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from data_table import TIME_FIELD, DataTable
+
+#name of the column holding the number of readings in each interval
+COUNT_FIELD = "Count"
+
+#supported aggregates, with the name as key and a function (values, start index of every interval, count of every interval) -> aggregated values as value
+AGGREGATES: Dict[str, Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]] = {
+    "mean": lambda values, starts, counts: np.add.reduceat(values, starts, dtype=np.float64) / counts,
+    "min": lambda values, starts, counts: np.minimum.reduceat(values, starts),
+    "max": lambda values, starts, counts: np.maximum.reduceat(values, starts),
+    "sum": lambda values, starts, counts: np.add.reduceat(values, starts),
+    "count": lambda values, starts, counts: counts,
+}
+
+def get_aggregate_field(field:str, aggregate:str) -> str:
+    """name of the column storing the given aggregate of field, the mean keeps the field's name"""
+    if aggregate == "mean":
+        return field
+    if aggregate == "count":
+        return COUNT_FIELD
+    return "{} ({})".format(field, aggregate)
+
+def get_bins(data:DataTable, starttime:datetime, interval:timedelta) -> np.ndarray:
+    """index of the interval every reading falls into, counting from the interval starting at starttime
+
+    raises RuntimeError: if interval isn't a positive whole number of seconds"""
+    step = interval // timedelta(seconds=1)
+    if step <= 0 or timedelta(seconds=step) != interval:
+        raise RuntimeError("interval must be a positive whole number of seconds, was {}".format(interval))
+    seconds = data.timestamps.astype('datetime64[s]').view(np.int64)
+    return (seconds - np.datetime64(starttime, 's').view(np.int64)) // step
+
+def group_bins(bins:np.ndarray) -> Tuple[np.ndarray | None, np.ndarray, np.ndarray]:
+    """group readings by bin, returns (the order to put readings in so each bin is contiguous or None if they already are, start of every bin in that order, bins in order)"""
+    order = None
+    if len(bins) > 1 and np.any(bins[1:] < bins[:-1]):
+        order = np.argsort(bins, kind='stable')
+        bins = bins[order]
+    starts = np.concatenate(([0], np.flatnonzero(bins[1:] != bins[:-1]) + 1)) if len(bins) > 0 else np.empty(0, dtype=np.int64)
+    return order, starts, bins[starts]
+
+def aggregate(data:DataTable, starttime:datetime, interval:timedelta, aggregates:List[str] | Tuple[str, ...] = ("mean",)) -> DataTable:
+    """bin readings into every `interval` starting at `starttime`, and compute the given aggregates of every numeric field per interval
+
+    non numeric fields keep the value of the first reading in the interval,
+    the timestamp of every output row is the start of its interval, intervals without readings are left out
+
+    raises RuntimeError: if an aggregate isn't supported, or interval isn't a positive whole number of seconds"""
+    for name in aggregates:
+        if name not in AGGREGATES:
+            raise RuntimeError("aggregate `{}` not supported, supported aggregates are {}".format(name, list(AGGREGATES.keys())))
+
+    bins = get_bins(data, starttime, interval)
+    order, starts, timegroups = group_bins(bins)
+    counts = np.diff(np.append(starts, len(bins)))
+    if order is not None:
+        data = data.take(order)
+
+    aggregated = DataTable()
+    aggregated[TIME_FIELD] = np.datetime64(starttime, 's') + timegroups * np.timedelta64(interval // timedelta(seconds=1), 's')
+    for field, column in data.items():
+        if field == TIME_FIELD:
+            continue
+        if np.issubdtype(column.dtype, np.number):
+            for name in aggregates:
+                aggregated[get_aggregate_field(field, name)] = AGGREGATES[name](column, starts, counts) if len(starts) > 0 else np.empty(0) #reduceat can't handle empty tables
+        else:
+            #non numeric data is taken from the first reading in the interval
+            aggregated[field] = column[starts]
+    return aggregated
@@ -0,0 +1,103 @@
+"""data_cache.py: stores parsed data files on disk as memory-mappable numpy columns, so files that haven't changed don't need to be parsed again"""
+__author__ = "Anthony Rubick"
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict
+
+import numpy as np
+
+from data_profiler import profiled
+from data_table import DataTable
+from definitions import CACHE_DIR, Configs, Data_Sensor_Type
+
+#name of the file in every cache entry that describes the entry and the source it was built from
+META_FILE = "meta.json"
+#bumped whenever the way parsed data is stored changes, entries with a different version are rebuilt
+FORMAT_VERSION = 1
+
+def get_entry_path(config:Configs, sensor_type:Data_Sensor_Type, id:int | None = None, year:int | None = None, month:int | None = None) -> str:
+    """directory the parsed data for the given file is cached in (same args as the get_path function of the Configs class)"""
+    return os.path.join(CACHE_DIR, "parsed", config.name.lower(), sensor_type.name.lower(),
+                        "{id}_{year}_{month:0>2}".format(id=id if id is not None else "all", year=year, month=month if month is not None else "all"))
+
+@profiled("data_cache.load", rows_out=lambda result, *args, **kwargs: len(result) if result is not None else None)
+def load(entry_path: str, source_path: str) -> DataTable | None:
+    """load the cached data for source_path, returns None if nothing is cached or the source changed since it was cached
+
+    the source is considered unchanged if its size and modification time match,
+    if only the modification time differs the file is hashed and compared instead"""
+    meta = _read_meta(entry_path)
+    if meta is None or meta.get("version") != FORMAT_VERSION or not os.path.isfile(source_path):
+        return None
+
+    #check if the source changed
+    stat = os.stat(source_path)
+    if meta.get("size") != stat.st_size:
+        return None
+    if meta.get("mtime_ns") != stat.st_mtime_ns:
+        if meta.get("sha256") != _hash_file(source_path):
+            return None
+        #file was touched but not changed, remember the new modification time so it isn't hashed again
+        meta["mtime_ns"] = stat.st_mtime_ns
+        _write_meta(entry_path, meta)
+
+    #memory map the columns
+    try:
+        return DataTable({field: np.load(os.path.join(entry_path, "{}.npy".format(i)), mmap_mode='r') for i, field in enumerate(meta.get("fields"))})
+    except (OSError, ValueError):
+        return None
+
+def store(entry_path: str, source_path: str, table: DataTable):
+    """cache the data parsed from source_path"""
+    #remove the old entry's metadata first, so a partially written entry is never loaded
+    meta_path = os.path.join(entry_path, META_FILE)
+    if os.path.isfile(meta_path):
+        os.remove(meta_path)
+    os.makedirs(entry_path, exist_ok=True)
+
+    stat = os.stat(source_path)
+    for i, column in enumerate(table.values()):
+        save_column(os.path.join(entry_path, "{}.npy".format(i)), column)
+    _write_meta(entry_path, {
+        "version": FORMAT_VERSION,
+        "source": os.path.abspath(source_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": _hash_file(source_path),
+        "fields": table.fields,
+    })
+
+def save_column(file_path: str, column: np.ndarray):
+    """save column to a temporary file first, then move it into place,
+    so tables still memory mapping the old file keep their data rather than seeing it truncated"""
+    with open(file_path + ".tmp", mode='wb') as columnfile:
+        np.save(columnfile, column, allow_pickle=False)
+    os.replace(file_path + ".tmp", file_path)
+
+def clear():
+    """delete every cached file"""
+    shutil.rmtree(os.path.join(CACHE_DIR, "parsed"), ignore_errors=True)
+    shutil.rmtree(os.path.join(CACHE_DIR, "rollups"), ignore_errors=True)
+    shutil.rmtree(os.path.join(CACHE_DIR, "gaps"), ignore_errors=True)
+    shutil.rmtree(os.path.join(CACHE_DIR, "calibration"), ignore_errors=True)
+
+def _read_meta(entry_path: str) -> Dict[str, Any] | None:
+    try:
+        with open(os.path.join(entry_path, META_FILE), mode='r', encoding='utf-8') as metafile:
+            return json.load(metafile)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(entry_path: str, meta: Dict[str, Any]):
+    """write meta to a temporary file first, then move it into place so it's never seen half written"""
+    meta_path = os.path.join(entry_path, META_FILE)
+    with open(meta_path + ".tmp", mode='w', encoding='utf-8') as metafile:
+        json.dump(meta, metafile, ensure_ascii=False)
+    os.replace(meta_path + ".tmp", meta_path)
+
+def _hash_file(file_path: str) -> str:
+    with open(file_path, mode='rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
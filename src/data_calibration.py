@@ -0,0 +1,187 @@
+"""data_calibration.py: calculates the a and b coefficients (and average air reading) of every sap and moisture sensor from its calibration files,
+caching them until the files change, so sensors can be added or recalibrated by adding calibration files rather than editing code
+
+calibration files are in CALIBRATION_DIR, named Calibration_TREWid<id>_<config>.csv, with a column of wet, dry, and air readings (in that order) after a header row.
+a sensor that was recalibrated gets another file named Calibration_TREWid<id>_<yy>_<mm>_<dd>_<config>.csv,
+which applies to readings taken from that day on (until the next recalibration), the file without a date applies to readings before any recalibration"""
+__author__ = "Anthony Rubick"
+
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from definitions import CACHE_DIR, CALIBRATION_DIR, CALIBRATION_FALLBACKS, Configs
+
+#name of a calibration file: sensor id, the (2 digit) year, month, and day it applies from (if it's a recalibration), and config
+FILE_NAME_PATTERN = re.compile(r"^Calibration_TREWid(\d+)(?:_(\d{2})_(\d{2})_(\d{2}))?_([a-z]+)\.csv$")
+#bumped whenever the way calibrations are cached changes, caches with a different version are rebuilt
+FORMAT_VERSION = 1
+
+class Calibration(NamedTuple):
+    """the calibration of a sap and moisture sensor, relative moisture % = a * Value 2 + b.
+    a and b are the slope and y-int of the line between (wet, 100) and (dry, 0)"""
+    id:int
+    valid_from:datetime | None #None if it applies from the start
+    wet:float #average reading in wet soil
+    dry:float #average reading in dry soil
+    air:float #average reading in air, NaN if the file has no air readings
+    a:float
+    b:float
+    readings:int #rows in the calibration file
+    file_name:str
+
+def calc_coefficients(wet:np.ndarray, dry:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(a, b) of the lines between every (wet, 100) and (dry, 0), for any number of sensors at once"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = (100-0)/(wet-dry) #  (y2-y1) / (x2-x1)
+    b = 100-(a*wet) # y=ax+b ->  b=y-ax
+    return a, b
+
+def read_calibration_file(file_path:str) -> np.ndarray:
+    """the readings of a calibration file, one row per line (after the header) with the wet, dry, and (if present) air readings
+
+    raises RuntimeError: if the file has no readings, or fewer than 2 columns"""
+    with open(file_path, mode='r', encoding='utf-8') as csvfile:
+        readings = np.loadtxt(csvfile, delimiter=',', skiprows=1, ndmin=2, dtype=np.float64)
+    if readings.shape[0] == 0 or readings.shape[1] < 2:
+        raise RuntimeError("{} has no wet and dry readings".format(file_path))
+    return readings
+
+def find_calibration_files(config:Configs) -> Dict[str, Tuple[int, datetime | None]]:
+    """file name -> (sensor id, day it applies from or None) of every calibration file of config,
+    or of its fallback (see CALIBRATION_FALLBACKS in definitions.py) if it has none of its own"""
+    try:
+        names = os.listdir(CALIBRATION_DIR)
+    except OSError:
+        names = []
+    files: Dict[str, Tuple[int, datetime | None]] = {}
+    for name in names:
+        match = FILE_NAME_PATTERN.match(name)
+        if match is None or match.group(5) != config.name.lower():
+            continue
+        id, year, month, day = match.group(1, 2, 3, 4)
+        files[name] = (int(id), datetime(2000 + int(year), int(month), int(day)) if year is not None else None)
+    if len(files) == 0 and config.name in CALIBRATION_FALLBACKS:
+        return find_calibration_files(Configs[CALIBRATION_FALLBACKS[config.name]])
+    return files
+
+class CalibrationTable:
+    """every calibration of every sensor of a config, see load"""
+    def __init__(self, calibrations:List[Calibration]):
+        """constructor"""
+        #calibrations of every sensor, oldest first
+        self.calibrations: Dict[int, List[Calibration]] = {}
+        for calibration in sorted(calibrations, key=lambda calibration: (calibration.id, calibration.valid_from or datetime.min)):
+            self.calibrations.setdefault(calibration.id, []).append(calibration)
+
+    def __len__(self) -> int:
+        return sum(len(calibrations) for calibrations in self.calibrations.values())
+
+    def __iter__(self):
+        for id in sorted(self.calibrations):
+            yield from self.calibrations[id]
+
+    def get_ids(self) -> List[int]:
+        """ids of every calibrated sensor, in order"""
+        return sorted(self.calibrations)
+
+    def get(self, id:int, when:datetime | None = None) -> Calibration:
+        """the calibration of sensor id that applies at when (defaults to the latest), readings older than a sensor's first calibration use that one
+
+        raises RuntimeError: if the sensor has no calibration file"""
+        calibrations = self.__get_calibrations(id)
+        if when is None:
+            return calibrations[-1]
+        applying = [calibration for calibration in calibrations if calibration.valid_from is None or calibration.valid_from <= when]
+        return applying[-1] if applying else calibrations[0]
+
+    def get_coefficients(self, id:int, timestamps:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(a, b) of sensor id for every reading taken at timestamps, an equally sized array of each
+
+        raises RuntimeError: if the sensor has no calibration file"""
+        calibrations = self.__get_calibrations(id)
+        starts = np.array([calibration.valid_from or datetime.min for calibration in calibrations], dtype='datetime64[s]')
+        #index of the last calibration starting at or before every reading, readings before the first calibration use it
+        index = np.maximum(np.searchsorted(starts, timestamps, side='right') - 1, 0)
+        a = np.array([calibration.a for calibration in calibrations])
+        b = np.array([calibration.b for calibration in calibrations])
+        return a[index], b[index]
+
+    def __get_calibrations(self, id:int) -> List[Calibration]:
+        if id not in self.calibrations:
+            raise RuntimeError("sensor {} has no calibration file (Calibration_TREWid{}_<config>.csv in {})".format(id, id, CALIBRATION_DIR))
+        return self.calibrations[id]
+
+#config name -> (the files its table was built from, the table), so the cache file is only read when the calibration files change
+_tables: Dict[str, Tuple[Dict[str, Dict[str, int]], CalibrationTable]] = {}
+
+def get_version(config:Configs) -> Tuple[Tuple[str, int, int], ...]:
+    """name, size, and modification time of every calibration file of config, changes whenever the coefficients could"""
+    return tuple((name, source["size"], source["mtime_ns"]) for name, source in sorted(_get_sources(config).items()))
+
+def load(config:Configs) -> CalibrationTable:
+    """the calibrations of every sensor of config, only calibration files that are new or changed since they were last cached are read"""
+    sources = _get_sources(config)
+    kept = _tables.get(config.name)
+    if kept is not None and kept[0] == sources:
+        return kept[1]
+
+    cache_path = os.path.join(CACHE_DIR, "calibration", "{}.json".format(config.name.lower()))
+    cached = _read(cache_path)
+    entries = {name: cached[name] for name in sources if name in cached and cached[name]["source"] == sources[name]}
+    changed = [name for name in sources if name not in entries]
+    if changed:
+        entries |= _build(changed, sources)
+    if changed or len(entries) != len(cached):
+        _write(cache_path, entries)
+
+    table = CalibrationTable([
+        Calibration(entry["id"], datetime.fromisoformat(entry["valid_from"]) if entry["valid_from"] is not None else None,
+                    entry["wet"], entry["dry"], entry["air"] if entry["air"] is not None else float('nan'), entry["a"], entry["b"], entry["readings"], name)
+        for name, entry in entries.items()])
+    _tables[config.name] = (sources, table)
+    return table
+
+def _get_sources(config:Configs) -> Dict[str, Dict[str, Any]]:
+    """file name -> sensor id, day it applies from, size, and modification time of every calibration file of config"""
+    sources = {}
+    for name, (id, valid_from) in find_calibration_files(config).items():
+        stat = os.stat(os.path.join(CALIBRATION_DIR, name))
+        sources[name] = {"id": id, "valid_from": valid_from.isoformat() if valid_from is not None else None, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return sources
+
+def _build(names:List[str], sources:Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """cache entries of the given calibration files, the averages of every file are taken first, then the coefficients of all of them at once"""
+    readings = [read_calibration_file(os.path.join(CALIBRATION_DIR, name)) for name in names]
+    averages = np.array([[*np.mean(rows[:, :2], axis=0), np.mean(rows[:, 2]) if rows.shape[1] > 2 else np.nan] for rows in readings])
+    a, b = calc_coefficients(averages[:, 0], averages[:, 1])
+    return {name: {
+        "source": sources[name],
+        "id": sources[name]["id"],
+        "valid_from": sources[name]["valid_from"],
+        "wet": float(averages[i, 0]),
+        "dry": float(averages[i, 1]),
+        "air": float(averages[i, 2]) if not np.isnan(averages[i, 2]) else None,
+        "a": float(a[i]),
+        "b": float(b[i]),
+        "readings": len(readings[i]),
+    } for i, name in enumerate(names)}
+
+def _read(cache_path:str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(cache_path, mode='r', encoding='utf-8') as cachefile:
+            cache = json.load(cachefile)
+    except (OSError, ValueError):
+        return {}
+    return cache.get("files", {}) if cache.get("version") == FORMAT_VERSION else {}
+
+def _write(cache_path:str, entries:Dict[str, Dict[str, Any]]):
+    """write to a temporary file first, then move it into place so it's never seen half written"""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path + ".tmp", mode='w', encoding='utf-8') as cachefile:
+        json.dump({"version": FORMAT_VERSION, "files": entries}, cachefile)
+    os.replace(cache_path + ".tmp", cache_path)
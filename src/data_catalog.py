@@ -0,0 +1,161 @@
+"""data_catalog.py: indexes the data files of configs that read local files, so the files holding a time range are found with a lookup rather than by guessing paths"""
+__author__ = "Anthony Rubick"
+
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from definitions import CACHE_DIR, Configs, Data_Sensor_Type
+
+#bumped whenever the way the catalog is stored changes, catalogs with a different version are rebuilt
+FORMAT_VERSION = 1
+
+#names of the data files of every config that reads local files (see get_path of the Configs class), with the sensor type they hold as value
+FILE_PATTERNS: Dict[str, List[Tuple[re.Pattern, Data_Sensor_Type]]] = {
+    Configs.ALMOND.name: [
+        (re.compile(r"^Data_weather_(?P<year>\d{2})_(?P<month>\d{2})_almond\.csv$"), Data_Sensor_Type.WEATHER_STATION),
+        (re.compile(r"^Data_TREWid(?P<id>\d+)_(?P<year>\d{2})_(?P<month>\d{2})_almond\.csv$"), Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR),
+    ],
+}
+
+class CatalogEntry(NamedTuple):
+    """a data file, and the readings in it"""
+    file_name:str
+    sensor_type:Data_Sensor_Type
+    id:int | None
+    year:int #last 2 digits of the year
+    month:int
+    first:datetime | None #oldest reading, None if the file has no readings
+    last:datetime | None #newest reading
+    rows:int
+
+class Catalog:
+    """index of every data file of a config, stored in the cache directory and only updated for files that were added or changed since the last scan"""
+    def __init__(self, config:Configs, data_dir:str | None = None):
+        """constructor, scans the config's data directory (or data_dir, if given)
+
+        raises RuntimeError: if config doesn't read local files"""
+        if config.isdownloaded or config.name not in FILE_PATTERNS:
+            raise RuntimeError("config {} doesn't read local files, there is nothing to catalog".format(config.name))
+        self.config: Configs = config
+        self.data_dir: str = data_dir if data_dir is not None else config.base_path
+        self.catalog_path: str = os.path.join(CACHE_DIR, "catalog", "{}.json".format(config.name.lower()))
+        self.entries: Dict[str, CatalogEntry] = {}
+        #modification time of the data directory, and (size, modification time) of every data file, when it was last scanned
+        self.__version: Tuple[int, Dict[str, Tuple[int, int]]] | None = None
+        self.scan()
+
+    def refresh(self):
+        """scan again if a data file was added, removed, or changed since the last scan (only the directory and files are stat'ed to check)"""
+        if self.__get_version() != self.__version:
+            self.scan()
+
+    def scan(self):
+        """update the index with the files currently in the config's data directory, only files that are new or changed since they were indexed are read"""
+        version = self.__get_version()
+        indexed = self.__read()
+        files: Dict[str, Dict[str, Any]] = {}
+        entries: Dict[str, CatalogEntry] = {}
+        for file_name, (size, mtime_ns) in version[1].items():
+            sensor_type, id, year, month = self.__match(file_name)
+            known = indexed.get(file_name)
+            if known is not None and known["size"] == size and known["mtime_ns"] == mtime_ns:
+                files[file_name] = known
+            else:
+                try:
+                    first, last, rows = read_time_range(os.path.join(self.data_dir, file_name))
+                except (OSError, ValueError) as e:
+                    print("ERROR: could not index {}: {}\n\tskipping...".format(file_name, e))
+                    continue
+                files[file_name] = {"size": size, "mtime_ns": mtime_ns, "rows": rows,
+                                    "first": first.isoformat() if first is not None else None, "last": last.isoformat() if last is not None else None}
+            entry = files[file_name]
+            entries[file_name] = CatalogEntry(file_name, sensor_type, id, year, month,
+                                              datetime.fromisoformat(entry["first"]) if entry["first"] is not None else None,
+                                              datetime.fromisoformat(entry["last"]) if entry["last"] is not None else None,
+                                              entry["rows"])
+        self.entries = entries
+        self.__version = version
+        if files != indexed:
+            self.__write(files)
+
+    def find(self, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime, enddate:datetime) -> List[CatalogEntry]:
+        """every file of the given sensor with readings between startdate and enddate (inclusive), oldest first"""
+        found = [entry for entry in self.entries.values() if entry.sensor_type == sensor_type and entry.id == id and (
+                 entry.first is not None and entry.first <= enddate and entry.last >= startdate)]
+        return sorted(found, key=lambda entry: (entry.year, entry.month, entry.first))
+
+    def __get_version(self) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+        """modification time of the data directory, and (size, modification time) of every data file in it by name"""
+        files: Dict[str, Tuple[int, int]] = {}
+        for file_name in sorted(os.listdir(self.data_dir)):
+            if self.__match(file_name) is not None:
+                stat = os.stat(os.path.join(self.data_dir, file_name))
+                files[file_name] = (stat.st_size, stat.st_mtime_ns)
+        return os.stat(self.data_dir).st_mtime_ns, files
+
+    def __match(self, file_name:str) -> Tuple[Data_Sensor_Type, int | None, int, int] | None:
+        """(sensor type, id, year, month) of the data file with the given name, or None if it isn't one"""
+        for pattern, sensor_type in FILE_PATTERNS[self.config.name]:
+            match = pattern.match(file_name)
+            if match is not None:
+                id = int(match.group("id")) if "id" in pattern.groupindex else None
+                return sensor_type, id, int(match.group("year")), int(match.group("month"))
+        return None
+
+    def __read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.catalog_path, mode='r', encoding='utf-8') as catalogfile:
+                catalog = json.load(catalogfile)
+        except (OSError, ValueError):
+            return {}
+        return catalog.get("files", {}) if catalog.get("version") == FORMAT_VERSION else {}
+
+    def __write(self, files:Dict[str, Dict[str, Any]]):
+        """write to a temporary file first, then move it into place so it's never seen half written"""
+        os.makedirs(os.path.dirname(self.catalog_path), exist_ok=True)
+        with open(self.catalog_path + ".tmp", mode='w', encoding='utf-8') as catalogfile:
+            json.dump({"version": FORMAT_VERSION, "files": files}, catalogfile)
+        os.replace(self.catalog_path + ".tmp", self.catalog_path)
+
+def read_time_range(file_path:str) -> Tuple[datetime | None, datetime | None, int]:
+    """(oldest reading, newest reading, number of readings) of a data file, only the "Date and Time" column (the first) is converted
+
+    raises ValueError: if a timestamp isn't valid"""
+    with open(file_path, mode='r', encoding='utf-8', newline='') as csvfile:
+        csvfile.readline() #skip header
+        rows = [row for row in csvfile.read().splitlines() if row]
+    if len(rows) == 0:
+        return None, None, 0
+    timestamps = np.array([row.split(',', 1)[0] for row in rows], dtype='datetime64[s]')
+    return timestamps.min().astype(datetime), timestamps.max().astype(datetime), len(rows)
+
+#catalog of every config, scanned when first needed
+_catalogs: Dict[str, Catalog] = {}
+
+def get_catalog(config:Configs) -> Catalog:
+    """the catalog of config, scanned the first time it's asked for, and again whenever a data file was added, removed, or changed since,
+    so long running processes see files that are written to while they run
+
+    raises RuntimeError: if config doesn't read local files"""
+    if config.name not in _catalogs:
+        _catalogs[config.name] = Catalog(config)
+    else:
+        _catalogs[config.name].refresh()
+    return _catalogs[config.name]
+
+def find_periods(config:Configs, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime, enddate:datetime) -> List[Tuple[int, int | None]]:
+    """(year, month) of every path (see get_path of the Configs class) of the given sensor holding readings between startdate and enddate (inclusive), in order
+
+    for configs that read local files, only the files that exist and overlap the range (according to the catalog) are returned,
+    downloaded configs can't be indexed so every path that may hold readings in the range is returned (see get_periods of the Configs class)
+
+    raises RuntimeError: if config doesn't support the given sensor type"""
+    if config.isdownloaded:
+        return config.get_periods(sensor_type, startdate, enddate)
+    config.get_field_names(sensor_type) #raises if the sensor type isn't supported
+    return [(entry.year, entry.month) for entry in get_catalog(config).find(sensor_type, id, startdate, enddate)]
@@ -0,0 +1,94 @@
+"""data_fetcher.py: downloads data from the webserver over a pooled keep-alive session, fetching several urls at once"""
+__author__ = "Anthony Rubick"
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List
+
+from data_profiler import count_bytes, profiled
+
+#requests is only imported once something is downloaded, so runs that only read local files don't pay for importing it
+if TYPE_CHECKING:
+    import requests
+
+class Fetcher:
+    """fetches urls with a shared connection pool, retrying failed requests with exponential backoff"""
+    def __init__(self, workers:int = 4, timeout:float = 10.0, retries:int = 3, backoff:float = 0.5):
+        """constructor
+
+        workers:int maximum number of urls fetched at the same time (and connections kept alive)
+        timeout:float seconds to wait to connect to, and for data from, the webserver
+        retries:int times to retry a url that failed to connect or returned a server error (5xx)
+        backoff:float seconds to wait before the first retry, doubled for every retry after that"""
+        if workers < 1:
+            raise RuntimeError("workers must be at least 1, was {}".format(workers))
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        self.workers: int = workers
+        self.timeout: float = timeout
+        self.session: 'requests.Session' = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=Retry(
+            total=retries, backoff_factor=backoff, status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]), raise_on_status=False))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self) -> 'Fetcher':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """close every pooled connection"""
+        self.session.close()
+
+    @profiled("Fetcher.fetch")
+    def fetch(self, url:str) -> bytes:
+        """download the content at url
+
+        raises RuntimeError: if the url couldn't be reached, or the webserver responded with an error"""
+        import requests
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise RuntimeError("failed to connect to {}: {}".format(url, e))
+        if not response.ok:
+            raise RuntimeError("failed to download {}: webserver responded with status {}".format(url, response.status_code))
+        count_bytes(len(response.content))
+        return response.content
+
+    def fetch_all(self, urls:List[str]) -> List[bytes]:
+        """download the content at every url, up to self.workers at a time, returned in the same order as urls
+
+        raises RuntimeError: if any url couldn't be downloaded"""
+        responses = self.fetch_all_or_errors(urls)
+        for response in responses:
+            if isinstance(response, RuntimeError):
+                raise response
+        return responses
+
+    @profiled("Fetcher.fetch_all")
+    def fetch_all_or_errors(self, urls:List[str]) -> List[bytes | RuntimeError]:
+        """like fetch_all, but a url that couldn't be downloaded gets the error in its place rather than stopping the rest"""
+        def fetch_or_error(url:str) -> bytes | RuntimeError:
+            try:
+                return self.fetch(url)
+            except RuntimeError as e:
+                return e
+        if len(urls) <= 1 or self.workers == 1:
+            return [fetch_or_error(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(urls))) as executor:
+            responses = list(executor.map(fetch_or_error, urls))
+        #downloads in other threads aren't profiled, so count what they read here
+        count_bytes(sum(len(response) for response in responses if isinstance(response, bytes)))
+        return responses
+
+#fetcher shared by every download that isn't given one, created when first needed
+_default_fetcher: Fetcher | None = None
+
+def get_default_fetcher() -> Fetcher:
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = Fetcher()
+    return _default_fetcher
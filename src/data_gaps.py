@@ -0,0 +1,192 @@
+"""data_gaps.py: finds gaps in every sensor's readings and how complete every day is, indexed per data file so broken days can be skipped without analyzing them"""
+__author__ = "Anthony Rubick"
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from data_catalog import find_periods
+from data_parser import Parser
+from data_rollup import get_period_key
+from data_table import TIME_FIELD, DataTable
+from definitions import CACHE_DIR, Configs, Data_Sensor_Type, get_period_bounds
+
+#a stretch without readings longer than this many times the sensor's reading interval is a gap
+GAP_FACTOR = 3
+#readings between these hours (inclusive) are nighttime readings, which the minT of sap sensors is calculated from (see calc_minT in data_analyzer.py)
+NIGHT_HOURS = (0, 7)
+SECONDS_PER_DAY = 24 * 60 * 60
+
+#fields of the per day completeness table (see get_days), besides "Date and Time" (midnight of the day)
+READINGS_FIELD = "Readings"
+EXPECTED_FIELD = "Expected Readings"
+NIGHT_READINGS_FIELD = "Night Readings"
+COMPLETENESS_FIELD = "Completeness"
+LONGEST_GAP_FIELD = "Longest Gap [s]"
+DAY_FIELDS = [READINGS_FIELD, EXPECTED_FIELD, NIGHT_READINGS_FIELD, COMPLETENESS_FIELD, LONGEST_GAP_FIELD]
+
+#bumped whenever the way the index is stored changes, indexes with a different version are rebuilt
+FORMAT_VERSION = 1
+
+def get_reading_interval(timestamps:np.ndarray) -> int:
+    """the usual number of seconds between readings (the median), 0 if there are less than 2 readings, timestamps must be sorted"""
+    if len(timestamps) < 2:
+        return 0
+    return int(np.median(np.diff(timestamps.astype('datetime64[s]').view(np.int64))))
+
+def find_gaps(timestamps:np.ndarray, max_gap:int) -> Tuple[np.ndarray, np.ndarray]:
+    """(last reading before, first reading after) every stretch of more than max_gap seconds without readings, timestamps must be sorted"""
+    seconds = timestamps.astype('datetime64[s]').view(np.int64)
+    after = np.flatnonzero(np.diff(seconds) > max_gap) + 1
+    return timestamps[after - 1], timestamps[after]
+
+def summarize_days(timestamps:np.ndarray, interval:int) -> DataTable:
+    """how complete every day with readings is, in one pass over the (sorted) timestamps:
+    the readings taken, the readings expected at the given interval (seconds), the nighttime readings,
+    completeness (readings / expected, at most 1), and the longest stretch without readings (counting from midnight to the first reading and from the last one to the next midnight)"""
+    seconds = timestamps.astype('datetime64[s]').view(np.int64)
+    if len(seconds) == 0:
+        return DataTable({TIME_FIELD: np.empty(0, dtype='datetime64[s]')} | {field: np.empty(0) for field in DAY_FIELDS})
+    days = seconds // SECONDS_PER_DAY
+    starts = np.concatenate(([0], np.flatnonzero(days[1:] != days[:-1]) + 1))
+    ends = np.append(starts[1:], len(seconds)) - 1
+    midnights = days[starts] * SECONDS_PER_DAY
+
+    #longest gap between readings of the same day, or before the first / after the last one
+    diffs = np.diff(seconds, prepend=seconds[0])
+    diffs[starts] = 0
+    longest = np.maximum.reduceat(diffs, starts)
+    longest = np.maximum(longest, seconds[starts] - midnights)
+    longest = np.maximum(longest, midnights + SECONDS_PER_DAY - seconds[ends])
+
+    hours = (seconds - days * SECONDS_PER_DAY) // 3600
+    night = (hours >= NIGHT_HOURS[0]) & (hours <= NIGHT_HOURS[1])
+    readings = ends - starts + 1
+    expected = np.full(len(starts), SECONDS_PER_DAY // interval if interval > 0 else 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        completeness = np.where(expected > 0, np.minimum(1.0, readings / expected), 0.0)
+    return DataTable({
+        TIME_FIELD: midnights.astype('datetime64[s]'),
+        READINGS_FIELD: readings,
+        EXPECTED_FIELD: expected,
+        NIGHT_READINGS_FIELD: np.add.reduceat(night.astype(np.int64), starts),
+        COMPLETENESS_FIELD: completeness,
+        LONGEST_GAP_FIELD: longest,
+    })
+
+class GapIndex:
+    """per day completeness and gaps of every data file (or download) of a sensor, stored in the cache directory,
+    files are only read again once they change (downloads once the month is over, until then they're read every time)"""
+    def __init__(self, config:Configs, sensor_type:Data_Sensor_Type, id:int | None):
+        """constructor, nothing is read until the index is queried"""
+        self.config: Configs = config
+        self.sensor_type: Data_Sensor_Type = sensor_type
+        self.id: int | None = id
+        self.index_path: str = os.path.join(CACHE_DIR, "gaps", config.name.lower(), sensor_type.name.lower(), "{}.json".format(id if id is not None else "all"))
+
+    def get_days(self, startdate:datetime, enddate:datetime) -> DataTable:
+        """completeness of every day from startdate to enddate (inclusive) that has readings (see summarize_days), oldest first"""
+        entries = self.__get_entries(startdate, enddate)
+        tables = [DataTable({TIME_FIELD: np.array(entry["days"][TIME_FIELD], dtype='datetime64[s]')} | {
+                      field: np.array(entry["days"][field], dtype=np.float64 if field == COMPLETENESS_FIELD else np.int64) for field in DAY_FIELDS})
+                  for entry in entries]
+        if len(tables) == 0:
+            return summarize_days(np.empty(0, dtype='datetime64[s]'), 0)
+        days = DataTable.concatenate(tables).sort_by_time()
+        return days.between(np.datetime64(startdate, 'D'), enddate)
+
+    def get_gaps(self, startdate:datetime, enddate:datetime) -> List[Tuple[datetime, datetime]]:
+        """(last reading before, first reading after) every gap between readings from startdate to enddate (inclusive), including gaps between files"""
+        entries = self.__get_entries(startdate, enddate)
+        gaps: List[Tuple[datetime, datetime]] = []
+        previous_last: datetime | None = None
+        for entry in entries:
+            if entry["first"] is None:
+                continue
+            first = datetime.fromisoformat(entry["first"])
+            if previous_last is not None and (first - previous_last).total_seconds() > GAP_FACTOR * entry["interval"]:
+                gaps.append((previous_last, first))
+            gaps.extend((datetime.fromisoformat(start), datetime.fromisoformat(end)) for start, end in entry["gaps"])
+            previous_last = datetime.fromisoformat(entry["last"])
+        return [(start, end) for start, end in gaps if end >= startdate and start <= enddate]
+
+    def find_broken_days(self, startdate:datetime, enddate:datetime, min_completeness:float = 0.5) -> List[datetime]:
+        """midnight of every day from startdate to enddate (inclusive) that can't be analyzed properly:
+        days with readings but less than min_completeness of the expected readings, and (for sap sensors) days without nighttime readings, so without a minT.
+        days without any readings aren't in the index, and aren't returned"""
+        days = self.get_days(startdate, enddate)
+        broken = days[COMPLETENESS_FIELD] < min_completeness
+        if self.sensor_type == Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR:
+            broken |= days[NIGHT_READINGS_FIELD] == 0
+        return days.timestamps[broken].astype(datetime).tolist()
+
+    def __get_entries(self, startdate:datetime, enddate:datetime) -> List[Dict[str, Any]]:
+        """index entries of every file holding readings in the range, in order, indexing files that are new or changed first"""
+        periods = find_periods(self.config, self.sensor_type, self.id, startdate, enddate)
+        index = self.__read()
+        entries = []
+        changed = False
+        for year, month in periods:
+            key = get_period_key(year, month)
+            source = self.__get_source(year, month)
+            entry = index.get(key)
+            if entry is None or source is None or entry["source"] != source:
+                entry = self.__build(year, month, source)
+                if source is not None:
+                    index[key] = entry
+                    changed = True
+            entries.append(entry)
+        if changed:
+            self.__write(index)
+        return entries
+
+    def __build(self, year:int, month:int | None, source:Dict[str, Any] | None) -> Dict[str, Any]:
+        """index one file: its per day completeness, gaps, and first/last readings"""
+        timestamps = Parser.run(self.config, self.sensor_type, id=self.id, year=year, month=month).sort_by_time().timestamps
+        interval = get_reading_interval(timestamps)
+        gap_starts, gap_ends = find_gaps(timestamps, GAP_FACTOR * interval)
+        days = summarize_days(timestamps, interval)
+        return {
+            "source": source,
+            "interval": interval,
+            "first": str(timestamps[0]) if len(timestamps) > 0 else None,
+            "last": str(timestamps[-1]) if len(timestamps) > 0 else None,
+            "gaps": [[str(start), str(end)] for start, end in zip(gap_starts, gap_ends)],
+            "days": {field: [str(value) for value in column] if field == TIME_FIELD else column.tolist() for field, column in days.items()},
+        }
+
+    def __get_source(self, year:int, month:int | None) -> Dict[str, Any] | None:
+        """what a file's index entry is built from, the entry is out of date once this changes. None if it can't be stored yet (a downloaded month that isn't over)"""
+        if self.config.isdownloaded:
+            return {"complete": True} if get_period_bounds(year, month)[1] <= datetime.now() else None
+        stat = os.stat(self.config.get_path(self.sensor_type, id=self.id, year=year, month=month))
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def __read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path, mode='r', encoding='utf-8') as indexfile:
+                index = json.load(indexfile)
+        except (OSError, ValueError):
+            return {}
+        return index.get("periods", {}) if index.get("version") == FORMAT_VERSION else {}
+
+    def __write(self, periods:Dict[str, Dict[str, Any]]):
+        """write to a temporary file first, then move it into place so it's never seen half written"""
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with open(self.index_path + ".tmp", mode='w', encoding='utf-8') as indexfile:
+            json.dump({"version": FORMAT_VERSION, "periods": periods}, indexfile)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+def find_broken_days(config:Configs, sensor_type:Data_Sensor_Type, ids:List[int | None], startdate:datetime, enddate:datetime,
+                     min_completeness:float = 0.5) -> Dict[int | None, List[datetime] | Exception]:
+    """find_broken_days of the GapIndex of every sensor in ids, or the error that stopped it from being indexed"""
+    broken: Dict[int | None, List[datetime] | Exception] = {}
+    for id in ids:
+        try:
+            broken[id] = GapIndex(config, sensor_type, id).find_broken_days(startdate, enddate, min_completeness)
+        except (OSError, RuntimeError) as e:
+            broken[id] = e
+    return broken
@@ -0,0 +1,103 @@
+"""data_join.py: aligns the readings of several sensors (eg. sap, weather, and lux) onto one time axis, so their series can be compared reading for reading"""
+__author__ = "Anthony Rubick"
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from data_aggregator import aggregate
+from data_table import TIME_FIELD, DataTable
+
+#supported directions of an as-of join, which readings a timestamp on the time axis can be matched with
+DIRECTIONS = ("backward", "forward", "nearest")
+
+def get_grid(startdate:datetime, enddate:datetime, interval:timedelta) -> np.ndarray:
+    """every `interval` from startdate to enddate (inclusive), as datetime64[s]
+
+    raises RuntimeError: if interval isn't a positive whole number of seconds"""
+    step = interval // timedelta(seconds=1)
+    if step <= 0 or timedelta(seconds=step) != interval:
+        raise RuntimeError("interval must be a positive whole number of seconds, was {}".format(interval))
+    return np.arange(np.datetime64(startdate, 's'), np.datetime64(enddate, 's') + np.timedelta64(1, 's'), np.timedelta64(step, 's'))
+
+def match_asof(timestamps:np.ndarray, targets:np.ndarray, tolerance:timedelta | None = None, direction:str = "nearest") -> np.ndarray:
+    """index of the reading (in timestamps, which must be sorted) every target is matched with, -1 where there is none
+
+    backward matches the latest reading at or before the target, forward the earliest one at or after it, nearest whichever is closer (backward on ties),
+    a reading further than tolerance from the target isn't matched
+
+    raises RuntimeError: if direction isn't supported"""
+    if direction not in DIRECTIONS:
+        raise RuntimeError("direction `{}` not supported, supported directions are {}".format(direction, list(DIRECTIONS)))
+    timestamps = timestamps.astype('datetime64[s]').view(np.int64)
+    targets = targets.astype('datetime64[s]').view(np.int64)
+    if len(timestamps) == 0:
+        return np.full(len(targets), -1, dtype=np.int64)
+
+    #latest reading at or before every target, and the one after it
+    before = np.searchsorted(timestamps, targets, side='right') - 1
+    after = np.searchsorted(timestamps, targets, side='left')
+    has_before = before >= 0
+    has_after = after < len(timestamps)
+    before_distance = np.where(has_before, targets - timestamps[np.clip(before, 0, None)], np.iinfo(np.int64).max)
+    after_distance = np.where(has_after, timestamps[np.clip(after, None, len(timestamps)-1)] - targets, np.iinfo(np.int64).max)
+
+    match direction:
+        case "backward":
+            matches, distances = np.where(has_before, before, -1), before_distance
+        case "forward":
+            matches, distances = np.where(has_after, after, -1), after_distance
+        case _:
+            use_after = after_distance < before_distance
+            matches = np.where(use_after, np.where(has_after, after, -1), np.where(has_before, before, -1))
+            distances = np.minimum(before_distance, after_distance)
+    if tolerance is not None:
+        matches = np.where(distances <= tolerance // timedelta(seconds=1), matches, -1)
+    return matches
+
+def get_joined_fields(sources:Dict[str, DataTable]) -> List[Tuple[str, str, str]]:
+    """(source name, field, joined field) of every numeric field of every source, fields that more than one source has are prefixed with the source's name"""
+    fields = [(name, field) for name, table in sources.items() for field, column in table.items()
+              if field != TIME_FIELD and np.issubdtype(column.dtype, np.number)]
+    counts: Dict[str, int] = {}
+    for _, field in fields:
+        counts[field] = counts.get(field, 0) + 1
+    return [(name, field, field if counts[field] == 1 else "{} {}".format(name, field)) for name, field in fields]
+
+def join_asof(grid:np.ndarray, sources:Dict[str, DataTable], tolerance:timedelta | None = None, direction:str = "nearest") -> DataTable:
+    """the numeric fields of every source (with a name as key) matched onto the timestamps of grid (see match_asof), as float64 columns with NaN where a source has no match,
+    fields more than one source has are named "<source name> <field>"
+
+    raises RuntimeError: if direction isn't supported"""
+    joined = DataTable({TIME_FIELD: grid.astype('datetime64[s]')})
+    matched: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    for name, table in sources.items():
+        table = table.sort_by_time()
+        matches = match_asof(table.timestamps, joined.timestamps, tolerance, direction)
+        matched[name] = (table, matches)
+    for name, field, joined_field in get_joined_fields({name: table for name, (table, _) in matched.items()}):
+        table, matches = matched[name]
+        column = table[field].astype(np.float64)
+        joined[joined_field] = np.where(matches >= 0, column[np.clip(matches, 0, None)] if len(column) > 0 else np.nan, np.nan)
+    return joined
+
+def join_buckets(sources:Dict[str, DataTable], starttime:datetime, interval:timedelta, enddate:datetime | None = None, how:str = "outer") -> DataTable:
+    """average every source over every `interval` starting at starttime (see aggregate in data_aggregator.py), and join the averages of the same interval
+
+    how:str "outer" keeps every interval any source has readings in (or every interval up to enddate, if given), "inner" only the intervals every source has readings in
+
+    raises RuntimeError: if how isn't supported, or interval isn't a positive whole number of seconds"""
+    if how not in ("outer", "inner"):
+        raise RuntimeError("how `{}` not supported, expected \"outer\" or \"inner\"".format(how))
+    averaged = {name: aggregate(table, starttime, interval) for name, table in sources.items()}
+    bucket_times = [table.timestamps for table in averaged.values()]
+    if how == "inner":
+        grid = bucket_times[0] if bucket_times else np.empty(0, dtype='datetime64[s]')
+        for timestamps in bucket_times[1:]:
+            grid = np.intersect1d(grid, timestamps)
+    elif enddate is not None:
+        grid = get_grid(starttime, enddate, interval)
+    else:
+        grid = np.unique(np.concatenate(bucket_times)) if bucket_times else np.empty(0, dtype='datetime64[s]')
+    return join_asof(grid, averaged, tolerance=timedelta(0), direction="backward")
@@ -0,0 +1,74 @@
+"""data_lru.py: a least recently used cache bounded by the bytes of what it holds, used to keep parsed and analyzed data in memory between calls"""
+__author__ = "Anthony Rubick"
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+from data_table import DataTable
+
+def get_table_size(table: DataTable) -> int:
+    """bytes held by the columns of a table (memory mapped columns count too, they take up the page cache once read)"""
+    return sum(column.nbytes for column in table.values())
+
+class LRUCache:
+    """maps keys to values, evicting the least recently used values once the values held add up to more than max_bytes,
+    values can also expire a number of seconds after they're added"""
+    def __init__(self, max_bytes: int):
+        """constructor
+
+        raises RuntimeError: if max_bytes is negative"""
+        if max_bytes < 0:
+            raise RuntimeError("max_bytes must be at least 0, was {}".format(max_bytes))
+        self.max_bytes: int = max_bytes
+        self.bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        #key -> (value, size in bytes, time it expires at or None), least recently used first
+        self.entries: 'OrderedDict[Hashable, Tuple[Any, int, float | None]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def get(self, key: Hashable) -> Any | None:
+        """the value of key (marking it as the most recently used), None if there is none or it expired"""
+        entry = self.entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+            self.__remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int, ttl: float | None = None):
+        """add (or replace) the value of key, evicting the least recently used values until it fits,
+        values larger than max_bytes aren't kept. ttl:float seconds until the value expires, it never does if None"""
+        if key in self.entries:
+            self.__remove(key)
+        if size > self.max_bytes:
+            return
+        while self.bytes + size > self.max_bytes:
+            self.__remove(next(iter(self.entries)))
+            self.evictions += 1
+        self.entries[key] = (value, size, time.monotonic() + ttl if ttl is not None else None)
+        self.bytes += size
+
+    def clear(self):
+        """drop every value, counters are kept"""
+        self.entries.clear()
+        self.bytes = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """hits, misses, evictions, entries held, and bytes held (of max_bytes)"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+    def __remove(self, key: Hashable):
+        self.bytes -= self.entries.pop(key)[1]
@@ -2,159 +2,226 @@
 __author__ = "Anthony Rubick"
 
 #parses the CSV files and returns the data within
-import csv
 import os
-import requests
 from datetime import datetime
-from typing import Any, Dict, List
-from definitions import Configs, Data_Sensor_Type
+from typing import Dict, List, Tuple, Type
+
+import numpy as np
+
+import data_cache
+from data_fetcher import Fetcher, get_default_fetcher
+from data_lru import LRUCache, get_table_size
+from data_profiler import count_bytes, profiled
+from data_table import DataTable, Record, RecordList, get_record_type
+from definitions import Configs, Data_Sensor_Type, get_period_bounds
+
+#bytes of parsed data kept in memory by default (see Parser.memoize)
+DEFAULT_MEMO_BYTES = 256 * 1024 * 1024
+#seconds downloads of months (or years) that aren't over are kept in memory for
+DOWNLOAD_TTL = 5 * 60
 
 class Parser:
-    def run(config: Configs, sensor_type: Data_Sensor_Type, id:int | None = None, year:int | None = None, month:int | None = None) -> List[Dict[str, Any]]:
+    def memoize(enabled:bool = True, max_bytes:int = DEFAULT_MEMO_BYTES):
+        """keep parsed files/urls in memory (by path, see data_lru.py), so running for the same file/url again returns it without reading or downloading it.
+        on by default, once more than max_bytes are kept the least recently used are dropped. disabling it (or enabling it again) drops everything kept
+        
+        files are kept until they change, downloads of months (or years) that aren't over yet only for DOWNLOAD_TTL seconds, as readings are still being added"""
+        global _memo
+        _memo = LRUCache(max_bytes) if enabled else None
+    
+    def get_memo_stats() -> Dict[str, int] | None:
+        """hits, misses, evictions, and bytes kept by the in-memory cache (see memoize), None if it's disabled"""
+        return _memo.get_stats() if _memo is not None else None
+    
+    @profiled("Parser.run", rows_out=lambda result, *args, **kwargs: len(result))
+    def run(config: Configs, sensor_type: Data_Sensor_Type, id:int | None = None, year:int | None = None, month:int | None = None, use_cache:bool = True,
+            as_records:bool = False) -> DataTable | RecordList:
         """optional args (same as args for get_path function of Configs class):
         id:int sensor id
         year:int last 2 digits of desired year (eg 2022 would be 22)
-        month:int number associated with the desired month"""
+        month:int number associated with the desired month
+        use_cache:bool whether to load/store the parsed file from/in the on-disk cache (see data_cache.py), only applies to configs that read files
+        as_records:bool return the data row by row, as a sequence of compact records (see RecordList in data_table.py) rather than as a DataTable"""
+        if as_records:
+            return RecordList(Parser.run(config, sensor_type, id=id, year=year, month=month, use_cache=use_cache), get_record_type_for(config, sensor_type))
         path = config.get_path(sensor_type, id=id, year=year, month=month) #while this function can throw errors, they are deliberately not handled
+        data = _recall(config, path)
+        if data is not None:
+            return data
         
         if config.isdownloaded:
-            return download_from_webserver(path, config, sensor_type)
+            data = download_from_webserver(path, config, sensor_type)
+        elif use_cache:
+            #only parse the file if it changed since it was last cached
+            entry_path = data_cache.get_entry_path(config, sensor_type, id=id, year=year, month=month)
+            data = data_cache.load(entry_path, path)
+            if data is None:
+                data = parse_from_file(path, config, sensor_type)
+                data_cache.store(entry_path, path, data)
         else:
-            return parse_from_file(path, config, sensor_type)
+            data = parse_from_file(path, config, sensor_type)
+        return _remember(config, path, year, month, data)
+    
+    def run_many(config: Configs, sensor_type: Data_Sensor_Type, id:int | None, periods:List[Tuple[int | None, int | None]], fetcher:Fetcher | None = None) -> List[DataTable]:
+        """run for every (year, month) in periods, returns the parsed data in the same order as periods
         
-# return a list of the rows as dictionaries (with field names as keys, and data as values)
-def parse_from_file(file_path: str, config:Configs, sensor_type: Data_Sensor_Type) -> List[Dict[str, Any]]:
-    """uses the csv module to parse the given file"""
-    # ensure file_path is a file
-    if not os.path.isfile(file_path):
-        raise OSError("File `{}` Not Found".format(file_path))
+        for configs whose data is downloaded, every url is fetched concurrently by fetcher (defaults to a shared one, see data_fetcher.py)"""
+        if not config.isdownloaded:
+            return [Parser.run(config, sensor_type, id=id, year=year, month=month) for year, month in periods]
+        
+        if fetcher is None:
+            fetcher = get_default_fetcher()
+        urls = [config.get_path(sensor_type, id=id, year=year, month=month) for year, month in periods]
+        data = [_recall(config, url) for url in urls]
+        missing = [i for i, table in enumerate(data) if table is None]
+        for i, response in zip(missing, fetcher.fetch_all([urls[i] for i in missing])):
+            data[i] = _remember(config, urls[i], *periods[i], parse_webserver_response(response, config, sensor_type))
+        return data
     
-    with open(file_path, mode='r', newline='') as csvfile:
-        # get field names
-        fieldnames: List[str]=config.get_field_names(sensor_type)
+    def run_sensors(config: Configs, sensor_type: Data_Sensor_Type, ids:List[int | None], periods:List[Tuple[int | None, int | None]], fetcher:Fetcher | None = None) -> List[List[DataTable] | Exception]:
+        """run_many for every sensor id in ids, returns a list with the parsed data of every sensor (in the same order as ids),
+        or the error that stopped it from being parsed (so one missing file doesn't stop the others from being read)
+        
+        for configs whose data is downloaded, every url of every sensor is fetched concurrently"""
+        if not config.isdownloaded:
+            results: List[List[DataTable] | Exception] = []
+            for id in ids:
+                try:
+                    results.append(Parser.run_many(config, sensor_type, id, periods))
+                except (OSError, RuntimeError) as e:
+                    results.append(e)
+            return results
         
-        # open csv file
-        dialect = csv.Sniffer().sniff(csvfile.read(1024))
-        csvfile.seek(0)
-        reader = csv.DictReader(csvfile, fieldnames=fieldnames, dialect=dialect)
+        #download everything at once, then parse it
+        if fetcher is None:
+            fetcher = get_default_fetcher()
+        urls = [config.get_path(sensor_type, id=id, year=year, month=month) for id in ids for year, month in periods]
+        responses: List[bytes | DataTable | RuntimeError] = [_recall(config, url) for url in urls]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        for i, response in zip(missing, fetcher.fetch_all_or_errors([urls[i] for i in missing])):
+            responses[i] = response
+        results = []
+        for i in range(len(ids)):
+            sensor_responses = responses[i*len(periods):(i+1)*len(periods)]
+            errors = [response for response in sensor_responses if isinstance(response, Exception)]
+            try:
+                results.append(errors[0] if errors else [
+                    response if isinstance(response, DataTable) else _remember(config, url, year, month, parse_webserver_response(response, config, sensor_type))
+                    for url, (year, month), response in zip(urls[i*len(periods):(i+1)*len(periods)], periods, sensor_responses)])
+            except RuntimeError as e:
+                results.append(e)
+        return results
         
-        # convert data into useful format
-        reader = [x for x in reader] #convert reader to a list
-        data = [process(x, config, sensor_type) for x in reader[1:]]
+#parsed data by path (and, for files, their size and modification time), kept while Parser.memoize is enabled (None when it isn't)
+_memo: LRUCache | None = LRUCache(DEFAULT_MEMO_BYTES)
+
+def _get_memo_key(config:Configs, path:str) -> Tuple:
+    """what the data of path is kept under, files are keyed by their size and modification time too so changed files are parsed again"""
+    if config.isdownloaded:
+        return (path,)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path,)
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+def _recall(config:Configs, path:str) -> DataTable | None:
+    """the data kept for path, if any. it's copied, so fields removed by whoever gets it aren't removed from what's kept"""
+    if _memo is None:
+        return None
+    data = _memo.get(_get_memo_key(config, path))
+    return data.copy() if data is not None else None
+
+def _remember(config:Configs, path:str, year:int | None, month:int | None, data:DataTable) -> DataTable:
+    if _memo is None:
         return data
+    ttl = DOWNLOAD_TTL if config.isdownloaded and (year is None or get_period_bounds(year, month)[1] > datetime.now()) else None
+    _memo.put(_get_memo_key(config, path), data, get_table_size(data), ttl=ttl)
+    return data.copy()
 
-def download_from_webserver(url:str, config:Configs, sensor_type: Data_Sensor_Type):
+# return the data as a DataTable (with field names as keys, and columns of data as values)
+def parse_from_file(file_path: str, config:Configs, sensor_type: Data_Sensor_Type) -> DataTable:
+    """reads the given file straight into typed columns"""
+    # ensure file_path is a file
+    if not os.path.isfile(file_path):
+        raise OSError("File `{}` Not Found".format(file_path))
+    
+    with open(file_path, mode='r', encoding='utf-8', newline='') as csvfile:
+        csvfile.readline() #skip header, field names come from the config
+        rows = csvfile.read().splitlines()
+    count_bytes(os.path.getsize(file_path))
+    
+    return parse_rows(rows, ',', config, sensor_type)
+
+def download_from_webserver(url:str, config:Configs, sensor_type: Data_Sensor_Type, fetcher:Fetcher | None = None) -> DataTable:
     """
-    use the requests module to download a file from the webserver, then save it to the data folder
+    download a file from the webserver and parse it
     
     @param url: the URL for the data, returned by the get_path() function of the Configs class from the definitions module
+    @param fetcher: the Fetcher to download with, defaults to a shared one (see data_fetcher.py)
     @raises RuntimeError: if file could not be downloaded (url doesn't work/exist), or the given data source is not hosted on the webserver yet
     """
-    #get file from webserver w/ requests library, raise error is this couldn't be done
-    try:
-        response = requests.get(url).content
-    except:
-        raise RuntimeError("failed to connect to {}".format(url))
-    
-    #if isinstance(response, type(None)):
-    #    raise RuntimeError("connection successful, but no data found")
-    
+    #get file from webserver, raise error is this couldn't be done
+    if fetcher is None:
+        fetcher = get_default_fetcher()
+    return parse_webserver_response(fetcher.fetch(url), config, sensor_type)
+
+def parse_webserver_response(response:bytes, config:Configs, sensor_type: Data_Sensor_Type) -> DataTable:
+    """parse the semicolon separated rows returned by the webserver"""
     #decode and re-order response
-    response = response.decode('utf-8').split(sep=';')[:-1]
-    response.reverse()
+    rows = response.decode('utf-8').split(sep=';')[:-1] #all but last index because response ends in a semi-colon
+    rows.reverse()
     
-    #convert response into the format returned by the Parse function ( List[Dict[str,any]])
-    formatted_response: List[Dict[str,Any]] = []
-    fields = config.get_field_names(sensor_type)
-        
-    for row in response: #all but last index because response ends in a semi-colon
-        formattedrow: Dict[str,Any] = process(
-            dict(zip(
-                fields,
-                row.split(sep=',')
-            )),
-            config,
-            sensor_type
-        )
-        formatted_response.append(formattedrow)
-        
-    #return formatted response
-    return formatted_response
+    #convert response into the format returned by the Parse function (DataTable)
+    return parse_rows([row.strip() for row in rows], ',', config, sensor_type)
+
+#schemas that have already been resolved, with (config name, sensor type) as key and (field names, dtypes) as value
+_schemas: Dict[Tuple[str, Data_Sensor_Type], Tuple[List[str], List[np.dtype]]] = {}
 
-def process(row_data: Dict[str, str], config:Configs, sensor_type: Data_Sensor_Type) -> Dict[str, Any]:
+def get_schema(config:Configs, sensor_type: Data_Sensor_Type) -> Tuple[List[str], List[np.dtype]]:
+    """field names and numpy dtypes of the data from the given source, resolved once per source
+    
+    raises RuntimeError: if the given source is not implemented yet"""
+    key = (config.name, sensor_type)
+    if key not in _schemas:
+        _schemas[key] = (list(config.get_field_names(sensor_type)), [np.dtype(dtype) for dtype in config.get_field_dtypes(sensor_type)])
+    return _schemas[key]
+
+#record types that have already been created, with (config name, sensor type) as key
+_record_types: Dict[Tuple[str, Data_Sensor_Type], Type[Record]] = {}
+
+def get_record_type_for(config:Configs, sensor_type: Data_Sensor_Type) -> Type[Record]:
+    """the record type (see data_table.py) rows of data from the given source are returned as, created once per source
+
+    raises RuntimeError: if the given source is not implemented yet"""
+    key = (config.name, sensor_type)
+    if key not in _record_types:
+        name = "".join(part.capitalize() for part in "{}_{}".format(config.name, sensor_type.name).lower().split("_")) + "Record"
+        _record_types[key] = get_record_type(name, get_schema(config, sensor_type)[0])
+    return _record_types[key]
+
+@profiled("parse_rows", rows_in=lambda rows, *args, **kwargs: len(rows), rows_out=lambda result, *args, **kwargs: len(result))
+def parse_rows(rows: List[str], delimiter:str, config:Configs, sensor_type: Data_Sensor_Type) -> DataTable:
     """
-    Process a given parsed row of data from a csv file from the given source, 
-    convert data from str to the appropriate type
-    and return converted data
+    convert the given rows of delimited text (without a header) from the given source into a DataTable sorted by time,
+    every column is converted to its type in one pass rather than cell by cell
+    
+    raises RuntimeError: if a row doesn't have one value for every field
     """
-    #process row data appropriately for its data_source
-    processed_row: Dict[str, Any] = {}
-    match config:
-        case Configs.ALMOND:
-            match sensor_type:
-                case Data_Sensor_Type.WEATHER_STATION: #if from a weather station
-                    #process Date and Time
-                    processed_row["Date and Time"] = datetime.strptime(row_data.get("Date and Time"), "%Y-%m-%d %H:%M:%S")
-                    #process Field
-                    processed_row["Field"] = row_data.get("Field")
-                    #process Temperature
-                    processed_row["Temperature [℃]"] = float(row_data.get("Temperature [℃]"))
-                    #process Humidity
-                    processed_row["Humidity [RH%]"] = float(row_data.get("Humidity [RH%]"))
-                    #process Pressure
-                    processed_row["Pressure [hPa]"] = float(row_data.get("Pressure [hPa]"))
-                    #process Altitude
-                    processed_row["Altitude [m]"] = float(row_data.get("Altitude [m]"))
-                    #process VOC
-                    processed_row["VOC [kΩ]"] = float(row_data.get("VOC [kΩ]"))
-                case Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR: # if from a sap and moisture sensor
-                    #process Date and Time
-                    processed_row["Date and Time"] = datetime.strptime(row_data.get("Date and Time"), "%Y-%m-%d %H:%M:%S")
-                    #process Field
-                    processed_row["Field"] = row_data.get("Field")
-                    #process SensorID
-                    processed_row["Sensor ID"] = row_data.get("Sensor ID")
-                    #process Value1
-                    processed_row["Value 1"] = int(row_data.get("Value 1"))
-                    #process Value2
-                    processed_row["Value 2"] = int(row_data.get("Value 2"))
-                case Data_Sensor_Type.LUX_SENSOR:
-                    #process Date and Time
-                    processed_row["Date and Time"] = datetime.strptime(row_data.get("Date and Time"), "%Y-%m-%d %H:%M:%S")
-                    #process Light
-                    processed_row["Light (KLux)"] = float(row_data.get("Light (KLux)"))
-                case _:
-                    raise RuntimeError("desired data source not implemented yet")
-        case Configs.PISTACHIO:
-            match sensor_type:
-                case Data_Sensor_Type.WEATHER_STATION: #if from a weather station
-                    #process Date and Time
-                    processed_row["Date and Time"] = datetime.strptime(row_data.get("Date and Time"), "%Y-%m-%d %H:%M:%S")
-                    #process Temperature
-                    processed_row["Temperature [℃]"] = float(row_data.get("Temperature [℃]"))
-                    #process Humidity
-                    processed_row["Humidity [RH%]"] = float(row_data.get("Humidity [RH%]"))
-                    #process Pressure
-                    processed_row["Pressure [hPa]"] = float(row_data.get("Pressure [hPa]"))
-                    #process Altitude
-                    processed_row["Altitude [m]"] = float(row_data.get("Altitude [m]"))
-                    #process VOC
-                    processed_row["VOC [kΩ]"] = float(row_data.get("VOC [kΩ]"))
-                case Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR: # if from a sap and moisture sensor
-                    #process Date and Time
-                    processed_row["Date and Time"] = datetime.strptime(row_data.get("Date and Time"), "%Y-%m-%d %H:%M:%S")
-                    #process Value1
-                    processed_row["Value 1"] = int(row_data.get("Value 1"))
-                    #process Value2
-                    processed_row["Value 2"] = int(row_data.get("Value 2"))
-                case Data_Sensor_Type.LUX_SENSOR:
-                    #process Date and Time
-                    processed_row["Date and Time"] = datetime.strptime(row_data.get("Date and Time"), "%Y-%m-%d %H:%M:%S")
-                    #process Light
-                    processed_row["Light (KLux)"] = float(row_data.get("Light (KLux)"))
-                case _:
-                    raise RuntimeError("desired data source not implemented yet")
-        case _:
-            raise RuntimeError("desired config not yet implemented")
-    #return processed data
-    return processed_row
+    fields, dtypes = get_schema(config, sensor_type)
+    rows = [row for row in rows if row] #ignore blank lines
+    if len(rows) == 0:
+        return DataTable.empty(fields, dtypes)
+    
+    #split every row at once, then reshape into a row x field grid of strings
+    cells = delimiter.join(rows).split(delimiter)
+    if len(cells) != len(rows) * len(fields):
+        raise RuntimeError("expected {} values in every row, found rows with a different number of values".format(len(fields)))
+    grid = np.array(cells).reshape(len(rows), len(fields))
+    
+    #convert every column to the appropriate type
+    try:
+        data = DataTable.from_columns(fields, dtypes, [grid[:, i] for i in range(len(fields))])
+    except ValueError as e:
+        raise RuntimeError("could not convert data to the appropriate type: {}".format(e.args[0]))
+    return data.sort_by_time()
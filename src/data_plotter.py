@@ -0,0 +1,104 @@
+"""data_plotter.py: draws analyzed data onto matplotlib figures, either in an interactive window or rendered straight to image files without a display"""
+__author__ = "Anthony Rubick"
+
+import os
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import numpy as np
+
+#matplotlib is only imported once something is drawn, so runs that only want numbers don't pay for importing it
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+
+#size of rendered figures
+RENDER_WIDTH_PX = 1920
+RENDER_HEIGHT_PX = 1080
+RENDER_DPI = 100
+
+def new_figure(interactive:bool) -> 'Figure':
+    """a figure to draw on, interactive figures are managed by pyplot (so they can be shown), others aren't tied to any display"""
+    if interactive:
+        import matplotlib.pyplot as plt
+        return plt.figure()
+    from matplotlib.figure import Figure
+    return Figure(figsize=(RENDER_WIDTH_PX/RENDER_DPI, RENDER_HEIGHT_PX/RENDER_DPI), dpi=RENDER_DPI)
+
+def show():
+    """show every interactive figure"""
+    import matplotlib.pyplot as plt
+    plt.show()
+
+def get_output_path(output_dir:str, config_name:str, sensor_ids:Dict[str, int | None], startdate:datetime, enddate:datetime, file_format:str) -> str:
+    """file a rendered figure is saved to, named after the config, the sensors it shows, and the date range"""
+    sensors = "_".join("{}{}".format(name, id if id is not None else "") for name, id in sensor_ids.items())
+    file_name = "{}_{}_{:%Y%m%d}-{:%Y%m%d}.{}".format(config_name.lower(), sensors, startdate, enddate, file_format)
+    return os.path.join(output_dir, file_name)
+
+def get_subplot(figure:'Figure', rows:int, cols:int, index:int | Tuple[int, int]) -> 'Axes':
+    """the subplot of figure at index (same arguments as Figure.add_subplot), created the first time it's asked for"""
+    first, last = index if isinstance(index, tuple) else (index, index)
+    for axes in figure.axes:
+        spec = axes.get_subplotspec()
+        if spec is not None and spec.get_geometry() == (rows, cols, first-1, last-1):
+            return axes
+    return figure.add_subplot(rows, cols, index)
+
+def plot_series(axes:'Axes', x:np.ndarray, y:np.ndarray, title:str, label:str | None = None, linewidth:float = 1, downsample:bool = False):
+    """plot y against x on axes, if downsample is true the series is first reduced to about one point per horizontal pixel of axes (see lttb)"""
+    if downsample:
+        indexes = lttb(x, y, max(3, int(axes.bbox.width)))
+        x, y = x[indexes], y[indexes]
+    if label is not None:
+        axes.plot(x,y,linewidth=linewidth, label=label)
+        axes.legend()
+    else:
+        axes.plot(x,y)
+    axes.set_title("{}\n".format(title))
+    axes.tick_params(axis='x', labelrotation=45)
+
+def lttb(x:np.ndarray, y:np.ndarray, threshold:int) -> np.ndarray:
+    """indexes of about `threshold` points of the series that keep its visual shape (largest triangle three buckets),
+    x may be numeric or datetime64, runs of NaN in y are kept as a single NaN so gaps still show up when plotted"""
+    if len(y) <= threshold:
+        return np.arange(len(y))
+    x = x.astype('datetime64[s]').astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) else x.astype(np.float64)
+    y = y.astype(np.float64)
+
+    #downsample every run of finite values separately, each gets a share of threshold proportional to its length
+    finite = np.isfinite(y)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], finite.astype(np.int8), [0]))))
+    indexes: List[np.ndarray] = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if indexes or start > 0:
+            indexes.append(np.array([start-1])) #one NaN before the run, to keep the gap
+        share = max(2, int(round(threshold * (end-start) / len(y))))
+        indexes.append(start + _lttb_run(x[start:end], y[start:end], share))
+    if len(edges) > 0 and edges[-1] < len(y):
+        indexes.append(np.array([edges[-1]]))
+    return np.concatenate(indexes) if indexes else np.empty(0, dtype=np.int64)
+
+def _lttb_run(x:np.ndarray, y:np.ndarray, threshold:int) -> np.ndarray:
+    """lttb for a series with no NaN's"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n) if threshold >= n else np.array([0, n-1])
+
+    #every bucket (except the first and last, which hold the first and last point) picks the point that forms the largest triangle
+    #with the point picked in the previous bucket and the average of the next bucket
+    bucket_edges = (np.arange(threshold-1) * (n-2) / (threshold-2)).astype(np.int64) + 1
+    bucket_edges[-1] = n-1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n-1
+    previous = 0
+    for i in range(threshold-2):
+        start, end = bucket_edges[i], bucket_edges[i+1]
+        next_start, next_end = end, bucket_edges[i+2] if i+2 < len(bucket_edges) else n
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        areas = np.abs((x[previous]-average_x)*(y[start:end]-y[previous]) - (x[previous]-x[start:end])*(average_y-y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i+1] = previous
+    return selected
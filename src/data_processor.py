@@ -3,15 +3,21 @@ __author__ = "Anthony Rubick"
 
 #with the data, run various data analysis operations on it
 from datetime import datetime, timedelta
-from typing import Any, Dict, List
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from data_aggregator import aggregate
+from data_profiler import profiled
+from data_table import TIME_FIELD, DataTable
 from definitions import Configs, Data_Sensor_Type
 
 class Processor: 
     """processes data"""    
-    def __init__(self, data: List[Dict[str, Any]], config:Configs, sensor_type: Data_Sensor_Type, sensor_id:int | None=None):
-        """constructor"""
-        self.data: Dict[datetime,Dict[str, Any]] = {}
-        self.fields: List[str] = config.get_field_names(sensor_type)
+    def __init__(self, data: DataTable, config:Configs, sensor_type: Data_Sensor_Type, sensor_id:int | None=None):
+        """constructor, data is operated on in place rather than copied, and kept in ascending time order"""
+        self.data: DataTable = data.sort_by_time()
+        self.config: Configs = config
         self.sensor_type: Data_Sensor_Type = sensor_type
         self.sensor_id: int = 0
         #if the data source needs sensor ID's, ensure one was given
@@ -19,79 +25,64 @@ class Processor:
             if (not isinstance(sensor_id,type(None))) and sensor_id in config.get_sensor_ids(sensor_type):
                 self.sensor_id = sensor_id
             else:
-                raise RuntimeError("sensor_id parameter was either not given, or outside of valid range ({} to {} for this sensor)".format(min(config.get_sensor_ids),max(config.get_sensor_ids())))
-
-        #restructure data such that it is a dictionary with time as the key and (a dictionary with field name as key and data as value) as the value
-        for row in data:
-            self.data[row.pop("Date and Time")] = row
+                raise RuntimeError("sensor_id parameter was either not given, or outside of valid range ({} to {} for this sensor)".format(min(config.get_sensor_ids(sensor_type)),max(config.get_sensor_ids(sensor_type))))
+    
+    @property
+    def fields(self) -> List[str]:
+        """names of the fields still in data"""
+        return self.data.fields
     
     def __str__(self) -> str:
         #header
         str_rep:str = ','.join(self.fields) + '\n'
         #content
-        for row_timestamp, row_data in self.data.items():
-            str_rep += row_timestamp.strftime("%Y-%m-%d %H:%M:%S") + ","
-            str_rep += ','.join( [ str(v) for v in row_data.values()] ) + "\n"
+        for row in self.data.rows():
+            str_rep += row[0].strftime("%Y-%m-%d %H:%M:%S") + ","
+            str_rep += ','.join( [ str(v) for v in row[1:]] ) + "\n"
         #return
         return str_rep
     
     def remove_field(self, field_to_remove:str):
         """removes the given field from data"""
-        for data_entry in self.data.values():
-            if field_to_remove in data_entry:
-                del data_entry[field_to_remove]
-        if field_to_remove in self.fields:
-            self.fields.remove(field_to_remove)
+        if field_to_remove != TIME_FIELD and field_to_remove in self.data:
+            del self.data[field_to_remove]
         
+    @profiled("Processor.remove_fields", rows_in=lambda self, *args, **kwargs: len(self.data), rows_out=lambda result, self, *args, **kwargs: len(self.data))
     def remove_fields(self, fields_to_remove: List[str]):
         """removes the given fields from data"""
         for field in fields_to_remove:
             self.remove_field(field)
             
+    @profiled("Processor.keep_time_range", rows_in=lambda self, *args, **kwargs: len(self.data), rows_out=lambda result, self, *args, **kwargs: len(self.data))
     def keep_time_range(self, from_datetime: datetime, to_datetime: datetime):
-        """remove data that's not in the given time frame"""
-        data_to_keep: Dict[datetime, Dict[str, Any]] = {}
-        for key in self.data.keys():
-            if key >= from_datetime and key <= to_datetime:
-                data_to_keep[key] = self.data.get(key) 
-        
-        self.data.clear()
-        self.data = data_to_keep
+        """remove data that's not in the given time frame, data is sorted so this is a binary search, and the remaining data is a view rather than a copy"""
+        self.data = self.data.between(from_datetime, to_datetime)
     
-    def smoothen_data(self, starttime:datetime, interval: timedelta):
-        """smoothen data out, storing average readings in every `interval` starting at `starttime`"""
-        smooth_data: Dict[datetime,Dict[str, Any]] = {}
+    @profiled("Processor.smoothen_data", rows_in=lambda self, *args, **kwargs: len(self.data), rows_out=lambda result, self, *args, **kwargs: len(self.data))
+    def smoothen_data(self, starttime:datetime, interval: timedelta, aggregates:List[str] | Tuple[str, ...] = ("mean",)):
+        """smoothen data out, storing average readings in every `interval` starting at `starttime`
         
-        #calc count and sum
-        for timestamp, data in self.data.items():
-            #calculate time interval this row falls into
-            units_from_start = (timestamp-starttime) // interval
-            timegroup = starttime + (interval * units_from_start)
-            smooth_data[timegroup] = {}
-            
-            # update count for this time interval
-            if not "Count" in smooth_data[timegroup]:
-                smooth_data[timegroup]['Count'] = 1
-            else: 
-                smooth_data[timegroup]['Count'] += 1
-            # update sum for all numeric data
-            for field, fielddata in data.items():
-                if type(fielddata) in (int, float):
-                    if not field in smooth_data[timegroup]:
-                        smooth_data[timegroup][field] = 0
-                    smooth_data[timegroup][field] += fielddata
-                else: 
-                    smooth_data[timegroup][field] = fielddata
-                    
-        #calc average from count and sum
-        for data in smooth_data.values():
-            count = data.get('Count')
-            del data['Count']
-            
-            for fielddata in data.values():
-                if type(fielddata) in (int, float):
-                    fielddata /= count
-                    
-        self.data.clear()
-        self.data = smooth_data
-        
\ No newline at end of file
+        other aggregates ("min", "max", "sum", "count") can be stored too, see data_aggregator.py for how their fields are named"""
+        self.data = aggregate(self.data, starttime, interval, aggregates)
+
+def split_into_days(tables: Iterable[DataTable]) -> Iterator[DataTable]:
+    """re-chunk a stream of tables (in chronological order, like consecutive data files) into one table per calendar day,
+    only the current day's readings are held back between tables, so memory use doesn't grow with the length of the stream"""
+    carry: DataTable | None = None #readings of the latest day seen so far, which may continue in the next table
+    for table in tables:
+        if len(table) == 0:
+            continue
+        table = table.sort_by_time()
+        if carry is not None:
+            table = DataTable.concatenate([carry, table])
+        
+        #find where every day starts, then yield every day except the last one
+        days = table.timestamps.astype('datetime64[D]')
+        day_starts = np.flatnonzero(days[1:] != days[:-1]) + 1
+        start = 0
+        for end in day_starts:
+            yield table.take(slice(start, end))
+            start = end
+        carry = table.take(slice(start, None))
+    if carry is not None:
+        yield carry
@@ -0,0 +1,128 @@
+"""data_profiler.py: opt-in timing of every stage of the pipeline (downloading, parsing, processing, analyzing, plotting), reported per stage at the end of a run"""
+__author__ = "Anthony Rubick"
+
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List
+
+class Profiler:
+    """records the wall time, rows in and out, and bytes read of every call to a profiled stage while it's active (see profiled and measure),
+    optionally running cProfile alongside it. only one profiler is active at a time
+
+    with Profiler() as profiler:
+        Wrapper.run(...)
+    print(profiler.format_report())"""
+    def __init__(self, cprofile_path: str | None = None):
+        """constructor
+
+        cprofile_path:str if given, the run is also profiled with cProfile and its stats are dumped to this file (readable with pstats or snakeviz)"""
+        self.cprofile_path: str | None = cprofile_path
+        #every call, in the order they finished: stage, seconds, rows in, rows out, bytes read
+        self.calls: List[Dict[str, Any]] = []
+        #calls that haven't finished yet, innermost last, bytes read are counted towards the innermost one
+        self.stack: List[Dict[str, Any]] = []
+        self.seconds: float = 0.0
+        self.__cprofile = None
+        self.__previous: Profiler | None = None
+        self.__started: float = 0.0
+
+    def __enter__(self) -> 'Profiler':
+        global _active
+        self.__previous, _active = _active, self
+        if self.cprofile_path is not None:
+            import cProfile #only imported when it's used
+            self.__cprofile = cProfile.Profile()
+            self.__cprofile.enable()
+        self.__started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        global _active
+        self.seconds += time.perf_counter() - self.__started
+        if self.__cprofile is not None:
+            self.__cprofile.disable()
+            self.__cprofile.dump_stats(self.cprofile_path)
+            self.__cprofile = None
+        _active = self.__previous
+
+    def get_report(self) -> Dict[str, Dict[str, Any]]:
+        """totals of every stage, in the order stages were first called: calls, seconds, rows in, rows out, bytes read.
+        the time of a stage includes the stages it called (eg. Parser.run includes parse_rows)"""
+        report: Dict[str, Dict[str, Any]] = {}
+        for call in self.calls:
+            totals = report.setdefault(call["stage"], {"calls": 0, "seconds": 0.0, "rows_in": 0, "rows_out": 0, "bytes_read": 0})
+            totals["calls"] += 1
+            totals["seconds"] += call["seconds"]
+            totals["rows_in"] += call["rows_in"] or 0
+            totals["rows_out"] += call["rows_out"] or 0
+            totals["bytes_read"] += call["bytes_read"]
+        return report
+
+    def format_report(self) -> str:
+        """the report as a table, one line per stage"""
+        lines = ["{:<30} {:>6} {:>10} {:>11} {:>11} {:>12}".format("stage", "calls", "ms", "rows in", "rows out", "bytes read")]
+        for stage, totals in self.get_report().items():
+            lines.append("{:<30} {:>6} {:>10.1f} {:>11,} {:>11,} {:>12,}".format(
+                stage, totals["calls"], totals["seconds"] * 1000, totals["rows_in"], totals["rows_out"], totals["bytes_read"]))
+        lines.append("{:<30} {:>6} {:>10.1f}".format("total (wall)", "", self.seconds * 1000))
+        return "\n".join(lines)
+
+    def start_call(self, stage: str, rows_in: int | None) -> Dict[str, Any]:
+        call = {"stage": stage, "seconds": 0.0, "rows_in": rows_in, "rows_out": None, "bytes_read": 0, "started": time.perf_counter()}
+        self.stack.append(call)
+        return call
+
+    def end_call(self, call: Dict[str, Any], rows_out: int | None):
+        call["seconds"] = time.perf_counter() - call.pop("started")
+        call["rows_out"] = rows_out
+        self.stack.remove(call)
+        self.calls.append(call)
+
+#the profiler recording calls, None when profiling is off (the default)
+_active: Profiler | None = None
+
+def count_bytes(bytes_read: int):
+    """count bytes read (from a file or the webserver) towards the innermost profiled call, does nothing when profiling is off"""
+    if _active is not None and _active.stack:
+        _active.stack[-1]["bytes_read"] += bytes_read
+
+def profiled(stage: str, rows_in: Callable[..., int] | None = None, rows_out: Callable[..., int] | None = None):
+    """decorator recording every call to the decorated function as a call to stage while a Profiler is active,
+    when none is, the only cost is checking that. calls from other threads than the main one (like concurrent downloads) aren't recorded
+
+    rows_in: function (same args as the decorated function) -> number of rows going in
+    rows_out: function (result, then the same args as the decorated function) -> number of rows coming out
+    either one left as None isn't recorded"""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = _active
+            if profiler is None or threading.current_thread() is not threading.main_thread():
+                return function(*args, **kwargs)
+            call = profiler.start_call(stage, rows_in(*args, **kwargs) if rows_in is not None else None)
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                #a failed call has no rows out, and counting them mustn't hide the error
+                profiler.end_call(call, None)
+                raise
+            profiler.end_call(call, rows_out(result, *args, **kwargs) if rows_out is not None else None)
+            return result
+        return wrapper
+    return decorator
+
+@contextmanager
+def _measure(profiler: Profiler, stage: str, rows: int | None) -> Iterator[None]:
+    call = profiler.start_call(stage, rows)
+    try:
+        yield
+    finally:
+        profiler.end_call(call, rows)
+
+def measure(stage: str, rows: int | None = None):
+    """context manager recording the code in it as a call to stage while a Profiler is active"""
+    if _active is None:
+        return nullcontext()
+    return _measure(_active, stage, rows)
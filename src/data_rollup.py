@@ -0,0 +1,207 @@
+"""data_rollup.py: precomputed hourly and daily rollups (sum/min/max/count of every numeric field) of every data file, so long ranges can be smoothed without reading every reading"""
+__author__ = "Anthony Rubick"
+
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from data_aggregator import AGGREGATES, COUNT_FIELD, aggregate, get_aggregate_field, get_bins, group_bins
+from data_analyzer import calc_sap_series
+from data_cache import save_column
+from data_catalog import find_periods
+from data_parser import Parser
+from data_profiler import profiled
+from data_table import TIME_FIELD, DataTable
+from definitions import CACHE_DIR, Configs, Data_Sensor_Type, get_period_bounds
+
+#supported rollups, with the name as key and the interval readings are rolled up into as value, intervals start at midnight
+ROLLUPS: Dict[str, timedelta] = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+}
+#aggregates stored for every numeric field, the others (mean) are calculated from these
+STORED_AGGREGATES = ("sum", "min", "max", "count")
+#series derived from every reading that are rolled up too, so the spread of every reading's value is kept (see load_smoothened for why they're left out of it)
+DERIVED_FIELDS = ["Sap Flux Density"]
+
+#how every aggregate of a field is calculated from the stored aggregates of a rollup,
+#(stored aggregate, function (stored values, start index of every interval, count of every interval) -> aggregated values)
+REAGGREGATES = {
+    "mean": ("sum", lambda sums, starts, counts: np.add.reduceat(sums, starts, dtype=np.float64) / counts),
+    "min": ("min", AGGREGATES["min"]),
+    "max": ("max", AGGREGATES["max"]),
+    "sum": ("sum", AGGREGATES["sum"]),
+    "count": ("count", AGGREGATES["count"]),
+}
+
+#every interval starts at a whole multiple of the rollup interval since this time
+EPOCH = datetime(1970, 1, 1)
+
+#name of the file in every store that remembers which files are rolled up, and what from
+META_FILE = "meta.json"
+#bumped whenever the way rollups are stored changes, stores with a different version are rebuilt
+FORMAT_VERSION = 3
+
+def find_rollup(startdate:datetime, enddate:datetime, interval:timedelta | None) -> str | None:
+    """the coarsest rollup data in the range can be smoothed to `interval` from, or None if there is none
+
+    a rollup can be used if interval is a whole multiple of the rollup's interval, and the range is made of whole rollup intervals:
+    startdate is the start of one, and enddate is the last second of one (eg. 23:59:59 for daily rollups)"""
+    if interval is None:
+        return None
+    for name, rollup_interval in sorted(ROLLUPS.items(), key=lambda item: item[1], reverse=True):
+        if interval % rollup_interval == timedelta(0) and (
+            (startdate - EPOCH) % rollup_interval == timedelta(0)) and (
+            (enddate + timedelta(seconds=1) - EPOCH) % rollup_interval == timedelta(0)):
+            return name
+    return None
+
+def get_store_dir(config:Configs, sensor_type:Data_Sensor_Type, id:int | None, rollup:str) -> str:
+    """directory the given rollup of every file of the given sensor is stored in, with a file per data file (named by get_period_key) holding its rollup"""
+    return os.path.join(CACHE_DIR, "rollups", config.name.lower(), sensor_type.name.lower(), str(id) if id is not None else "all", rollup)
+
+def get_period_key(year:int, month:int | None) -> str:
+    """name a file's rollup is stored under in the store's metadata"""
+    return "{}_{:0>2}".format(year, month) if month is not None else str(year)
+
+@profiled("data_rollup.build", rows_in=lambda data, *args, **kwargs: len(data), rows_out=lambda result, *args, **kwargs: len(result))
+def build(data:DataTable, sensor_type:Data_Sensor_Type, rollup:str) -> DataTable:
+    """roll the readings of a file up into the given rollup's intervals, with the stored aggregates of every numeric field (and derived series)
+
+    raises RuntimeError: if rollup isn't supported"""
+    if rollup not in ROLLUPS:
+        raise RuntimeError("rollup `{}` not supported, supported rollups are {}".format(rollup, list(ROLLUPS.keys())))
+    data = data.sort_by_time().copy()
+    if sensor_type == Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR and len(data) > 0:
+        #sap flux density only depends on Value 1 and the time, the a and b coefficients only affect relative moisture, which isn't rolled up
+        data["Sap Flux Density"] = calc_sap_series(data["Value 1"], data["Value 2"], data.timestamps, 0, 0)["Sap Flux Density"]
+    return aggregate(data, EPOCH, ROLLUPS[rollup], STORED_AGGREGATES)
+
+@profiled("data_rollup.load", rows_out=lambda result, *args, **kwargs: len(result))
+def load(config:Configs, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime, enddate:datetime, rollup:str) -> DataTable:
+    """the given rollup of every file in the range, trimmed to intervals starting from startdate to enddate (inclusive)
+
+    the rollup of every file of a sensor is stored separately, so only files that aren't rolled up yet, or that changed since they were,
+    are rolled up and written to the store (the others aren't touched).
+    rollups of downloaded months are only stored once the month is over, until then they are built every time
+
+    raises RuntimeError: if there is no data in the range"""
+    periods = sorted(find_periods(config, sensor_type, id, startdate, enddate), key=lambda period: (period[0], period[1] or 0))
+    if len(periods) == 0:
+        raise RuntimeError("no data found for the given sensor between {} and {}".format(startdate, enddate))
+    store_dir = get_store_dir(config, sensor_type, id, rollup)
+    meta = _read_meta(store_dir)
+
+    #roll up the files that aren't stored, or changed since they were
+    tables: List[DataTable] = []
+    for year, month in periods:
+        key = get_period_key(year, month)
+        if _is_stored(meta, config, sensor_type, id, year, month):
+            tables.append(_read_period(store_dir, key, meta["periods"][key]["fields"]))
+            continue
+        rolled = build(Parser.run(config, sensor_type, id=id, year=year, month=month), sensor_type, rollup)
+        source = _get_source(config, sensor_type, id, year, month)
+        if source is not None:
+            meta = _write(store_dir, meta, key, source, rolled)
+        tables.append(rolled)
+    return DataTable.concatenate(tables).sort_by_time().between(startdate, enddate)
+
+def reaggregate(rolled:DataTable, starttime:datetime, interval:timedelta, aggregates:List[str] | Tuple[str, ...] = ("mean",)) -> DataTable:
+    """aggregate a rollup into every `interval` starting at `starttime`, the result is the same as aggregating the readings it was built from
+    (see aggregate in data_aggregator.py) as long as every interval is made of whole rollup intervals
+
+    raises RuntimeError: if an aggregate isn't supported, or interval isn't a positive whole number of seconds"""
+    for name in aggregates:
+        if name not in REAGGREGATES:
+            raise RuntimeError("aggregate `{}` not supported, supported aggregates are {}".format(name, list(REAGGREGATES.keys())))
+
+    bins = get_bins(rolled, starttime, interval)
+    order, starts, timegroups = group_bins(bins)
+    if order is not None:
+        rolled = rolled.take(order)
+    counts = np.add.reduceat(rolled[COUNT_FIELD], starts) if len(starts) > 0 else np.empty(0, dtype=np.int64)
+
+    aggregated = DataTable()
+    aggregated[TIME_FIELD] = np.datetime64(starttime, 's') + timegroups * np.timedelta64(interval // timedelta(seconds=1), 's')
+    for field, column in rolled.items():
+        if field in (TIME_FIELD, COUNT_FIELD) or field.endswith(" (min)") or field.endswith(" (max)"):
+            continue
+        if field.endswith(" (sum)"):
+            #numeric field, rolled up into its stored aggregates
+            field = field[:-len(" (sum)")]
+            for name in aggregates:
+                stored, reaggregate_function = REAGGREGATES[name]
+                values = counts if stored == "count" else rolled[get_aggregate_field(field, stored)]
+                aggregated[get_aggregate_field(field, name)] = reaggregate_function(values, starts, counts) if len(starts) > 0 else np.empty(0) #reduceat can't handle empty tables
+        else:
+            #non numeric data is taken from the first interval
+            aggregated[field] = column[starts]
+    return aggregated
+
+def load_smoothened(config:Configs, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime, enddate:datetime, interval:timedelta, rollup:str,
+                    aggregates:List[str] | Tuple[str, ...] = ("mean",)) -> DataTable:
+    """the readings in the range smoothened to `interval` (like smoothen_data in data_processor.py), calculated from the given rollup
+
+    derived series are left out: without rollups they're calculated after smoothening, from the smoothened readings (eg. sap flux density from the mean ΔT,
+    with minT from the smoothened nighttime readings), which isn't the same as smoothening the series derived from every reading.
+    leaving them out lets the Analyzer derive them from the smoothened readings here too, so the results match the ones without rollups"""
+    smoothened = reaggregate(load(config, sensor_type, id, startdate, enddate, rollup), startdate, interval, aggregates)
+    for field in DERIVED_FIELDS:
+        for name in aggregates:
+            if get_aggregate_field(field, name) in smoothened and name != "count":
+                del smoothened[get_aggregate_field(field, name)]
+    return smoothened
+
+def _get_source(config:Configs, sensor_type:Data_Sensor_Type, id:int | None, year:int, month:int | None) -> Dict[str, Any] | None:
+    """what a file's rollup is built from, its rollup is out of date once this changes. None if the rollup can't be stored yet (a downloaded month that isn't over)"""
+    if config.isdownloaded:
+        return {"complete": True} if get_period_bounds(year, month)[1] <= datetime.now() else None
+    path = config.get_path(sensor_type, id=id, year=year, month=month)
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _is_stored(meta:Dict[str, Any], config:Configs, sensor_type:Data_Sensor_Type, id:int | None, year:int, month:int | None) -> bool:
+    period = meta["periods"].get(get_period_key(year, month))
+    if period is None:
+        return False
+    try:
+        source = _get_source(config, sensor_type, id, year, month)
+    except OSError:
+        return False
+    return source is not None and all(period.get(key) == value for key, value in source.items())
+
+def _read_meta(store_dir:str) -> Dict[str, Any]:
+    """metadata of a store, "periods" maps every stored file (see get_period_key) to its source and the fields of its rollup"""
+    try:
+        with open(os.path.join(store_dir, META_FILE), mode='r', encoding='utf-8') as metafile:
+            meta = json.load(metafile)
+        if meta.get("version") == FORMAT_VERSION:
+            return meta
+    except (OSError, ValueError):
+        pass
+    return {"version": FORMAT_VERSION, "periods": {}}
+
+def _read_period(store_dir:str, key:str, fields:List[str]) -> DataTable:
+    """the stored rollup of one file, its columns are memory mapped views of a single record array (a file per column would mean far more files to open)"""
+    records = np.load(os.path.join(store_dir, "{}.npy".format(key)), mmap_mode='r')
+    return DataTable({field: records[str(i)] for i, field in enumerate(fields)})
+
+def _write(store_dir:str, meta:Dict[str, Any], key:str, source:Dict[str, Any], rolled:DataTable) -> Dict[str, Any]:
+    """replace (or add) the rollup of one file in the store, the other files' rollups aren't touched, returns the new metadata
+
+    the rollup is written before the metadata, and a file's rollup is only used if its source matches the metadata,
+    so an interrupted write leaves the file's old rollup out of date rather than corrupt"""
+    os.makedirs(store_dir, exist_ok=True)
+    records = np.empty(len(rolled), dtype=[(str(i), column.dtype) for i, column in enumerate(rolled.values())])
+    for i, column in enumerate(rolled.values()):
+        records[str(i)] = column
+    save_column(os.path.join(store_dir, "{}.npy".format(key)), records)
+    meta = {"version": FORMAT_VERSION, "periods": {**meta["periods"], key: {**source, "fields": rolled.fields}}}
+    meta_path = os.path.join(store_dir, META_FILE)
+    with open(meta_path + ".tmp", mode='w', encoding='utf-8') as metafile:
+        json.dump(meta, metafile, ensure_ascii=False)
+    os.replace(meta_path + ".tmp", meta_path)
+    return meta
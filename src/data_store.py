@@ -0,0 +1,199 @@
+"""data_store.py: append-only binary store of every sensor's readings, one file of fixed-width records per sensor that is memory mapped for reads"""
+__author__ = "Anthony Rubick"
+
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from data_catalog import find_periods
+from data_fetcher import Fetcher
+from data_parser import Parser, get_schema
+from data_table import TIME_FIELD, DataTable
+from definitions import CACHE_DIR, Configs, Data_Sensor_Type
+
+#bumped whenever the way records are stored changes, stores with a different version can't be read (delete them and import again)
+FORMAT_VERSION = 1
+#text fields are stored as an index into a list of the distinct values of that field (kept in the header), so every record has the same width
+LABEL_DTYPE = np.dtype('uint16')
+
+class TimeSeriesStore:
+    """stores the readings of every sensor of a config as fixed-width records (a timestamp and every field of the sensor type, see get_record_dtype),
+    in ascending time order, in one file per sensor next to a small JSON header
+
+    records are only ever appended, so readers can memory map a file while it's written to.
+    range queries binary search the memory mapped timestamps, so only the pages holding the range are read,
+    and every process reading the same sensor shares them through the OS page cache"""
+    def __init__(self, config:Configs, store_dir:str = os.path.join(CACHE_DIR, "store")):
+        """constructor"""
+        self.config: Configs = config
+        self.store_dir: str = os.path.join(store_dir, config.name.lower())
+
+    def get_paths(self, sensor_type:Data_Sensor_Type, id:int | None) -> Tuple[str, str]:
+        """(records file, header file) of the given sensor"""
+        base = os.path.join(self.store_dir, sensor_type.name.lower(), str(id) if id is not None else "all")
+        return base + ".bin", base + ".json"
+
+    def get_record_dtype(self, sensor_type:Data_Sensor_Type) -> np.dtype:
+        """the record every reading of the given sensor type is stored as, with a field per field of the config (in the same order)
+
+        raises RuntimeError: if config doesn't support the given sensor type"""
+        fields, dtypes = get_schema(self.config, sensor_type)
+        return np.dtype([(field, LABEL_DTYPE if dtype.kind == 'U' else dtype) for field, dtype in zip(fields, dtypes)])
+
+    def get_header(self, sensor_type:Data_Sensor_Type, id:int | None) -> Dict[str, Any]:
+        """the header of the given sensor's records, "labels" holds the distinct values of every text field
+
+        raises RuntimeError: if the sensor's records were stored with a different format or fields than the config's"""
+        header_path = self.get_paths(sensor_type, id)[1]
+        fields = self.config.get_field_names(sensor_type)
+        try:
+            with open(header_path, mode='r', encoding='utf-8') as headerfile:
+                header = json.load(headerfile)
+        except (OSError, ValueError):
+            return {"version": FORMAT_VERSION, "fields": fields, "labels": {field: [] for field, dtype in zip(*get_schema(self.config, sensor_type)) if dtype.kind == 'U'}}
+        if header.get("version") != FORMAT_VERSION or header.get("fields") != fields:
+            raise RuntimeError("records in {} were stored with a different format or fields, delete them and import them again".format(header_path))
+        return header
+
+    def get_records(self, sensor_type:Data_Sensor_Type, id:int | None) -> np.ndarray:
+        """every stored record of the given sensor, memory mapped (read only). a record that was only partly written is left out"""
+        records_path = self.get_paths(sensor_type, id)[0]
+        dtype = self.get_record_dtype(sensor_type)
+        rows = os.path.getsize(records_path) // dtype.itemsize if os.path.isfile(records_path) else 0
+        if rows == 0:
+            return np.empty(0, dtype=dtype) #empty files can't be memory mapped
+        return np.memmap(records_path, dtype=dtype, mode='r', shape=(rows,))
+
+    def count(self, sensor_type:Data_Sensor_Type, id:int | None) -> int:
+        """number of stored readings of the given sensor"""
+        return len(self.get_records(sensor_type, id))
+
+    def get_last(self, sensor_type:Data_Sensor_Type, id:int | None) -> datetime | None:
+        """timestamp of the newest stored reading of the given sensor, None if there are none"""
+        records = self.get_records(sensor_type, id)
+        return records[TIME_FIELD][-1].astype(datetime) if len(records) > 0 else None
+
+    def load(self, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime | None = None, enddate:datetime | None = None) -> DataTable:
+        """the stored readings of the given sensor between startdate and enddate (inclusive), as a table with the same fields as parsed data
+
+        numeric columns are views of the memory mapped records, text fields are decoded for the readings in the range only"""
+        records = self.get_records(sensor_type, id)
+        timestamps = records[TIME_FIELD]
+        start = np.searchsorted(timestamps, np.datetime64(startdate, 's'), side='left') if startdate is not None else 0
+        end = np.searchsorted(timestamps, np.datetime64(enddate, 's'), side='right') if enddate is not None else len(records)
+        records = records[start:end]
+
+        labels = self.get_header(sensor_type, id)["labels"]
+        fields, dtypes = get_schema(self.config, sensor_type)
+        data = DataTable()
+        for field, dtype in zip(fields, dtypes):
+            if field in labels:
+                data[field] = np.array(labels[field], dtype=dtype)[records[field]] if len(records) > 0 else np.empty(0, dtype=dtype)
+            else:
+                data[field] = records[field]
+        return data
+
+    def append(self, sensor_type:Data_Sensor_Type, id:int | None, data:DataTable) -> int:
+        """append the readings in data (parsed data of the given sensor, with every field of the config) that are newer than the newest stored one,
+        returns the number of readings that were appended. older readings can only be added by rewriting the sensor's records (see rewrite)
+
+        raises RuntimeError: if data doesn't have every field of the config"""
+        fields = get_schema(self.config, sensor_type)[0]
+        if data.fields != fields:
+            raise RuntimeError("data to store has fields {}, expected {}".format(data.fields, fields))
+        data = data.sort_by_time()
+        last = self.get_last(sensor_type, id)
+        if last is not None:
+            data = data.take(slice(np.searchsorted(data.timestamps, np.datetime64(last, 's'), side='right'), None))
+        if len(data) == 0:
+            return 0
+
+        #the header is written before the records, so every stored record's labels are always known
+        records = self.__encode(sensor_type, id, data)
+        records_path = self.get_paths(sensor_type, id)[0]
+        with open(records_path, mode='ab') as recordsfile:
+            #drop a record that was only partly written by an interrupted append
+            partial = recordsfile.tell() % records.dtype.itemsize
+            if partial != 0:
+                recordsfile.truncate(recordsfile.tell() - partial)
+                recordsfile.seek(0, os.SEEK_END)
+            recordsfile.write(records.tobytes())
+        return len(records)
+
+    def rewrite(self, sensor_type:Data_Sensor_Type, id:int | None, data:DataTable) -> int:
+        """replace every stored reading of the given sensor with the readings in data (parsed data of the given sensor, with every field of the config),
+        for adding readings older than the newest stored one, which append can't. returns the number of readings stored
+
+        the new records are written to a temporary file that is then moved into place, so an interrupted rewrite leaves the old records as they were,
+        and readers still memory mapping the old file keep seeing them
+
+        raises RuntimeError: if data doesn't have every field of the config"""
+        fields = get_schema(self.config, sensor_type)[0]
+        if data.fields != fields:
+            raise RuntimeError("data to store has fields {}, expected {}".format(data.fields, fields))
+        records = self.__encode(sensor_type, id, data.sort_by_time())
+        records_path = self.get_paths(sensor_type, id)[0]
+        with open(records_path + ".tmp", mode='wb') as recordsfile:
+            recordsfile.write(records.tobytes())
+        os.replace(records_path + ".tmp", records_path)
+        return len(records)
+
+    def import_range(self, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime, enddate:datetime, fetcher:Fetcher | None = None) -> int:
+        """parse (or download) the readings of the given sensor from startdate to enddate (inclusive) and append them,
+        only the files (or downloads) holding readings newer than the newest stored one are read. returns the number of readings that were appended
+
+        raises OSError, RuntimeError: if a file can't be read or downloaded"""
+        last = self.get_last(sensor_type, id)
+        if last is not None:
+            startdate = max(startdate, last + timedelta(seconds=1))
+        periods = find_periods(self.config, sensor_type, id, startdate, enddate)
+        added = 0
+        for table in Parser.run_many(self.config, sensor_type, id, periods, fetcher=fetcher):
+            added += self.append(sensor_type, id, table.sort_by_time().between(startdate, enddate))
+        return added
+
+    def import_all(self, startdate:datetime, enddate:datetime, sensor_types:List[Data_Sensor_Type] | None = None) -> Dict[Tuple[Data_Sensor_Type, int | None], int | Exception]:
+        """import_range for every sensor of the given types (defaults to every type the config supports),
+        returns the number of readings appended for every (sensor type, id), or the error that stopped it from being imported"""
+        if sensor_types is None:
+            sensor_types = list(self.config.sensors_fields_and_ids.keys())
+        results: Dict[Tuple[Data_Sensor_Type, int | None], int | Exception] = {}
+        for sensor_type in sensor_types:
+            ids = self.config.get_sensor_ids(sensor_type) if self.config.needs_sensorid(sensor_type) else [None]
+            for id in ids:
+                try:
+                    results[(sensor_type, id)] = self.import_range(sensor_type, id, startdate, enddate)
+                except (OSError, RuntimeError) as e:
+                    results[(sensor_type, id)] = e
+        return results
+
+    def __encode(self, sensor_type:Data_Sensor_Type, id:int | None, data:DataTable) -> np.ndarray:
+        """the records of the readings in data, text fields are stored as indexes into the header's labels,
+        any that are new are added to the header, which is written (if it changed) before the records are"""
+        header = self.get_header(sensor_type, id)
+        records = np.empty(len(data), dtype=self.get_record_dtype(sensor_type))
+        labels_changed = False
+        for field, dtype in zip(*get_schema(self.config, sensor_type)):
+            if field not in header["labels"]:
+                records[field] = data[field]
+                continue
+            known = header["labels"][field]
+            values, codes = np.unique(data[field], return_inverse=True)
+            for value in values.tolist():
+                if value not in known:
+                    known.append(value)
+                    labels_changed = True
+            if len(known) > np.iinfo(LABEL_DTYPE).max:
+                raise RuntimeError("`{}` has more distinct values than can be stored".format(field))
+            records[field] = np.array([known.index(value) for value in values.tolist()], dtype=LABEL_DTYPE)[codes]
+
+        records_path, header_path = self.get_paths(sensor_type, id)
+        os.makedirs(os.path.dirname(records_path), exist_ok=True)
+        if labels_changed or not os.path.isfile(header_path):
+            with open(header_path + ".tmp", mode='w', encoding='utf-8') as headerfile:
+                json.dump(header, headerfile, ensure_ascii=False)
+            os.replace(header_path + ".tmp", header_path)
+        return records
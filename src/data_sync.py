@@ -0,0 +1,75 @@
+"""data_sync.py: keeps a local copy of the data hosted on the webserver, only downloading the paths that can contain readings that aren't stored yet"""
+__author__ = "Anthony Rubick"
+
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+from data_fetcher import Fetcher
+from data_parser import Parser
+from data_store import TimeSeriesStore
+from data_table import DataTable
+from definitions import Configs, Data_Sensor_Type
+
+class Syncer:
+    """syncs readings from the webserver into the local time series store (see data_store.py), the same one the import command of cli.py fills
+
+    the webserver serves whole months (or whole years, for pistachio weather stations), so a sync re-downloads
+    the month/year holding the newest stored reading and anything after it, but never the ones before it.
+    newer readings are appended to the stored ones, only readings older than any stored (a backfill) make the sensor's records be rewritten"""
+    def __init__(self, config:Configs, fetcher:Fetcher | None = None, store:TimeSeriesStore | None = None):
+        """constructor, store defaults to the config's default store
+
+        raises RuntimeError: if config doesn't download its data"""
+        if not config.isdownloaded:
+            raise RuntimeError("config {} reads local files, there is nothing to sync".format(config.name))
+        self.config: Configs = config
+        self.fetcher: Fetcher | None = fetcher
+        self.store: TimeSeriesStore = store if store is not None else TimeSeriesStore(config)
+
+    def get_state(self, sensor_type:Data_Sensor_Type, id:int | None) -> Dict[str, Any]:
+        """what has been synced for the given sensor, "first" and "last" are the oldest and newest stored timestamps (or None)"""
+        timestamps = self.store.get_records(sensor_type, id)["Date and Time"]
+        return {
+            "first": str(timestamps[0]) if len(timestamps) > 0 else None,
+            "last": str(timestamps[-1]) if len(timestamps) > 0 else None,
+            "rows": len(timestamps),
+            "fields": self.config.get_field_names(sensor_type),
+        }
+
+    def sync(self, sensor_type:Data_Sensor_Type, id:int | None, since:datetime, until:datetime | None = None) -> int:
+        """make sure every reading of the given sensor from since to until (defaults to now) is stored locally,
+        returns the number of readings that were added"""
+        if until is None:
+            until = datetime.now()
+        state = self.get_state(sensor_type, id)
+        first = None if state["first"] is None else datetime.fromisoformat(state["first"])
+        last = None if state["last"] is None else datetime.fromisoformat(state["last"])
+
+        added = 0
+        if first is not None and since < first:
+            #older readings than any stored, backfill them
+            older = [table.take(table.timestamps < np.datetime64(first, 's')) for table in self.__download(sensor_type, id, since, first)]
+            if sum(len(table) for table in older) > 0:
+                added += self.__backfill(sensor_type, id, older)
+        if last is None or until > last:
+            #newer readings than any stored, append only those (append skips the ones that are already stored)
+            for table in self.__download(sensor_type, id, since if last is None else last, until):
+                added += self.store.append(sensor_type, id, table.sort_by_time())
+        return added
+
+    def load(self, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime | None = None, enddate:datetime | None = None) -> DataTable:
+        """the stored readings of the given sensor between startdate and enddate (inclusive), numeric columns are memory mapped"""
+        return self.store.load(sensor_type, id, startdate, enddate)
+
+    def __download(self, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime, enddate:datetime) -> List[DataTable]:
+        periods = self.config.get_periods(sensor_type, startdate, enddate)
+        return Parser.run_many(self.config, sensor_type, id, periods, fetcher=self.fetcher)
+
+    def __backfill(self, sensor_type:Data_Sensor_Type, id:int | None, older:List[DataTable]) -> int:
+        """merge readings older than any stored into the stored ones, rewriting the sensor's records, returns the number of readings added"""
+        stored = self.store.load(sensor_type, id)
+        merged = DataTable.concatenate(older + [stored]).sort_by_time()
+        self.store.rewrite(sensor_type, id, merged)
+        return len(merged) - len(stored)
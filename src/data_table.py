@@ -0,0 +1,279 @@
+"""data_table.py: column oriented storage of sensor readings, filled once by data_parser and operated on in place by data_processor and data_analyzer"""
+__author__ = "Anthony Rubick"
+
+import re
+from typing import Any, Dict, Iterator, List, Sequence, Tuple, Type
+
+import numpy as np
+
+#name of the field every table is indexed by
+TIME_FIELD = "Date and Time"
+
+class DataTable:
+    """stores readings as a dictionary with field name as key and (a numpy array with the data associated with that field) as value,
+    every column has the same length, and "Date and Time" is stored as a datetime64[s] column"""
+    def __init__(self, columns: Dict[str, np.ndarray] | None = None):
+        """constructor"""
+        self.columns: Dict[str, np.ndarray] = {}
+        if columns is not None:
+            for field, column in columns.items():
+                self[field] = column
+
+    @staticmethod
+    def from_columns(fields: List[str], dtypes: List[str], columns: List[Any]) -> 'DataTable':
+        """build a table out of equally sized sequences (one per field), converting each one to its dtype"""
+        table = DataTable()
+        for field, dtype, column in zip(fields, dtypes, columns):
+            column = np.asarray(column).astype(dtype, copy=False)
+            if column.dtype.kind == 'U' and column.base is not None:
+                #a view of some larger array of text (like a column of a grid of cells), copy it at its own width so the rest of that array isn't kept alive
+                column = column.astype('U{}'.format(max(1, int(np.char.str_len(column).max(initial=0)))))
+            table[field] = column
+        return table
+
+    @staticmethod
+    def from_rows(rows: List[Dict[str, Any]], fields: List[str], dtypes: List[str]) -> 'DataTable':
+        """build a table out of a list of rows (dictionaries with field names as keys)"""
+        return DataTable.from_columns(fields, dtypes, [[row.get(field) for row in rows] for field in fields])
+
+    @staticmethod
+    def empty(fields: List[str], dtypes: List[str]) -> 'DataTable':
+        """a table with the given fields and no rows"""
+        return DataTable({field: np.empty(0, dtype=dtype) for field, dtype in zip(fields, dtypes)})
+
+    @staticmethod
+    def concatenate(tables: List['DataTable']) -> 'DataTable':
+        """join the rows of the given tables (which must all have the same fields) into one table
+
+        raises RuntimeError: if no tables were given, or the tables have different fields"""
+        if len(tables) == 0:
+            raise RuntimeError("no tables to concatenate")
+        if len(tables) == 1:
+            return tables[0]
+        fields = tables[0].fields
+        if any(table.fields != fields for table in tables):
+            raise RuntimeError("tables to concatenate do not have the same fields")
+        return DataTable({field: np.concatenate([table.columns[field] for table in tables]) for field in fields})
+
+    @property
+    def fields(self) -> List[str]:
+        """names of the columns in this table, in order"""
+        return list(self.columns.keys())
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """the "Date and Time" column"""
+        return self.columns[TIME_FIELD]
+
+    def __len__(self) -> int:
+        """number of rows"""
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.columns
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.columns[field]
+
+    def __setitem__(self, field: str, column: Any):
+        """add or replace a column, it must have the same length as the other columns"""
+        column = np.asarray(column)
+        others = [other for name, other in self.columns.items() if name != field]
+        if others and len(column) != len(others[0]):
+            raise RuntimeError("column `{}` has {} rows, table has {}".format(field, len(column), len(others[0])))
+        self.columns[field] = column
+
+    def __delitem__(self, field: str):
+        del self.columns[field]
+
+    def get(self, field: str, default: Any = None) -> np.ndarray | Any:
+        return self.columns.get(field, default)
+
+    def keys(self):
+        return self.columns.keys()
+
+    def values(self):
+        return self.columns.values()
+
+    def items(self):
+        return self.columns.items()
+
+    def copy(self) -> 'DataTable':
+        """a table sharing this table's columns, adding or removing fields of one doesn't affect the other"""
+        return DataTable(dict(self.columns))
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        """iterate over the rows of the table as tuples, in field order"""
+        return zip(*[column.tolist() for column in self.columns.values()])
+
+    def to_records(self, record_type: Type['Record']) -> List['Record']:
+        """the rows of the table as records of record_type (see get_record_type), which must have the same fields in the same order,
+        text values that repeat (like "Field") are shared between records rather than stored once per row
+
+        raises RuntimeError: if record_type doesn't have the table's fields"""
+        if list(record_type._fields) != self.fields:
+            raise RuntimeError("record type has fields {}, table has {}".format(list(record_type._fields), self.fields))
+        columns = []
+        for column in self.columns.values():
+            if column.dtype.kind == 'U':
+                labels, codes = np.unique(column, return_inverse=True)
+                labels = labels.tolist()
+                columns.append([labels[code] for code in codes.tolist()])
+            else:
+                columns.append(column.tolist())
+        return [record_type(*row) for row in zip(*columns)]
+
+    def take(self, indexer: Any) -> 'DataTable':
+        """return a table with only the rows selected by indexer (a slice, boolean mask, or array of indexes),
+        slices return views of the columns rather than copies"""
+        return DataTable({field: column[indexer] for field, column in self.columns.items()})
+
+    def is_sorted(self) -> bool:
+        """whether rows are in ascending "Date and Time" order"""
+        timestamps = self.timestamps
+        return bool(np.all(timestamps[1:] >= timestamps[:-1]))
+
+    def sort_by_time(self) -> 'DataTable':
+        """return a table with rows in ascending "Date and Time" order (self if it already is)"""
+        if self.is_sorted():
+            return self
+        timestamps = self.timestamps
+        if np.all(timestamps[1:] <= timestamps[:-1]):
+            return self.take(slice(None, None, -1)) #newest first, like the data files, reversing is a view
+        return self.take(np.argsort(timestamps, kind='stable'))
+
+    def between(self, from_datetime: Any, to_datetime: Any) -> 'DataTable':
+        """rows from from_datetime to to_datetime (inclusive), found by binary search so the table must be sorted (see sort_by_time),
+        columns of the returned table are views of this table's columns"""
+        timestamps = self.timestamps
+        start = np.searchsorted(timestamps, np.datetime64(from_datetime, 's'), side='left')
+        end = np.searchsorted(timestamps, np.datetime64(to_datetime, 's'), side='right')
+        return self.take(slice(start, end))
+
+class SensorMatrix:
+    """the data of several sensors of the same type aligned onto a shared time axis,
+    stores every numeric field as a (sensor x time) array with NaN where a sensor has no reading at that time"""
+    def __init__(self, sensor_ids: List[int | None], tables: List[DataTable]):
+        """constructor, tables[i] is the data of sensor_ids[i]"""
+        self.sensor_ids: List[int | None] = list(sensor_ids)
+        #shared time axis is every timestamp any sensor has a reading at
+        self.timestamps: np.ndarray = np.unique(np.concatenate([table.timestamps for table in tables])) if tables else np.empty(0, dtype='datetime64[s]')
+        self.data: Dict[str, np.ndarray] = {}
+
+        for row, table in enumerate(tables):
+            columns = np.searchsorted(self.timestamps, table.timestamps)
+            for field, column in table.items():
+                if field == TIME_FIELD or not np.issubdtype(column.dtype, np.number):
+                    continue
+                if field not in self.data:
+                    self.data[field] = np.full((len(self.sensor_ids), len(self.timestamps)), np.nan)
+                self.data[field][row, columns] = column
+
+    def get(self, field: str) -> np.ndarray | None:
+        """(sensor x time) array of the given field, None if no sensor has it"""
+        return self.data.get(field)
+
+    def get_sensor(self, sensor_id: int | None) -> DataTable:
+        """the data of one sensor on the shared time axis
+
+        raises RuntimeError: if the sensor isn't in the matrix"""
+        if sensor_id not in self.sensor_ids:
+            raise RuntimeError("sensor {} not in matrix, sensors are {}".format(sensor_id, self.sensor_ids))
+        row = self.sensor_ids.index(sensor_id)
+        return DataTable({TIME_FIELD: self.timestamps} | {field: values[row] for field, values in self.data.items()})
+
+class Record:
+    """a row of readings with one slot per field, far smaller than a dictionary per row,
+    fields can be read as attributes (field name in snake case, without units, see get_attribute_name) or by field name like a dictionary"""
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+    _attributes: Tuple[str, ...] = ()
+
+    def __init__(self, *values: Any):
+        """constructor, one value per field in field order"""
+        if len(values) != len(self._attributes):
+            raise RuntimeError("expected {} values, got {}".format(len(self._attributes), len(values)))
+        for attribute, value in zip(self._attributes, values):
+            object.__setattr__(self, attribute, value)
+
+    def __getitem__(self, field: str) -> Any:
+        try:
+            return getattr(self, self._attributes[self._fields.index(field)])
+        except ValueError:
+            raise KeyError(field)
+
+    def __contains__(self, field: str) -> bool:
+        return field in self._fields
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __iter__(self) -> Iterator[str]:
+        """iterate over the field names, like a dictionary"""
+        return iter(self._fields)
+
+    def __eq__(self, other: Any) -> bool:
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __repr__(self) -> str:
+        return "{}({})".format(type(self).__name__, ", ".join("{}={!r}".format(attribute, getattr(self, attribute)) for attribute in self._attributes))
+
+    def get(self, field: str, default: Any = None) -> Any:
+        return self[field] if field in self._fields else default
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields
+
+    def values(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, attribute) for attribute in self._attributes)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return zip(self._fields, self.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+class RecordList(Sequence):
+    """the rows of a DataTable as a sequence of records (see Record), backed by the table's columns:
+    a record is only created when its row is read, so holding every row costs no more than the columns themselves"""
+    #rows converted at once while iterating
+    CHUNK_ROWS = 4096
+
+    def __init__(self, table: DataTable, record_type: Type[Record]):
+        """constructor, record_type must have the table's fields in the same order
+
+        raises RuntimeError: if it doesn't"""
+        if list(record_type._fields) != table.fields:
+            raise RuntimeError("record type has fields {}, table has {}".format(list(record_type._fields), table.fields))
+        self.table: DataTable = table
+        self.record_type: Type[Record] = record_type
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __getitem__(self, index: int | slice) -> 'Record | RecordList':
+        """the record of a row, or a RecordList of a slice of rows"""
+        if isinstance(index, slice):
+            return RecordList(self.table.take(index), self.record_type)
+        if index < -len(self) or index >= len(self):
+            raise IndexError("row {} out of range for {} rows".format(index, len(self)))
+        return self.record_type(*[column[index].item() for column in self.table.values()])
+
+    def __iter__(self) -> Iterator[Record]:
+        for start in range(0, len(self), self.CHUNK_ROWS):
+            yield from self.table.take(slice(start, start + self.CHUNK_ROWS)).to_records(self.record_type)
+
+def get_attribute_name(field: str) -> str:
+    """name of the attribute a field is stored in by a Record, eg. "Temperature [℃]" -> "temperature", "Value 1" -> "value_1" """
+    name = re.sub(r"\s*[\[(].*?[\])]", "", field) #units
+    name = re.sub(r"\W+", "_", name.strip().lower()).strip("_")
+    return name if name and not name[0].isdigit() else "field_" + name
+
+def get_record_type(name: str, fields: List[str]) -> Type[Record]:
+    """a Record type with a slot for every field
+
+    raises RuntimeError: if two fields would be stored in the same attribute"""
+    attributes = tuple(get_attribute_name(field) for field in fields)
+    if len(set(attributes)) != len(attributes):
+        raise RuntimeError("fields {} don't have distinct attribute names ({})".format(fields, attributes))
+    return type(name, (Record,), {"__slots__": attributes, "_fields": tuple(fields), "_attributes": attributes})
@@ -0,0 +1,243 @@
+"""data_tail.py: follows a sensor's readings as they're written (to the current month's file, or to the webserver), updating the hourly buckets,
+and for sap sensors the current day's minT and sap flux, from only the new readings rather than re-running the whole month through the pipeline"""
+__author__ = "Anthony Rubick"
+
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+import data_calibration
+from data_aggregator import aggregate
+from data_analyzer import calc_sap_series
+from data_catalog import find_periods
+from data_fetcher import Fetcher, get_default_fetcher
+from data_parser import Parser, parse_rows
+from data_profiler import profiled
+from data_table import TIME_FIELD, DataTable
+from definitions import Configs, Data_Sensor_Type
+
+#seconds between polls of a local file (only its size and modification time are checked) and of the webserver (which sends the whole month every time)
+FILE_POLL_INTERVAL = 0.5
+WEBSERVER_POLL_INTERVAL = 60.0
+#readings start with their timestamp in this many characters (YYYY-MM-DD HH:MM:SS), which sort the same as text as they do as times
+TIMESTAMP_LENGTH = 19
+#days of buckets kept before the day of the newest reading, older buckets are dropped so a tail left running doesn't keep growing
+BUCKET_WINDOW = timedelta(days=7)
+
+class Tail:
+    """the readings of one sensor from since onwards, kept up to date by poll (or follow):
+    new readings are read from the current month's file (or download), then only the buckets they fall into,
+    and the current day's analysis, are recomputed. older buckets are never touched again,
+    and only the buckets of the window (see BUCKET_WINDOW) before the day of the newest reading are kept
+
+    with sap sensors, get_day returns the current day's buckets with the same derived series (ΔT, minT, K, sap flux density, relative moisture %)
+    Wrapper.parse_process_analyze would give them"""
+    def __init__(self, config:Configs, sensor_type:Data_Sensor_Type, id:int | None = None, since:datetime | None = None,
+                 interval:timedelta = timedelta(hours=1), fetcher:Fetcher | None = None, window:timedelta = BUCKET_WINDOW):
+        """constructor, the readings from since (defaults to midnight today) up to now are read first
+
+        raises RuntimeError: if interval doesn't evenly divide a day, window is negative, or the sensor needs an id and wasn't given a valid one"""
+        if interval <= timedelta(0) or timedelta(days=1) % interval != timedelta(0) or interval % timedelta(seconds=1) != timedelta(0):
+            raise RuntimeError("interval must be a whole number of seconds that evenly divides a day, was {}".format(interval))
+        if window < timedelta(0):
+            raise RuntimeError("window can't be negative, was {}".format(window))
+        if config.needs_sensorid(sensor_type) and id not in config.get_sensor_ids(sensor_type):
+            raise RuntimeError("sensor id was {}, for this config and sensor type an id between {} and {} is required".format(
+                id, min(config.get_sensor_ids(sensor_type)), max(config.get_sensor_ids(sensor_type))))
+        self.config: Configs = config
+        self.sensor_type: Data_Sensor_Type = sensor_type
+        self.id: int | None = id
+        self.interval: timedelta = interval
+        self.window: timedelta = window
+        #buckets start at midnight, so no bucket spans 2 days
+        self.since: datetime = datetime.combine((since or datetime.now()).date(), datetime.min.time())
+        self.fetcher: Fetcher | None = fetcher
+        #time of the newest reading, only newer readings are added
+        self.last: np.datetime64 | None = None
+        #the readings of the day of the newest reading, its buckets and their analysis are recomputed from these
+        self.day_readings: DataTable | None = None
+        self.buckets: DataTable | None = None
+        self.day: DataTable | None = None
+
+        #where new readings are read from: (year, month) of the current file, its size and modification time when it was last read,
+        #and the offset readings appended to its end would start at
+        self.__period: Tuple[int, int | None] | None = None
+        self.__source: Tuple[int, int] | None = None
+        self.__offset: int = 0
+        self.__load_history()
+
+    def get_buckets(self) -> DataTable | None:
+        """mean of every numeric field in every bucket since self.since, or since self.window before the day of the newest reading if that's later,
+        None until there are any readings"""
+        return self.buckets
+
+    def get_day(self) -> DataTable | None:
+        """the buckets of the day of the newest reading, with the sap sensors' derived series added, None until there are any readings"""
+        return self.day
+
+    def get_minT(self) -> float | None:
+        """minT of the day of the newest reading (NaN if it has no nighttime readings yet), None if this isn't a sap sensor or there are no readings"""
+        if self.day is None or "minT" not in self.day:
+            return None
+        return float(self.day["minT"][-1])
+
+    def poll(self) -> int:
+        """read readings newer than self.last, and update the buckets and analysis with them, returns the number of readings added
+
+        raises OSError: if the file couldn't be read
+        raises RuntimeError: if the webserver couldn't be reached, or new readings couldn't be parsed (eg. a row that is still being written)"""
+        period = self.__get_current_period()
+        if period != self.__period:
+            #a new month (or year) started, so did a new file
+            self.__period, self.__source, self.__offset = period, None, 0
+        if self.config.isdownloaded:
+            rows, source, offset = self.__download_new_rows(), None, 0
+        else:
+            rows, source, offset = self.__read_new_rows()
+        added = self.update(parse_rows(rows, ',', self.config, self.sensor_type)) if len(rows) > 0 else 0
+        #only remember the file was read once its rows were parsed, so a row caught half written is read again next time
+        self.__source, self.__offset = source, offset
+        return added
+
+    def follow(self, on_update:Callable[['Tail', int], None], poll_interval:float | None = None, on_error:Callable[[Exception], None] | None = None,
+               should_stop:Callable[[], bool] = lambda: False):
+        """poll every poll_interval seconds (defaults to FILE_POLL_INTERVAL or WEBSERVER_POLL_INTERVAL), calling on_update(self, readings added)
+        whenever readings were added, until should_stop() returns True. errors are passed to on_error and polling continues, they're raised if it's None"""
+        if poll_interval is None:
+            poll_interval = WEBSERVER_POLL_INTERVAL if self.config.isdownloaded else FILE_POLL_INTERVAL
+        while not should_stop():
+            try:
+                added = self.poll()
+            except (OSError, RuntimeError) as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+            else:
+                if added > 0:
+                    on_update(self, added)
+            time.sleep(poll_interval)
+
+    @profiled("Tail.update", rows_in=lambda self, readings: len(readings), rows_out=lambda result, self, readings: result)
+    def update(self, readings:DataTable) -> int:
+        """add the given readings (any that aren't newer than self.last are ignored), recomputing only the buckets they fall into and the current day's analysis,
+        returns the number of readings added"""
+        readings = DataTable({field: column for field, column in readings.items() if field == TIME_FIELD or np.issubdtype(column.dtype, np.number)})
+        readings = readings.sort_by_time()
+        readings = readings.take(readings.timestamps >= np.datetime64(self.since, 's'))
+        if self.last is not None:
+            readings = readings.take(slice(np.searchsorted(readings.timestamps, self.last, side='right'), None))
+        if len(readings) == 0:
+            return 0
+
+        #readings of every day are added separately, so the readings held are only ever the current day's
+        days = readings.timestamps.astype('datetime64[D]')
+        for day in np.unique(days):
+            day_readings = readings.take(days == day)
+            if self.day_readings is None or self.day_readings.timestamps[0].astype('datetime64[D]') != day:
+                self.day_readings = day_readings
+            else:
+                self.day_readings = DataTable.concatenate([self.day_readings, day_readings])
+            self.__update_buckets(day_readings.timestamps[0])
+        self.last = readings.timestamps[-1]
+        self.__analyze_day()
+        return len(readings)
+
+    def __update_buckets(self, first:np.datetime64):
+        """replace the buckets from the one holding first onwards with ones recomputed from the day's readings,
+        dropping the buckets from before the window"""
+        step = np.timedelta64(self.interval // timedelta(seconds=1), 's')
+        bucket_start = np.datetime64(self.since, 's') + ((first - np.datetime64(self.since, 's')) // step) * step
+        recomputed = aggregate(self.day_readings.between(bucket_start, self.day_readings.timestamps[-1]), self.since, self.interval)
+        if self.buckets is None:
+            self.buckets = recomputed
+            return
+        cutoff = first.astype('datetime64[D]') - np.timedelta64(self.window // timedelta(seconds=1), 's')
+        kept = self.buckets.take(slice(np.searchsorted(self.buckets.timestamps, cutoff, side='left'),
+                                       np.searchsorted(self.buckets.timestamps, bucket_start, side='left')))
+        self.buckets = DataTable.concatenate([kept, recomputed])
+
+    def __analyze_day(self):
+        """the current day's buckets, with the derived series of sap sensors (the day's minT changes with every nighttime reading, so the whole day is redone)"""
+        day_start = self.day_readings.timestamps[0].astype('datetime64[D]')
+        self.day = self.buckets.between(day_start, day_start + np.timedelta64(1, 'D') - np.timedelta64(1, 's')).copy()
+        if self.sensor_type == Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR:
+            a, b = data_calibration.load(self.config).get_coefficients(self.id, self.day.timestamps)
+            for field, series in calc_sap_series(self.day["Value 1"], self.day["Value 2"], self.day.timestamps, a, b).items():
+                self.day[field] = series
+
+    def __get_current_period(self) -> Tuple[int, int | None]:
+        now = datetime.now()
+        return self.config.get_periods(self.sensor_type, now, now)[0]
+
+    def __load_history(self):
+        """read every reading from self.since up to now with the usual parser, except the current file of local configs,
+        which is read the way poll reads it, so how far it was read is only remembered once its rows were parsed
+        (and its readings don't depend on the catalog having seen the newest ones)"""
+        now = datetime.now()
+        self.__period = self.__get_current_period()
+        periods = find_periods(self.config, self.sensor_type, self.id, self.since, now)
+        if not self.config.isdownloaded:
+            periods = [period for period in periods if period != self.__period]
+        if len(periods) > 0:
+            self.update(DataTable.concatenate(Parser.run_many(self.config, self.sensor_type, self.id, periods, fetcher=self.fetcher)))
+        if not self.config.isdownloaded:
+            self.poll()
+
+    def __get_last_text(self) -> bytes:
+        """self.last formatted like the timestamps of the rows, empty if there are no readings (every row is newer)"""
+        return str(self.last).replace('T', ' ').encode('utf-8') if self.last is not None else b""
+
+    def __read_new_rows(self) -> Tuple[List[str], Tuple[int, int] | None, int]:
+        """(rows of the current file newer than self.last, the file's size and modification time, offset read up to),
+        the file is only read if it changed. the almond files have the newest readings first, so only the rows before the first one that isn't new are read,
+        files with the newest readings last are read from where the last read ended. which one a file is is told by its first 2 rows,
+        a file with only one row is read as newest last, so it isn't read until that row ends in a newline"""
+        path = self.config.get_path(self.sensor_type, id=self.id, year=self.__period[0], month=self.__period[1])
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            #the month's first reading hasn't been written yet
+            return [], None, 0
+        source = (stat.st_size, stat.st_mtime_ns)
+        if source == self.__source:
+            return [], source, self.__offset
+        last = self.__get_last_text()
+        rows: List[bytes] = []
+        with open(path, mode='rb') as csvfile:
+            csvfile.readline() #skip header
+            data_start = csvfile.tell()
+            line, following = csvfile.readline(), csvfile.readline()
+            #the second row's timestamp is only compared once it's all there
+            if len(following) >= TIMESTAMP_LENGTH and following[:TIMESTAMP_LENGTH] < line[:TIMESTAMP_LENGTH]:
+                #newest first
+                csvfile.seek(data_start)
+                line = csvfile.readline()
+                while line and line[:TIMESTAMP_LENGTH] > last:
+                    rows.append(line)
+                    line = csvfile.readline()
+                offset = stat.st_size
+            else:
+                #newest last, only whole lines are read so a row that's still being written is read next time
+                start = max(self.__offset, data_start)
+                csvfile.seek(start)
+                appended = csvfile.read(stat.st_size - start)
+                end = appended.rfind(b"\n") + 1
+                rows = [line for line in appended[:end].splitlines() if line[:TIMESTAMP_LENGTH] > last]
+                offset = start + end
+        return [row.decode('utf-8').rstrip("\r\n") for row in rows], source, offset
+
+    def __download_new_rows(self) -> List[str]:
+        """rows of the current month's (or year's) download newer than self.last, the webserver sends the newest readings first"""
+        fetcher = self.fetcher if self.fetcher is not None else get_default_fetcher()
+        url = self.config.get_path(self.sensor_type, id=self.id, year=self.__period[0], month=self.__period[1])
+        last = self.__get_last_text().decode('utf-8')
+        rows = []
+        for row in fetcher.fetch(url).decode('utf-8').split(sep=';')[:-1]: #all but last index because response ends in a semi-colon
+            row = row.strip()
+            if row[:TIMESTAMP_LENGTH] <= last:
+                break
+            rows.append(row)
+        return rows
@@ -3,11 +3,29 @@ __author__ = "Anthony Rubick"
 
 import os
 
+from datetime import datetime
 from enum import Enum
-from typing import List, NamedTuple
+from typing import Dict, List, NamedTuple, Tuple
 
 #root directory of project
 ROOT_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+#directory where data derived from the data sources (parsed files, etc.) is stored between runs, safe to delete
+CACHE_DIR = os.path.join(ROOT_DIR, "cache")
+
+#numpy dtype of every field that can appear in a config, used to build the typed columns of a DataTable
+FIELD_DTYPES: Dict[str,str] = {
+    "Date and Time": "datetime64[s]",
+    "Field": "U",
+    "Sensor ID": "U",
+    "Value 1": "int64",
+    "Value 2": "int64",
+    "Temperature [℃]": "float64",
+    "Humidity [RH%]": "float64",
+    "Pressure [hPa]": "float64",
+    "Altitude [m]": "float64",
+    "VOC [kΩ]": "float64",
+    "Light (KLux)": "float64",
+}
 
 class Data_Sensor_Type(Enum):
     """Enum for handling data sources, all supported data sources are here"""
@@ -28,6 +46,10 @@ class Config(NamedTuple):
             return self.sensors_fields_and_ids.get(sensor_type)[0]
         else:
             raise RuntimeError("desired Data_Sensor_Type not yet implemented for this config")
+    
+    def get_field_dtypes(self, sensor_type:Data_Sensor_Type) -> List[str]:
+        """numpy dtypes of the fields returned by get_field_names, in the same order"""
+        return [FIELD_DTYPES[field] for field in self.get_field_names(sensor_type)]
         
     def get_sensor_ids(self, sensor_type:Data_Sensor_Type) -> List[int] | None:
         if sensor_type in self.sensors_fields_and_ids: 
@@ -98,21 +120,38 @@ class Configs(Config, Enum):
             case _:
                 raise RuntimeError("desired Config not yet implemented")
     
+    def get_periods(self, sensor_type:Data_Sensor_Type, startdate:datetime, enddate:datetime) -> List[Tuple[int, int | None]]:
+        """(year, month) of every path (see get_path) whose data may fall between startdate and enddate (inclusive), in order,
+        year is the last 2 digits of the year, month is None for sources that store a whole year per path"""
+        if startdate > enddate:
+            return []
+        match (self, sensor_type):
+            case (Configs.PISTACHIO, Data_Sensor_Type.WEATHER_STATION):
+                return [(year%100, None) for year in range(startdate.year, enddate.year+1)]
+            case _:
+                #every month from the start month to the end month
+                return [(index//12 %100, index%12 +1) for index in range(startdate.year*12 + startdate.month-1, enddate.year*12 + enddate.month)]
+    
     def needs_sensorid(self, sensor_type:Data_Sensor_Type) -> bool:
         return (self.get_sensor_ids(sensor_type) is not None)
     
     def get_field_names(self,sensor_type:Data_Sensor_Type) -> List[str]:
         return super().get_field_names(sensor_type)
     
+    def get_field_dtypes(self, sensor_type:Data_Sensor_Type) -> List[str]:
+        return super().get_field_dtypes(sensor_type)
+    
     def get_sensor_ids(self, sensor_type: Data_Sensor_Type) -> List[int] | None:
         return super().get_sensor_ids(sensor_type)
 
-#sensor calibration coefficients
-SAP_SENSOR_COEFFICIENTS = [
-    {"a": -0.0442015591095395, "b": 191.7556055613598}, #Sensor 1
-    {"a": -0.04861278384829307, "b": 202.27735563973982}, #Sensor 2
-    {"a": -0.05762850897914471, "b": 215.35202712174151}, #Sensor 3
-    {"a": -0.05445248031047814, "b": 212.60475914677914}, #Sensor 4
-    {"a": -0.05701605695441798, "b": 211.74325309992707}, #Sensor 5
-    {"a": -0.053728569077514346, "b": 212.98440419373264} #Sensor 6
-]
\ No newline at end of file
+def get_period_bounds(year:int, month:int | None) -> Tuple[datetime, datetime]:
+    """(start, end) of the month (or year, if month is None) a path (see get_periods of the Configs class) holds, year is the last 2 digits of the year"""
+    start = datetime(2000 + year, month if month is not None else 1, 1)
+    if month is None or month == 12:
+        return start, datetime(start.year + 1, 1, 1)
+    return start, datetime(start.year, month + 1, 1)
+
+#directory holding the calibration files of the sap and moisture sensors, the coefficients are calculated from them (see data_calibration.py)
+CALIBRATION_DIR = os.path.join(ROOT_DIR, "data")
+#config name -> config whose calibration files are used if it has none of its own (the pistachio sensors haven't been calibrated separately)
+CALIBRATION_FALLBACKS: Dict[str,str] = {"PISTACHIO": "ALMOND"}
\ No newline at end of file
@@ -2,13 +2,19 @@
 """main.py: takes user input and sets up configs to call wrapper.py"""
 __author__ = "Anthony Rubick"
 
+import sys
 from datetime import datetime
 from definitions import Configs, Data_Sensor_Type
 
 from wrapper import Wrapper
 
+#given arguments, run without any prompts (see cli.py), eg `python main.py batch jobs.json`
+if len(sys.argv) > 1:
+    import cli
+    sys.exit(cli.main(sys.argv[1:]))
+
 ## NOTE for future maintainers:
-## the primary potential optomization is to utilize data-frames instead of dictionaries as they can access elements faster
+## readings are stored column-wise in numpy arrays (see data_table.py) from parsing through analysis, rather than as a dictionary per row
 ## beyond that, trimming data sooner and algorithm optomizations where possible may help too.
 
 
@@ -60,7 +66,7 @@ endmonth:int = get_int("\tend month (1-12): ", 1, 12)
 endday:  int = get_int("\tend day (1-31): ", 1, 31)
 
 startdate:datetime = datetime(year=startyear, month=startmonth, day=startday,hour=0,minute=0)
-enddate:datetime   = datetime(year=endyear, month=endmonth, day=endday,hour=23,minute=59)
+enddate:datetime   = datetime(year=endyear, month=endmonth, day=endday,hour=23,minute=59,second=59)
 
 #choose between sources (almond or pistachio)
 config:Configs = None
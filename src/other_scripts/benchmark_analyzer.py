@@ -0,0 +1,46 @@
+"""benchmark_analyzer.py: compares the speed of the vectorized sap flux / minT / relative moisture kernel in data_analyzer with the old list based implementation
+(tests/test_analyzer.py checks that they give the same results, the old implementation is in tests/legacy_analyzer.py)"""
+__author__ = "Anthony Rubick"
+
+import math
+import os
+import sys
+import time
+from typing import Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+#the list based implementation is kept with the tests, which check the vectorized one against it
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', 'tests')))
+
+from data_analyzer import calc_sap_series
+from legacy_analyzer import legacy_calc_sap_series
+
+REPEATS = 5
+
+def synthetic_readings(days:int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """a reading every 10 minutes for the given number of days"""
+    timestamps = np.datetime64('2022-01-01T00:00:00') + np.arange(days * 144) * np.timedelta64(600, 's')
+    day_fraction = (timestamps - timestamps.astype('datetime64[D]')).astype(np.int64) / 86400
+    value1 = (1080 + 25 * np.maximum(0, np.sin(2 * math.pi * (day_fraction - 0.25)))).astype(np.int64)
+    value2 = (2800 + 100 * np.sin(2 * math.pi * day_fraction)).astype(np.int64)
+    return value1, value2, timestamps
+
+def best_time(function, *args) -> float:
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    value1, value2, timestamps = synthetic_readings(365)
+    legacy_args = (value1.tolist(), value2.tolist(), timestamps.tolist(), -0.05, 210.0)
+    legacy_time = best_time(legacy_calc_sap_series, *legacy_args)
+    kernel_time = best_time(calc_sap_series, value1, value2, timestamps, -0.05, 210.0)
+    print("{} readings (a year at 10 minute intervals, best of {})".format(len(timestamps), REPEATS))
+    print("\tlist based: {:>10.2f} ms".format(legacy_time * 1000))
+    print("\tvectorized: {:>10.2f} ms".format(kernel_time * 1000))
+    print("\tspeedup:    {:>10.1f}x".format(legacy_time / kernel_time))
@@ -0,0 +1,43 @@
+"""benchmark_imports.py: measures how long importing each of the analysis modules takes in a fresh interpreter, and which heavy dependencies each one pulls in"""
+__author__ = "Anthony Rubick"
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SRC_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODULES = ["definitions", "data_parser", "data_processor", "data_analyzer", "wrapper"]
+#dependencies that should only be imported by the code paths that need them
+HEAVY_DEPENDENCIES = ["numpy", "requests", "matplotlib", "multiprocessing"]
+REPEATS = 7
+
+#run in a fresh interpreter, so nothing is imported beforehand
+TIMING_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {dependencies} if name in sys.modules]}}))
+"""
+
+def time_import(module: str) -> Tuple[float, List[str]]:
+    """median time to import module in a fresh interpreter (over REPEATS runs), and the heavy dependencies it loaded"""
+    times = []
+    loaded = []
+    for _ in range(REPEATS):
+        output = subprocess.run([sys.executable, "-c", TIMING_SCRIPT.format(module=module, dependencies=HEAVY_DEPENDENCIES)],
+                                cwd=SRC_DIR, capture_output=True, text=True, check=True).stdout
+        result: Dict = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        loaded = result["loaded"]
+    return statistics.median(times), loaded
+
+if __name__ == "__main__":
+    print("import time of each module in a fresh interpreter (median of {})".format(REPEATS))
+    for module in MODULES:
+        seconds, loaded = time_import(module)
+        print("\t{:<15} {:>8.1f} ms   loads: {}".format(module, seconds * 1000, ", ".join(loaded) if loaded else "-"))
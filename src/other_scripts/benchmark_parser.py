@@ -0,0 +1,63 @@
+"""benchmark_parser.py: compares the rows/second of the bulk csv ingestion in data_parser against the old per-row csv.DictReader path, on the files in data/"""
+__author__ = "Anthony Rubick"
+
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data_parser import parse_from_file
+from definitions import Configs, Data_Sensor_Type
+
+REPEATS = 5
+
+def legacy_parse_from_file(file_path: str, config: Configs, sensor_type: Data_Sensor_Type) -> List[Dict[str, Any]]:
+    """the per-row parser data_parser used before bulk ingestion: sniff the dialect, materialize a DictReader, convert cell by cell"""
+    #converters process() used to pick, by field type
+    converters: Dict[str, Callable[[str], Any]] = {
+        "datetime64[s]": lambda value: datetime.strptime(value, "%Y-%m-%d %H:%M:%S"),
+        "int64": int,
+        "float64": float,
+        "U": str,
+    }
+    fields = config.get_field_names(sensor_type)
+    field_converters = list(zip(fields, [converters[dtype] for dtype in config.get_field_dtypes(sensor_type)]))
+    with open(file_path, mode='r', encoding='utf-8', newline='') as csvfile:
+        dialect = csv.Sniffer().sniff(csvfile.read(1024))
+        csvfile.seek(0)
+        reader = [x for x in csv.DictReader(csvfile, fieldnames=fields, dialect=dialect)]
+        return [{field: convert(row.get(field)) for field, convert in field_converters} for row in reader[1:]]
+
+def time_parser(parse: Callable[[str, Configs, Data_Sensor_Type], Any], files: List[Tuple[str, Data_Sensor_Type]]) -> Tuple[int, float]:
+    """best-of-REPEATS time to parse every file, and the number of rows parsed"""
+    best = float('inf')
+    rows = 0
+    for _ in range(REPEATS):
+        rows = 0
+        start = time.perf_counter()
+        for file_path, sensor_type in files:
+            rows += len(parse(file_path, Configs.ALMOND, sensor_type))
+        best = min(best, time.perf_counter() - start)
+    return rows, best
+
+if __name__ == "__main__":
+    files: List[Tuple[str, Data_Sensor_Type]] = []
+    for file_name in sorted(os.listdir(Configs.ALMOND.base_path)):
+        if file_name.startswith("Data_TREWid"):
+            files.append((os.path.join(Configs.ALMOND.base_path, file_name), Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR))
+        elif file_name.startswith("Data_weather"):
+            files.append((os.path.join(Configs.ALMOND.base_path, file_name), Data_Sensor_Type.WEATHER_STATION))
+
+    legacy_rows, legacy_time = time_parser(legacy_parse_from_file, files)
+    bulk_rows, bulk_time = time_parser(parse_from_file, files)
+    if legacy_rows != bulk_rows:
+        raise RuntimeError("parsers disagree on row count ({} vs {})".format(legacy_rows, bulk_rows))
+
+    print("{} files, {} rows (best of {})".format(len(files), bulk_rows, REPEATS))
+    print("\tper-row (csv.DictReader): {:>12,.0f} rows/s".format(legacy_rows / legacy_time))
+    print("\tbulk (data_parser):       {:>12,.0f} rows/s".format(bulk_rows / bulk_time))
+    print("\tspeedup:                  {:>12.1f}x".format(legacy_time / bulk_time))
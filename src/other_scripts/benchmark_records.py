@@ -0,0 +1,45 @@
+"""benchmark_records.py: compares the memory used by a month of almond weather readings held row by row as dictionaries (like the old data_parser)
+against the compact records from data_parser, both as a column backed RecordList and as a list of every record"""
+__author__ = "Anthony Rubick"
+
+import os
+import sys
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data_parser import Parser
+from data_table import DataTable
+from definitions import Configs, Data_Sensor_Type
+
+YEAR = 22
+MONTH = 5
+
+def measure(build: Callable[[DataTable], Any], data: DataTable) -> Tuple[int, Any]:
+    """bytes allocated (and still held) by build, and what it built"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build(data)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, built
+
+def legacy_rows(data: DataTable) -> Any:
+    """a fresh dictionary per row, keyed by field name"""
+    return [dict(zip(data.fields, row)) for row in data.rows()]
+
+if __name__ == "__main__":
+    Parser.memoize(False) #every parse should be measured, not return what was kept from the last one
+    data = Parser.run(Configs.ALMOND, Data_Sensor_Type.WEATHER_STATION, year=YEAR, month=MONTH, use_cache=False)
+    dict_bytes, rows = measure(legacy_rows, data)
+    #RecordList only holds the columns, which the table already does, so it's measured from a fresh parse
+    list_bytes, records = measure(lambda data: Parser.run(Configs.ALMOND, Data_Sensor_Type.WEATHER_STATION, year=YEAR, month=MONTH, use_cache=False, as_records=True), data)
+    record_bytes, materialized = measure(lambda data: list(records), data)
+    if rows != [record.to_dict() for record in materialized] or rows[10] != records[10].to_dict():
+        raise RuntimeError("records differ from the rows")
+
+    print("almond weather, 20{}-{:0>2}: {} readings of {} fields".format(YEAR, MONTH, len(data), len(data.fields)))
+    print("\tdict per row:  {:>10,} bytes  ({:>4.0f} per row)".format(dict_bytes, dict_bytes / len(data)))
+    print("\tRecordList:    {:>10,} bytes  ({:>4.0f} per row, {:.1f}x less)".format(list_bytes, list_bytes / len(data), dict_bytes / list_bytes))
+    print("\tlist(records): {:>10,} bytes  ({:>4.0f} per row, {:.1f}x less)".format(record_bytes, record_bytes / len(data), dict_bytes / record_bytes))
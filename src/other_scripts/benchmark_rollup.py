@@ -0,0 +1,54 @@
+"""benchmark_rollup.py: compares smoothing every almond sap sensor's whole range from every reading against smoothing it from the hourly and daily rollups in data_rollup"""
+__author__ = "Anthony Rubick"
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data_rollup
+from data_parser import Parser
+from data_table import DataTable
+from definitions import Configs, Data_Sensor_Type
+from wrapper import Wrapper
+
+REPEATS = 5
+STARTDATE = datetime(2022, 3, 1)
+ENDDATE = datetime(2022, 6, 30, 23, 59, 59)
+FIELDS_TO_REMOVE = ['Field', 'Sensor ID']
+
+def time_run(interval: timedelta, use_rollups: bool) -> Tuple[float, DataTable]:
+    """best-of-REPEATS time to analyze every sap sensor, and the data of the last one"""
+    best = float('inf')
+    data = DataTable()
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for id in Configs.ALMOND.get_sensor_ids(Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR):
+            data = Wrapper.parse_process_analyze(Configs.ALMOND, Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR, STARTDATE, ENDDATE,
+                                                 FIELDS_TO_REMOVE, interval, id, use_rollups=use_rollups).data
+        best = min(best, time.perf_counter() - start)
+    return best, data
+
+if __name__ == "__main__":
+    #every repeat should do the work, not return what the in-memory caches kept from the last one
+    Parser.memoize(False)
+    Wrapper.memoize(False)
+    for interval in [timedelta(hours=1), timedelta(days=1)]:
+        rollup = data_rollup.find_rollup(STARTDATE, ENDDATE, interval)
+        time_run(interval, True) #build the rollups (and parse cache) first
+        raw_time, raw_data = time_run(interval, False)
+        rollup_time, rollup_data = time_run(interval, True)
+        for field in raw_data.fields:
+            if raw_data[field].dtype.kind != 'M' and not np.allclose(raw_data[field], rollup_data[field], equal_nan=True):
+                raise RuntimeError("`{}` smoothed from the {} rollup differs from the readings".format(field, rollup))
+
+        rows_read = len(data_rollup.load(Configs.ALMOND, Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR, 1, STARTDATE, ENDDATE, rollup))
+        print("{} smoothing, {} to {}, every sap sensor (best of {})".format(interval, STARTDATE.date(), ENDDATE.date(), REPEATS))
+        print("\tfrom readings:        {:>8.1f} ms".format(raw_time * 1000))
+        print("\tfrom {:<7} rollup:   {:>8.1f} ms  ({} rows read per sensor)".format(rollup, rollup_time * 1000, rows_read))
+        print("\tspeedup:              {:>8.1f}x".format(raw_time / rollup_time))
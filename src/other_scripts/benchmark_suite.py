@@ -0,0 +1,154 @@
+"""benchmark_suite.py: times every stage of the pipeline on synthetic data (see synthetic_data.py) for any number of sensors and years,
+and records throughput and peak memory to a JSON results file, which later runs can be compared against to catch regressions
+
+eg. `python benchmark_suite.py --sensors 6 --years 2 --output results.json`, then `python benchmark_suite.py --sensors 6 --years 2 --compare results.json`"""
+__author__ = "Anthony Rubick"
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data_analyzer import Analyzer
+from data_fetcher import Fetcher
+from data_parser import Parser, download_from_webserver, parse_from_file
+from data_processor import Processor
+from data_table import DataTable
+from definitions import Configs, Data_Sensor_Type
+from synthetic_data import SyntheticFile, write_files
+from webserver_stub import start_stub
+
+#sensor type of every kind of generated file
+SENSOR_TYPES = {"trew": Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR, "weather": Data_Sensor_Type.WEATHER_STATION, "lux": Data_Sensor_Type.LUX_SENSOR}
+#a stage this much slower than in the results compared against is reported as a regression
+REGRESSION_FACTOR = 1.2
+
+def measure(stage: Callable[[], int], repeats: int) -> Dict[str, Any]:
+    """best-of-repeats wall time of stage (which returns the number of rows it handled), and its peak memory (traced in a separate run, as tracing slows it down)"""
+    best = float('inf')
+    rows = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = stage()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    stage()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"rows": rows, "seconds": best, "rows_per_second": rows / best if best > 0 else None, "peak_bytes": peak}
+
+def run_suite(files: List[SyntheticFile], sensors: int, years: int, first_year: int, repeats: int) -> Dict[str, Dict[str, Any]]:
+    """time every stage, returns the measurements of every stage by name"""
+    results: Dict[str, Dict[str, Any]] = {}
+
+    #parse every generated file
+    def parse_all() -> int:
+        return sum(len(parse_from_file(file.path, Configs.ALMOND, SENSOR_TYPES[file.kind])) for file in files)
+    results["parse_from_file"] = measure(parse_all, repeats)
+
+    #download every month of every sap sensor from a local stand-in for the webserver
+    server, base_url = start_stub()
+    try:
+        urls = [Configs.PISTACHIO.get_path(Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR, id=id, year=year, month=month).replace(Configs.PISTACHIO.base_path, base_url)
+                for id in range(1, min(sensors, 6) + 1) for year in range(first_year, first_year + years) for month in range(1, 13)]
+        with Fetcher() as fetcher:
+            def download_all() -> int:
+                return sum(len(download_from_webserver(url, Configs.PISTACHIO, Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR, fetcher=fetcher)) for url in urls)
+            results["download_from_webserver"] = measure(download_all, repeats)
+    finally:
+        server.shutdown()
+
+    #process and analyze every reading of the first sap sensor
+    sap_files = [file for file in files if file.kind == "trew" and file.id == 1]
+    data = DataTable.concatenate([parse_from_file(file.path, Configs.ALMOND, Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR) for file in sap_files]).sort_by_time()
+    startdate = datetime(2000 + first_year, 1, 1)
+    enddate = datetime(2000 + first_year + years, 1, 1) - timedelta(seconds=1)
+
+    def new_processor() -> Processor:
+        processor = Processor(data.copy(), Configs.ALMOND, Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR, sensor_id=1)
+        processor.remove_fields(["Field", "Sensor ID"])
+        return processor
+    def keep_time_range() -> int:
+        processor = new_processor()
+        processor.keep_time_range(startdate + (enddate - startdate) / 4, enddate - (enddate - startdate) / 4)
+        return len(data)
+    def smoothen_data() -> int:
+        new_processor().smoothen_data(startdate, timedelta(hours=1))
+        return len(data)
+    def analyze() -> int:
+        Analyzer(new_processor()).analyze()
+        return len(data)
+    results["Processor.keep_time_range"] = measure(keep_time_range, repeats)
+    results["Processor.smoothen_data"] = measure(smoothen_data, repeats)
+    results["Analyzer.analyze"] = measure(analyze, repeats)
+    return results
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> List[str]:
+    """print how much faster or slower every stage is than in baseline, returns the stages that regressed"""
+    regressed = []
+    for stage, measured in results.items():
+        if stage not in baseline:
+            continue
+        ratio = measured["seconds"] / baseline[stage]["seconds"]
+        memory_ratio = measured["peak_bytes"] / baseline[stage]["peak_bytes"] if baseline[stage]["peak_bytes"] else float('nan')
+        flag = ""
+        if ratio > REGRESSION_FACTOR:
+            regressed.append(stage)
+            flag = "  REGRESSION"
+        print("\t{:<28} {:>6.2f}x time  {:>6.2f}x peak memory{}".format(stage, ratio, memory_ratio, flag))
+    return regressed
+
+def get_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="benchmark every stage of the pipeline on synthetic data")
+    parser.add_argument("--sensors", type=int, default=6, help="number of sap sensors to generate (default: %(default)s)")
+    parser.add_argument("--years", type=int, default=1, help="number of years to generate (default: %(default)s)")
+    parser.add_argument("--first-year", type=int, default=22, help="last 2 digits of the first year to generate (default: %(default)s)")
+    parser.add_argument("--repeats", type=int, default=3, help="times to run every stage, the best time is kept (default: %(default)s)")
+    parser.add_argument("--data-dir", help="directory to generate the data in (default: a temporary directory, deleted afterwards)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to (default: %(default)s)")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against, exits with 1 if any stage regressed")
+    return parser
+
+def main(argv: List[str] | None = None) -> int:
+    args = get_argument_parser().parse_args(argv)
+    Parser.memoize(False) #every repeat should do the work
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        data_dir = args.data_dir if args.data_dir is not None else temporary_dir
+        start = time.perf_counter()
+        files = write_files(data_dir, args.sensors, args.years, first_year=args.first_year)
+        print("generated {} files ({} readings) in {:.1f} s".format(len(files), sum(file.rows for file in files), time.perf_counter() - start))
+        results = run_suite(files, args.sensors, args.years, args.first_year, args.repeats)
+
+    for stage, measured in results.items():
+        print("\t{:<28} {:>10,} rows  {:>9.1f} ms  {:>14,.0f} rows/s  {:>8.1f} MiB peak".format(
+            stage, measured["rows"], measured["seconds"] * 1000, measured["rows_per_second"] or 0, measured["peak_bytes"] / 2**20))
+    with open(args.output, mode='w', encoding='utf-8') as resultsfile:
+        json.dump({
+            "meta": {"sensors": args.sensors, "years": args.years, "repeats": args.repeats, "date": datetime.now().isoformat(timespec='seconds'),
+                     "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()},
+            "stages": results,
+        }, resultsfile, indent=4)
+    print("results written to {}".format(args.output))
+
+    if args.compare is not None:
+        with open(args.compare, mode='r', encoding='utf-8') as baselinefile:
+            baseline = json.load(baselinefile)
+        if baseline["meta"]["sensors"] != args.sensors or baseline["meta"]["years"] != args.years:
+            print("WARNING: {} was run with {} sensors over {} years".format(args.compare, baseline["meta"]["sensors"], baseline["meta"]["years"]))
+        print("compared to {} ({}):".format(args.compare, baseline["meta"]["date"]))
+        if compare(results, baseline["stages"]):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
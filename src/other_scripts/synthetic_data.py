@@ -0,0 +1,93 @@
+"""synthetic_data.py: generates realistic almond data files (Data_TREWid*, Data_weather*, and lux files) for any number of sensors and years, for benchmarking"""
+__author__ = "Anthony Rubick"
+
+import calendar
+import os
+from datetime import datetime
+from typing import List, NamedTuple
+
+import numpy as np
+
+#time between readings of every sensor type, in seconds (the almond sap sensors read about every 10 minutes, the weather station about every 14)
+READING_INTERVALS = {"trew": 600, "weather": 850, "lux": 600}
+#fraction of readings that are left out, so the data has gaps like the real files
+DROPPED_FRACTION = 0.02
+#field every almond file is from
+FIELD_NAME = "Stevinson Almond"
+
+HEADERS = {
+    "trew": "Date and Time,Field,Sensor ID,Value 1,Value 2",
+    "weather": "Date and Time,Field,Temperature [℃],Humidity [RH%],Pressure [hPa],Altitude [m],VOC [kΩ]",
+    "lux": "Date and Time,Light (KLux)",
+}
+
+class SyntheticFile(NamedTuple):
+    """a generated data file"""
+    path:str
+    kind:str #"trew", "weather", or "lux"
+    id:int | None
+    year:int #last 2 digits of the year
+    month:int
+    rows:int
+
+def get_file_name(kind:str, id:int | None, year:int, month:int) -> str:
+    """name of a generated file, sap and weather files are named like the almond files (see get_path of the Configs class), lux files have no almond name yet"""
+    match kind:
+        case "trew":
+            return "Data_TREWid{}_{}_{:0>2}_almond.csv".format(id, year, month)
+        case "weather":
+            return "Data_weather_{}_{:0>2}_almond.csv".format(year, month)
+        case "lux":
+            return "Data_lux{}_{}_{:0>2}_almond.csv".format(id, year, month)
+        case _:
+            raise RuntimeError("unknown data kind `{}`".format(kind))
+
+def generate_rows(kind:str, id:int | None, year:int, month:int, rng:np.random.Generator) -> List[str]:
+    """a month of readings of the given kind as csv rows (without a header), newest first like the almond files,
+    values follow a daily cycle (peaking at noon) with noise, and a few readings are dropped"""
+    start = np.datetime64(datetime(2000 + year, month, 1), 's')
+    seconds = calendar.monthrange(2000 + year, month)[1] * 24 * 60 * 60
+    interval = READING_INTERVALS[kind]
+    offsets = np.arange(0, seconds, interval) + rng.integers(0, 30, size=seconds // interval + (seconds % interval > 0))
+    offsets = offsets[(offsets < seconds) & (rng.random(len(offsets)) >= DROPPED_FRACTION)]
+    timestamps = start + offsets.astype('timedelta64[s]')
+    day_fraction = (offsets % (24 * 60 * 60)) / (24 * 60 * 60)
+    wave = np.sin(2 * np.pi * (day_fraction - 0.25)) #peaks at noon
+    noise = rng.standard_normal(len(offsets))
+
+    times = np.char.replace(np.datetime_as_string(timestamps, unit='s'), 'T', ' ')
+    match kind:
+        case "trew":
+            value1 = (1085 + 20 * np.maximum(0, wave) + 2 * noise).astype(np.int64) + (id or 0)
+            value2 = (2600 + 150 * wave + 40 * noise).astype(np.int64)
+            columns = [times, np.full(len(times), FIELD_NAME), np.full(len(times), "TREW {}".format(id)), value1.astype(str), value2.astype(str)]
+        case "weather":
+            temperature = np.round(18 + 9 * wave + 0.5 * noise, 2)
+            humidity = np.round(np.clip(55 - 25 * wave + 2 * noise, 0, 100), 2)
+            pressure = np.round(1010 + 0.5 * noise, 2)
+            altitude = np.round(62 + 3 * noise, 2)
+            voc = np.round(40 + 5 * noise, 2)
+            columns = [times, np.full(len(times), FIELD_NAME)] + [values.astype(str) for values in (temperature, humidity, pressure, altitude, voc)]
+        case "lux":
+            columns = [times, np.round(np.maximum(0, 80 * wave + 2 * noise), 2).astype(str)]
+        case _:
+            raise RuntimeError("unknown data kind `{}`".format(kind))
+    rows = [",".join(row) for row in zip(*[column.tolist() for column in columns])]
+    rows.reverse()
+    return rows
+
+def write_files(directory:str, sensors:int, years:int, first_year:int = 22, lux_sensors:int = 2, seed:int = 0) -> List[SyntheticFile]:
+    """write a file per month, for `years` years from January of first_year (last 2 digits), of a weather station, `sensors` sap sensors, and `lux_sensors` lux sensors"""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    sources = [("weather", None)] + [("trew", id) for id in range(1, sensors + 1)] + [("lux", id) for id in range(1, lux_sensors + 1)]
+    files = []
+    for year in range(first_year, first_year + years):
+        for month in range(1, 13):
+            for kind, id in sources:
+                rows = generate_rows(kind, id, year, month, rng)
+                path = os.path.join(directory, get_file_name(kind, id, year, month))
+                with open(path, mode='w', encoding='utf-8', newline='') as csvfile:
+                    csvfile.write(HEADERS[kind] + "\n" + "\n".join(rows) + "\n")
+                files.append(SyntheticFile(path, kind, id, year, month, len(rows)))
+    return files
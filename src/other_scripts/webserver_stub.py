@@ -0,0 +1,114 @@
+"""webserver_stub.py: local stand-in for the pistachio webserver, serves generated semicolon separated data in the same format, for testing and benchmarking downloads"""
+__author__ = "Anthony Rubick"
+
+import calendar
+import math
+import sys
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+#time between generated readings
+READING_INTERVAL = timedelta(minutes=10)
+
+def generate_rows(kind:str, id:int, start:datetime, end:datetime) -> str:
+    """semicolon separated readings from start (inclusive) to end (exclusive), newest first like the webserver"""
+    rows = []
+    timestamp = start
+    while timestamp < end:
+        day_fraction = (timestamp.hour * 60 + timestamp.minute) / (24 * 60)
+        wave = math.sin(2 * math.pi * (day_fraction - 0.25)) #peaks at noon
+        match kind:
+            case "trew":
+                values = "{},{}".format(1080 + int(25 * max(0.0, wave)) + id, 2800 + int(100 * wave))
+            case "lux":
+                values = "{:.2f}".format(max(0.0, 80 * wave))
+            case "weather":
+                values = "{:.2f},{:.2f},{:.2f},{:.2f},{:.2f}".format(18 + 8 * wave, 55 - 20 * wave, 1012.0, 60.0, 20 + id)
+            case _:
+                raise RuntimeError("unknown data kind `{}`".format(kind))
+        rows.append("{},{};".format(timestamp.strftime("%Y-%m-%d %H:%M:%S"), values))
+        timestamp += READING_INTERVAL
+    rows.reverse()
+    return "".join(rows)
+
+class StubHandler(BaseHTTPRequestHandler):
+    """answers <anything>/{trew,lux}/?id=&m=&y= with a month of readings, and <anything>/weather/?id=&y= with a year of readings"""
+    protocol_version = "HTTP/1.1" #keep connections alive
+
+    def do_GET(self):
+        server: StubServer = self.server
+        server.count_request()
+        if server.should_fail():
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        url = urlparse(self.path)
+        kind = url.path.rstrip('/').split('/')[-1]
+        query = {key: int(values[0]) for key, values in parse_qs(url.query).items()}
+        try:
+            year = 2000 + query["y"]
+            if kind == "weather":
+                start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+            else:
+                start = datetime(year, query["m"], 1)
+                end = start + timedelta(days=calendar.monthrange(year, query["m"])[1])
+            body = generate_rows(kind, query.get("id", 0), start, end).encode('utf-8')
+        except (KeyError, ValueError, RuntimeError):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    """the stub webserver, fails the first `fail_first` requests with a 503 to exercise retries"""
+    daemon_threads = True
+
+    def __init__(self, address:Tuple[str, int], fail_first:int = 0):
+        super().__init__(address, StubHandler)
+        self.fail_first: int = fail_first
+        self.requests: int = 0
+        self.lock = threading.Lock()
+        self.connections: Dict[Tuple[str, int], int] = {}
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.requests <= self.fail_first
+
+    def process_request(self, request, client_address):
+        #count connections, to check that clients reuse them
+        with self.lock:
+            self.connections[client_address] = self.connections.get(client_address, 0) + 1
+        super().process_request(request, client_address)
+
+def start_stub(port:int = 0, fail_first:int = 0) -> Tuple[StubServer, str]:
+    """start the stub in a background thread, returns the server and the base url to use in place of the pistachio config's base_path"""
+    server = StubServer(("127.0.0.1", port), fail_first=fail_first)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}/rehsani_local".format(server.server_address[1])
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    server, base_url = start_stub(port)
+    print("serving stub webserver at {} (ctrl+c to stop)".format(base_url))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
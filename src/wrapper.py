@@ -1,28 +1,70 @@
 """wrapper.py: acts as an inbetween for main.py and the more generalized library-esque data_*.py scripts"""
 __author__ = "Anthony Rubick"
 
+import copy
+import os
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-from typing import List
+from typing import TYPE_CHECKING, Dict, Iterator, List, Tuple
 
-from data_analyzer import Analyzer
-from data_parser import Parser
-from data_processor import Processor
-from definitions import Configs, Data_Sensor_Type
-import matplotlib.pyplot as plt
+import numpy as np
+
+import data_calibration
+import data_rollup
+from data_analyzer import Analyzer, calc_vpd
+from data_catalog import find_periods
+from data_gaps import GapIndex
+from data_join import get_grid, join_asof
+from data_lru import LRUCache, get_table_size
+from data_parser import DOWNLOAD_TTL, Parser
+from data_profiler import Profiler, measure, profiled
+from data_plotter import get_output_path, get_subplot, new_figure, plot_series, show
+from data_processor import Processor, split_into_days
+from data_store import TimeSeriesStore
+from data_sync import Syncer
+from data_table import DataTable, SensorMatrix
+from definitions import Configs, Data_Sensor_Type, get_period_bounds
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+#bytes of analyzed results kept in memory by default (see Wrapper.memoize)
+DEFAULT_RESULT_BYTES = 128 * 1024 * 1024
+
+#analyzers returned by Wrapper.parse_process_analyze by query, kept while Wrapper.memoize is enabled (None when it isn't)
+_results: LRUCache | None = LRUCache(DEFAULT_RESULT_BYTES)
+
+#fewest files Wrapper.analyze_all reads in worker processes, below this starting them takes longer than parsing the files serially
+#(starting a pool takes about 50 ms, a month of readings takes about 1 ms to analyze if its parsed data is cached, 5 ms if it isn't)
+POOL_MIN_FILES = 48
 
 class Wrapper:
     """acts as a layer between the user and the library-esque functionality of the data_... files, """
-    def run(config: Configs, startdate:datetime, enddate:datetime, sap_sensorid:int | None = None, weather_sensorid:int | None = None, lux_sensorid:int | None = None):
+    def run(config: Configs, startdate:datetime, enddate:datetime, sap_sensorid:int | None = None, weather_sensorid:int | None = None, lux_sensorid:int | None = None, sync:bool = False,
+            output_dir:str | None = None, file_format:str = "png", downsample:bool = True, profiler:Profiler | None = None) -> str | None:
         """'optional' args:
         sap_sensorid:int id for the sap and moisture sensor whose data is to be processed
-        weather_sensorid:int id for the weather station whose data is to be processed"""
+        weather_sensorid:int id for the weather station whose data is to be processed
+        sync:bool for configs whose data is downloaded, sync it to a local store and read it from there (see data_sync.py) instead of downloading the whole range
+        output_dir:str if given, the plots are rendered to a file (named after the config, sensors, and date range) in this directory instead of shown in a window,
+            this doesn't need a display. returns the path of the file
+        file_format:str format of the rendered file ("png", "svg", "pdf", ...)
+        downsample:bool when rendering, reduce every series to about one point per horizontal pixel before plotting it
+        profiler:Profiler if given, the time, rows, and bytes read of every stage (downloading, parsing, processing, analyzing, plotting) are recorded to it,
+            see data_profiler.py for the report"""
         
+        with profiler if profiler is not None else nullcontext():
+            return Wrapper.__run(config, startdate, enddate, sap_sensorid, weather_sensorid, lux_sensorid, sync, output_dir, file_format, downsample)
+    
+    def __run(config: Configs, startdate:datetime, enddate:datetime, sap_sensorid:int | None, weather_sensorid:int | None, lux_sensorid:int | None, sync:bool,
+              output_dir:str | None, file_format:str, downsample:bool) -> str | None:
         match config:
             case Configs.ALMOND:
                 #ensure all needed optional variables where given and call runner function
                 if sap_sensorid in config.get_sensor_ids(Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR) and (
                     lux_sensorid in config.get_sensor_ids(Data_Sensor_Type.LUX_SENSOR)):
-                    Wrapper.__run_normal(config=config, startdate=startdate, enddate=enddate, sap_sensorids=[sap_sensorid], lux_sensorids=[lux_sensorid]) 
+                    return Wrapper.__run_normal(config=config, startdate=startdate, enddate=enddate, sap_sensorids=[sap_sensorid], lux_sensorids=[lux_sensorid], sync=sync,
+                                                output_dir=output_dir, file_format=file_format, downsample=downsample)
                 else:
                     raise RuntimeError("sensor(s) with given id(s) not found")
             case Configs.PISTACHIO:
@@ -30,13 +72,15 @@ class Wrapper:
                 if sap_sensorid in config.get_sensor_ids(Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR) and (
                     weather_sensorid in config.get_sensor_ids(Data_Sensor_Type.WEATHER_STATION)) and (
                     lux_sensorid in config.get_sensor_ids(Data_Sensor_Type.LUX_SENSOR)):
-                    Wrapper.__run_normal(config=config, startdate=startdate, enddate=enddate, sap_sensorids=[sap_sensorid], weather_sensorids=[weather_sensorid], lux_sensorids=[lux_sensorid]) 
+                    return Wrapper.__run_normal(config=config, startdate=startdate, enddate=enddate, sap_sensorids=[sap_sensorid], weather_sensorids=[weather_sensorid], lux_sensorids=[lux_sensorid], sync=sync,
+                                                output_dir=output_dir, file_format=file_format, downsample=downsample)
                 else:
                     raise RuntimeError("sensor(s) with given id(s) not found")
             case _:
                 raise RuntimeError("desired config not yet implemented")
     
-    def __run_normal(config:Configs, startdate:datetime, enddate:datetime, sap_sensorids:List[int] | None = None, weather_sensorids:List[int] | None = None, lux_sensorids:int|None=None):
+    def __run_normal(config:Configs, startdate:datetime, enddate:datetime, sap_sensorids:List[int] | None = None, weather_sensorids:List[int] | None = None, lux_sensorids:int|None=None, sync:bool=False,
+                     output_dir:str|None=None, file_format:str="png", downsample:bool=True) -> str | None:
         #DATA
         cols = 4 #columns of subplots
         rows = 2 #rows of subplots
@@ -52,6 +96,10 @@ class Wrapper:
         if lux_sensorids == None:
             lux_sensorids = [None]
         
+        #figures are only managed by pyplot when they're shown in a window
+        figure = new_figure(interactive=output_dir is None)
+        downsample = downsample and output_dir is not None
+        
         #SAP AND MOISTURE SENSOR(S)
         for id in sap_sensorids:
             #parse, process, and analyze data
@@ -60,24 +108,19 @@ class Wrapper:
                 analyzer = Wrapper.parse_process_analyze(config=config,sensor_type=Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR,
                                                            startdate=startdate,enddate=enddate,
                                                            fields_to_remove=['Field','Sensor ID'],
-                                                           smoothening_interval=timedelta(minutes=60),sensorid=id)
+                                                           smoothening_interval=timedelta(minutes=60),sensorid=id,sync=sync)
             except RuntimeError as e:
                 print("ERROR: {}\n\tskipping...".format(e.args[0]))
                 continue
             
             #plot data
-            x:datetime = analyzer.data.get("Date and Time")
-            y_titles = ["Sap Flux Density", "Relative Moisture %"]
-            y_lists = [analyzer.data.get(title) for title in y_titles]
-            for i,y in enumerate(y_lists):
-                plt.subplot(rows,cols,(1 +2*i,2 +2*i))
-                if id is not None:
-                    plt.plot(x,y,linewidth=0.5, label="{}".format(id))
-                    plt.legend()
-                else: 
-                    plt.plot(x,y)
-                plt.title("{}\n".format(y_titles[i]))
-                plt.xticks(rotation=45)
+            with measure("Wrapper.plot", rows=len(analyzer.data)):
+                x = analyzer.data.get("Date and Time")
+                y_titles = ["Sap Flux Density", "Relative Moisture %"]
+                y_lists = [analyzer.data.get(title) for title in y_titles]
+                for i,y in enumerate(y_lists):
+                    plot_series(get_subplot(figure,rows,cols,(1 +2*i,2 +2*i)), x, y, y_titles[i],
+                                label="{}".format(id) if id is not None else None, linewidth=0.5, downsample=downsample)
 
         #WEATHER STATION(S)
         for id in weather_sensorids:
@@ -87,13 +130,13 @@ class Wrapper:
                 analyzer = Wrapper.parse_process_analyze(config=config,sensor_type=Data_Sensor_Type.WEATHER_STATION,
                                                            startdate=startdate,enddate=enddate,
                                                            fields_to_remove=['Field','Altitude [m]'],
-                                                           smoothening_interval=timedelta(minutes=60),sensorid=id)
+                                                           smoothening_interval=timedelta(minutes=60),sensorid=id,sync=sync)
             except RuntimeError as e:
                 print("ERROR: {}\n\tskipping...".format(e.args[0]))
                 continue
             #plot data
             Wrapper.plot(analyzer=analyzer,sensorid=id,x_field="Date and Time",y_fields=["Temperature [℃]","Humidity [RH%]","Pressure [hPa]"],
-                         subplot_index_offset=indexes_used_for_sap,subplot_rows=rows,subplot_cols=cols)
+                         subplot_index_offset=indexes_used_for_sap,subplot_rows=rows,subplot_cols=cols,figure=figure,downsample=downsample)
 
         #LUX_SENSOR(S)
         for id in lux_sensorids:
@@ -102,39 +145,114 @@ class Wrapper:
             try:
                 analyzer = Wrapper.parse_process_analyze(config=config,sensor_type=Data_Sensor_Type.LUX_SENSOR,
                                                             startdate=startdate,enddate=enddate,
-                                                            smoothening_interval=timedelta(minutes=60),sensorid=id)
+                                                            smoothening_interval=timedelta(minutes=60),sensorid=id,sync=sync)
             except RuntimeError as e:
                 print("ERROR: {}\n\tskipping...".format(e.args[0]))
                 continue
             #plot data
             Wrapper.plot(analyzer=analyzer,sensorid=id,x_field="Date and Time",y_fields=["Light (KLux)"],
-                         subplot_index_offset=indexes_used_for_sap+indexes_used_for_weather,subplot_rows=rows,subplot_cols=cols)
+                         subplot_index_offset=indexes_used_for_sap+indexes_used_for_weather,subplot_rows=rows,subplot_cols=cols,figure=figure,downsample=downsample)
         
-        #show plot
-        plt.tight_layout(pad=0.3, rect=[0,0,1,1])
-        plt.show()        
+        figure.tight_layout(pad=0.3, rect=[0,0,1,1])
+        if output_dir is None:
+            #show plot
+            with measure("show"):
+                show()
+            return None
+        
+        #render plot
+        os.makedirs(output_dir, exist_ok=True)
+        path = get_output_path(output_dir, config.name, {"sap": sap_sensorids[0], "weather": weather_sensorids[0], "lux": lux_sensorids[0]},
+                               startdate, enddate, file_format)
+        with measure("render"):
+            figure.savefig(path, format=file_format)
+        return path
     
+    @profiled("Wrapper.plot", rows_in=lambda analyzer, *args, **kwargs: len(analyzer.data), rows_out=lambda result, analyzer, *args, **kwargs: len(analyzer.data))
     def plot(analyzer:Analyzer, sensorid:int|None, x_field:str, y_fields:List[str], 
-             subplot_rows:int, subplot_cols:int, subplot_index_offset:int=0):
+             subplot_rows:int, subplot_cols:int, subplot_index_offset:int=0, figure:'Figure|None'=None, downsample:bool=False):
+        """plot y_fields against x_field on consecutive subplots of figure (defaults to pyplot's current figure)"""
+        if figure is None:
+            import matplotlib.pyplot as plt
+            figure = plt.gcf()
         #plot data
-        x:datetime = analyzer.data.get(x_field)
+        x = analyzer.data.get(x_field)
         y_titles = y_fields
         y_lists = [analyzer.data.get(title) for title in y_titles]
         for i,y in enumerate(y_lists):
             n=i+1
-            plt.subplot(subplot_rows,subplot_cols, n + subplot_index_offset)
-            if not isinstance(sensorid,type(None)):
-                plt.plot(x,y,linewidth=1, label="{}".format(sensorid))
-                plt.legend()
-            else: 
-                plt.plot(x,y)
-            plt.title("{}\n".format(y_titles[i]))
-            plt.xticks(rotation=45)
+            plot_series(get_subplot(figure,subplot_rows,subplot_cols, n + subplot_index_offset), x, y, y_titles[i],
+                        label="{}".format(sensorid) if not isinstance(sensorid,type(None)) else None, downsample=downsample)
+    
+    def memoize(enabled:bool = True, max_bytes:int = DEFAULT_RESULT_BYTES):
+        """keep the results of parse_process_analyze in memory (by query, see data_lru.py), so the same query returns them without running again.
+        on by default, once more than max_bytes are kept the least recently used are dropped. disabling it (or enabling it again) drops everything kept.
+        parsed files are kept separately, see Parser.memoize"""
+        global _results
+        _results = LRUCache(max_bytes) if enabled else None
+    
+    def get_cache_stats() -> Dict[str, Dict[str, int] | None]:
+        """hits, misses, evictions, and bytes kept by the in-memory caches of parsed files ("parsed") and of analyzed results ("analyzed"), None for those that are disabled"""
+        return {"parsed": Parser.get_memo_stats(), "analyzed": _results.get_stats() if _results is not None else None}
     
     def parse_process_analyze(config:Configs, sensor_type:Data_Sensor_Type, startdate:datetime, enddate:datetime,
-                              fields_to_remove:List[str]|None=None, smoothening_interval:timedelta|None=None,sensorid:int|None=None) -> Analyzer:
-        #parse data
-        data = Wrapper.__get_data(config=config,sensor_type=sensor_type,startdate=startdate,enddate=enddate,sensorid=sensorid)
+                              fields_to_remove:List[str]|None=None, smoothening_interval:timedelta|None=None,sensorid:int|None=None, sync:bool=False,
+                              use_rollups:bool=True, store:bool=False) -> Analyzer:
+        """'optional' args:
+        use_rollups:bool if the smoothening interval is a multiple of an hour or day and the range is made of whole hours/days,
+            smoothen the data from precomputed hourly/daily rollups (see data_rollup.py) rather than from every reading
+        store:bool read the readings from the local time series store (see data_store.py) rather than from the data files or webserver,
+            they need to be imported into it first (see the import command of cli.py)
+        
+        results are kept in memory (see memoize) until the files they were read from change"""
+        source, ttl = Wrapper.__get_source_version(config, sensor_type, startdate, enddate, sensorid, sync, store) if _results is not None else (None, None)
+        if source is not None and sensor_type == Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR:
+            #recalibrating a sensor changes its results too
+            source = (source, data_calibration.get_version(config))
+        key = (config.name, sensor_type, sensorid, startdate, enddate, tuple(fields_to_remove) if fields_to_remove is not None else None,
+               smoothening_interval, sync, use_rollups, store, source)
+        if source is not None:
+            analyzer = _results.get(key)
+            if analyzer is not None:
+                return _copy_analyzer(analyzer)
+        
+        rollup = data_rollup.find_rollup(startdate, enddate, smoothening_interval) if use_rollups and not sync and not store else None
+        if rollup is not None:
+            if config.needs_sensorid(sensor_type) and isinstance(sensorid,type(None)):
+                raise RuntimeError("for this config, the given sensor requires a sensor id and none was given")
+            data = data_rollup.load_smoothened(config, sensor_type, sensorid, startdate, enddate, smoothening_interval, rollup)
+            analyzer = Wrapper.__process_analyze(data, config, sensor_type, startdate, enddate, fields_to_remove, None, sensorid)
+        else:
+            #parse data
+            data = Wrapper.__get_data(config=config,sensor_type=sensor_type,startdate=startdate,enddate=enddate,sensorid=sensorid,sync=sync,store=store)
+            analyzer = Wrapper.__process_analyze(data, config, sensor_type, startdate, enddate, fields_to_remove, smoothening_interval, sensorid)
+        
+        if source is not None and _results is not None:
+            _results.put(key, analyzer, get_table_size(analyzer.data), ttl=ttl)
+            return _copy_analyzer(analyzer)
+        return analyzer
+    
+    def __get_source_version(config:Configs, sensor_type:Data_Sensor_Type, startdate:datetime, enddate:datetime, sensorid:int|None, sync:bool, store:bool) -> Tuple[Tuple | None, float | None]:
+        """(what the data of a query is read from, seconds its result can be kept for), results are kept until the first changes (or None if they can't be kept),
+        files are described by their size and modification time, downloads of months that aren't over only last DOWNLOAD_TTL seconds"""
+        try:
+            if store:
+                stat = os.stat(TimeSeriesStore(config).get_paths(sensor_type, sensorid)[0])
+                return (stat.st_size, stat.st_mtime_ns), None
+            periods = find_periods(config, sensor_type, sensorid, startdate, enddate)
+            if config.isdownloaded:
+                unfinished = any(get_period_bounds(year, month)[1] > datetime.now() for year, month in periods)
+                return (), DOWNLOAD_TTL if unfinished or sync else None
+            source = []
+            for year, month in periods:
+                stat = os.stat(config.get_path(sensor_type, id=sensorid, year=year, month=month))
+                source.append((stat.st_size, stat.st_mtime_ns))
+            return tuple(source), None
+        except (OSError, RuntimeError):
+            return None, None
+    
+    def __process_analyze(data:DataTable, config:Configs, sensor_type:Data_Sensor_Type, startdate:datetime, enddate:datetime,
+                          fields_to_remove:List[str]|None, smoothening_interval:timedelta|None, sensorid:int|None) -> Analyzer:
         #process data
         processor = Processor(data,config,sensor_type,sensor_id=sensorid)
         if fields_to_remove is not None:
@@ -149,105 +267,171 @@ class Wrapper:
         #return analyzer
         return analyzer
  
-    def __get_data(config:Configs, sensor_type: Data_Sensor_Type, startdate:datetime, enddate:datetime, sensorid:int | None=None):
+    def analyze_all(config:Configs, sensor_type:Data_Sensor_Type, startdate:datetime, enddate:datetime,
+                    fields_to_remove:List[str]|None=None, smoothening_interval:timedelta|None=None, sensorids:List[int]|None=None,
+                    workers:int|None=None) -> SensorMatrix:
+        """parse, process, and analyze the data of several sensors of the same type in one call, returning their results aligned onto a shared time axis
+        
+        the paths a range needs are planned once for every sensor, and for configs whose data is downloaded, every sensor's data is fetched concurrently
+        
+        'optional' args:
+        sensorids:List[int] the sensors to analyze, defaults to every sensor of the given type in config
+        workers:int number of processes to analyze the sensors of configs that read local files with, one job per sensor that parses, processes, and analyzes it,
+            so only its analyzed data is sent back. starting the processes costs more than parsing a few files, so they're only used if there are
+            at least 2 sensors and POOL_MIN_FILES files to read. results don't depend on the number of workers. defaults to a serial run
+        
+        sensors whose data can't be analyzed are skipped with an error message"""
+        if sensorids is None:
+            sensorids = config.get_sensor_ids(sensor_type) if config.needs_sensorid(sensor_type) else [None]
+        #files (and so periods) can differ per sensor, downloads don't
+        sensor_periods = [find_periods(config, sensor_type, id, startdate, enddate) for id in sensorids]
+        
+        if config.isdownloaded:
+            #downloads are already concurrent, and analyzing what was downloaded takes less time than sending it to another process would
+            results: List[DataTable | Exception] = []
+            for id, tables in zip(sensorids, Parser.run_sensors(config, sensor_type, sensorids, sensor_periods[0])):
+                results.append(tables if isinstance(tables, Exception) else _analyze_tables(
+                    tables, config, sensor_type, id, startdate, enddate, fields_to_remove, smoothening_interval))
+        else:
+            jobs = [(config.name, sensor_type, id, periods, startdate, enddate, fields_to_remove, smoothening_interval) for id, periods in zip(sensorids, sensor_periods)]
+            if workers is not None and workers > 1 and len(jobs) > 1 and sum(len(periods) for periods in sensor_periods) >= POOL_MIN_FILES:
+                from concurrent.futures import ProcessPoolExecutor #imports multiprocessing, so only when it's used
+                with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                    results = list(pool.map(_analyze_sensor_job, jobs))
+            else:
+                results = [_analyze_sensor_job(job) for job in jobs]
+        
+        analyzed_ids = []
+        analyzed_data = []
+        for id, result in zip(sensorids, results):
+            if isinstance(result, Exception):
+                print("ERROR: {}\n\tskipping...".format(result.args[0]))
+                continue
+            analyzed_ids.append(id)
+            analyzed_data.append(result)
+        return SensorMatrix(analyzed_ids, analyzed_data)
+    
+    def analyze_joined(config:Configs, startdate:datetime, enddate:datetime, interval:timedelta, sensors:List[Tuple[Data_Sensor_Type, int | None]],
+                       sync:bool=False) -> DataTable:
+        """parse, process, and analyze the data of several sensors (eg. a sap sensor, a weather station, and a lux sensor) averaged over every `interval`
+        starting at startdate, and join them onto one time axis (every interval from startdate to enddate) so their series line up (see data_join.py)
+        
+        numeric fields are float64 columns with NaN for intervals a sensor has no readings in, fields more than one sensor has are prefixed with
+        "<sensor type> <id>". if a weather station is joined, its vapor pressure deficit is added as "VPD [kPa]"
+        
+        sensors whose data can't be analyzed are skipped with an error message"""
+        sources: Dict[str, DataTable] = {}
+        for sensor_type, id in sensors:
+            try:
+                analyzer = Wrapper.parse_process_analyze(config=config, sensor_type=sensor_type, startdate=startdate, enddate=enddate,
+                                                         smoothening_interval=interval, sensorid=id, sync=sync)
+            except RuntimeError as e:
+                print("ERROR: {}\n\tskipping...".format(e.args[0]))
+                continue
+            name = "{} {}".format(sensor_type.name.lower(), id) if id is not None else sensor_type.name.lower()
+            sources[name] = analyzer.data
+        
+        #every sensor was averaged into the same intervals, so they're matched exactly
+        joined = join_asof(get_grid(startdate, enddate, interval), sources, tolerance=timedelta(0), direction="backward")
+        if "Temperature [℃]" in joined and "Humidity [RH%]" in joined:
+            joined["VPD [kPa]"] = calc_vpd(joined["Temperature [℃]"], joined["Humidity [RH%]"])
+        return joined
+    
+    def stream_process_analyze(config:Configs, sensor_type:Data_Sensor_Type, startdate:datetime, enddate:datetime,
+                               fields_to_remove:List[str]|None=None, smoothening_interval:timedelta|None=None,sensorid:int|None=None,
+                               min_completeness:float|None=None) -> Iterator[Analyzer]:
+        """streaming version of parse_process_analyze: yields an analyzed Analyzer for every day in the range, in order,
+        files are read one at a time and only about a day of readings is held at once, so memory use doesn't grow with the range
+        
+        minT is calculated per day, as it is in parse_process_analyze, smoothing intervals are still aligned to startdate
+        but an interval that doesn't divide evenly into a day is cut short at midnight.
+        days that can't be analyzed are skipped with an error message
+        
+        'optional' args:
+        min_completeness:float if given, days with less than this fraction of their expected readings (and, for sap sensors, days without nighttime readings)
+            are looked up in the gap index (see data_gaps.py) and skipped without being processed"""
+        broken = set()
+        if min_completeness is not None:
+            broken = {np.datetime64(day, 'D') for day in GapIndex(config, sensor_type, sensorid).find_broken_days(startdate, enddate, min_completeness)}
+        for day in split_into_days(Wrapper.__iter_data(config, sensor_type, startdate, enddate, sensorid)):
+            if day.timestamps[0].astype('datetime64[D]') in broken:
+                continue
+            processor = Processor(day,config,sensor_type,sensor_id=sensorid)
+            if fields_to_remove is not None:
+                processor.remove_fields(fields_to_remove)
+            if smoothening_interval is not None:
+                processor.smoothen_data(startdate, smoothening_interval)
+            analyzer = Analyzer(processor)
+            try:
+                analyzer.analyze()
+            except RuntimeError as e:
+                print("ERROR: {} ({})\n\tskipping...".format(e.args[0], day.timestamps[0].astype('datetime64[D]')))
+                continue
+            yield analyzer
+    
+    def __iter_data(config:Configs, sensor_type: Data_Sensor_Type, startdate:datetime, enddate:datetime, sensorid:int | None=None) -> Iterator[DataTable]:
+        """parse data one file (or download) at a time, yielding only the readings in the time range"""
+        if config.needs_sensorid(sensor_type) and isinstance(sensorid,type(None)):
+            raise RuntimeError("for this config, the given sensor requires a sensor id and none was given")
+        
+        for year, month in find_periods(config, sensor_type, sensorid, startdate, enddate):
+            yield Parser.run(config, sensor_type, id=sensorid, year=year, month=month).sort_by_time().between(startdate, enddate)
+    
+    def __get_data(config:Configs, sensor_type: Data_Sensor_Type, startdate:datetime, enddate:datetime, sensorid:int | None=None, sync:bool=False, store:bool=False) -> DataTable:
         """
         parse data in years/months timeframe (needs to read multiple files)
-        if an error is thrown here it's probably because a file doesn't exist in ../data
 
         'optional' args:
-        sensorid:int the id of the sensor, if needed"""
+        sensorid:int the id of the sensor, if needed
+        sync:bool for configs whose data is downloaded, only download what isn't already stored locally
+        store:bool read the data from the local time series store instead"""
         
         #if a sensor id was needed, but none was given, throw an error
         if config.needs_sensorid(sensor_type) and isinstance(sensorid,type(None)):
             raise RuntimeError("for this config, the given sensor requires a sensor id and none was given")
         
-        match config:
-            case Configs.ALMOND:
-                match sensor_type:
-                    case Data_Sensor_Type.WEATHER_STATION:
-                        sensor_data = []
-                        if startdate.year < enddate.year:
-                            #first year
-                            for month in range(startdate.month,12+1):
-                                sensor_data.extend(Parser.run(config, sensor_type, year=startdate.year%100, month=month))
-                            #middle years
-                            if startdate.year+1 < enddate.year-1:
-                                for year in range(startdate.year+1,enddate.year-1):
-                                    for month in range(1,12+1):
-                                        sensor_data.extend(Parser.run(config, sensor_type,year=year%100,month=month)) 
-                            #last year
-                            for month in range(enddate.month,12+1):
-                                sensor_data.extend(Parser.run(config, sensor_type,year=enddate.year%100,month=month))
-                        elif startdate.month < enddate.month:
-                            #months
-                            for month in range(startdate.month,enddate.month+1):
-                                sensor_data.extend(Parser.run(config, sensor_type,year=startdate.year%100,month=month))
-                        else: 
-                            sensor_data.extend(Parser.run(config, sensor_type, year=startdate.year%100, month=startdate.month))
-                        return sensor_data
-                    case Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR | Data_Sensor_Type.LUX_SENSOR:
-                        sensor_data = []
-                        if startdate.year < enddate.year:
-                            #first year
-                            for month in range(startdate.month,12+1):
-                                sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=startdate.year%100, month=month))
-                            #middle years
-                            if startdate.year+1 < enddate.year-1:
-                                for year in range(startdate.year+1,enddate.year-1):
-                                    for month in range(1,12+1):
-                                        sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=year%100, month=month)) 
-                            #last year
-                            for month in range(enddate.month,12+1):
-                                sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=enddate.year%100, month=month))
-                        elif startdate.month < enddate.month:
-                            #months
-                            for month in range(startdate.month,enddate.month+1):
-                                sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=startdate.year%100, month=month))
-                        else: 
-                            sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=startdate.year%100, month=startdate.month))
-                        return sensor_data
-                    case _:
-                        raise RuntimeError("desired Data_Sensor_Type not yet implemented for this config")
-            case Configs.PISTACHIO:
-                match sensor_type:
-                    case Data_Sensor_Type.WEATHER_STATION:
-                        sensor_data = []
-                        if startdate.year < enddate.year:
-                            #first year
-                            sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=startdate.year%100))
-                            #middle years
-                            if startdate.year+1 < enddate.year-1:
-                                for year in range(startdate.year+1,enddate.year-1):
-                                    sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=year%100)) 
-                            #last year
-                            sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=enddate.year%100))
-                        else:
-                            sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=startdate.year%100))
-                        return sensor_data
-                    #make special cases for ones that do things differently
-                    case Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR | Data_Sensor_Type.LUX_SENSOR:
-                        sensor_data = []
-                        if startdate.year < enddate.year:
-                            #first year
-                            for month in range(startdate.month,12+1):
-                                sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=startdate.year%100, month=month))
-                            #middle years
-                            if startdate.year+1 < enddate.year-1:
-                                for year in range(startdate.year+1,enddate.year-1):
-                                    for month in range(1,12+1):
-                                        sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=year%100, month=month)) 
-                            #last year
-                            for month in range(enddate.month,12+1):
-                                sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=enddate.year%100, month=month))
-                        elif startdate.month < enddate.month:
-                            #months
-                            for month in range(startdate.month,enddate.month+1):
-                                sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=startdate.year%100, month=month))
-                        else: 
-                            sensor_data.extend(Parser.run(config, sensor_type, id=sensorid, year=startdate.year%100, month=startdate.month))
-                        return sensor_data
-                    case _:
-                        raise RuntimeError("desired Data_Sensor_Type not yet implemented for this config")
-            case _:
-                raise RuntimeError("desired Config not yet implemented")
-    
\ No newline at end of file
+        if sync and config.isdownloaded:
+            syncer = Syncer(config)
+            syncer.sync(sensor_type, sensorid, since=startdate, until=min(enddate, datetime.now()))
+            return syncer.load(sensor_type, sensorid, startdate, enddate)
+        
+        if store:
+            data = TimeSeriesStore(config).load(sensor_type, sensorid, startdate, enddate)
+            if len(data) == 0:
+                raise RuntimeError("no stored data found for the given sensor between {} and {}, import it first".format(startdate, enddate))
+            return data
+        
+        #only the files (or downloads) holding readings in the range are parsed, see data_catalog.py
+        periods = find_periods(config, sensor_type, sensorid, startdate, enddate)
+        if len(periods) == 0:
+            raise RuntimeError("no data found for the given sensor between {} and {}".format(startdate, enddate))
+        return DataTable.concatenate(Parser.run_many(config, sensor_type, sensorid, periods))
+    
+def _copy_analyzer(analyzer:Analyzer) -> Analyzer:
+    """an analyzer with the same results, adding or removing fields of one doesn't affect the other"""
+    copied = copy.copy(analyzer)
+    copied.data = analyzer.data.copy()
+    copied.fields = list(analyzer.fields)
+    return copied
+
+def _analyze_tables(tables:List[DataTable], config:Configs, sensor_type:Data_Sensor_Type, id:int | None, startdate:datetime, enddate:datetime,
+                    fields_to_remove:List[str] | None, smoothening_interval:timedelta | None) -> DataTable | RuntimeError:
+    """process and analyze the parsed data of one sensor, returns the analyzed data, or the error that stopped it from being analyzed"""
+    if len(tables) == 0:
+        return RuntimeError("no data found for sensor {} between {} and {}".format(id, startdate, enddate))
+    try:
+        return Wrapper._Wrapper__process_analyze(DataTable.concatenate(tables), config, sensor_type, startdate, enddate,
+                                                 fields_to_remove, smoothening_interval, id).data
+    except RuntimeError as e:
+        return e
+
+#job run by Wrapper.analyze_all, defined at module level so it can be sent to worker processes
+def _analyze_sensor_job(job:Tuple) -> DataTable | Exception:
+    """parse, process, and analyze the files of one sensor, job is (config name, sensor type, sensor id, periods, startdate, enddate, fields to remove, smoothening interval)"""
+    config_name, sensor_type, id, periods, startdate, enddate, fields_to_remove, smoothening_interval = job
+    config = Configs[config_name]
+    try:
+        tables = Parser.run_many(config, sensor_type, id, periods)
+    except (OSError, RuntimeError) as e:
+        return e
+    return _analyze_tables(tables, config, sensor_type, id, startdate, enddate, fields_to_remove, smoothening_interval)
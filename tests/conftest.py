@@ -0,0 +1,42 @@
+"""conftest.py: makes the modules in src/ (and the scripts in src/other_scripts/) importable from the tests, gives every test its own cache directory,
+and starts the stub webserver for tests that download"""
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, os.path.join(SRC_DIR, "other_scripts"))
+
+import data_cache
+import data_calibration
+import data_catalog
+import data_gaps
+import data_parser
+import data_rollup
+import definitions
+from data_lru import LRUCache
+from definitions import Configs
+from webserver_stub import start_stub
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """an empty cache directory (rather than the repo's cache/), with the caches kept in memory emptied too, so tests don't share state with each other or the user"""
+    path = str(tmp_path / "cache")
+    for module in (definitions, data_cache, data_calibration, data_catalog, data_gaps, data_rollup):
+        monkeypatch.setattr(module, "CACHE_DIR", path)
+    monkeypatch.setattr(data_catalog, "_catalogs", {})
+    monkeypatch.setattr(data_calibration, "_tables", {})
+    monkeypatch.setattr(data_parser, "_memo", LRUCache(data_parser.DEFAULT_MEMO_BYTES))
+    return path
+
+@pytest.fixture
+def stub(monkeypatch):
+    """the stub webserver (see webserver_stub.py), serving the pistachio config's urls for the duration of the test"""
+    server, base_url = start_stub()
+    get_path = Configs.get_path
+    monkeypatch.setattr(Configs, "get_path", lambda self, *args, **kwargs: get_path(self, *args, **kwargs).replace(Configs.PISTACHIO.base_path, base_url))
+    yield server
+    server.shutdown()
+    server.server_close()
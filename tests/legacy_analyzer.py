@@ -0,0 +1,48 @@
+"""legacy_analyzer.py: the list based sap flux / minT / relative moisture analysis data_analyzer used before it was vectorized,
+kept as the reference the vectorized kernel is tested against (see test_analyzer.py) and timed against (see benchmark_analyzer.py)"""
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+def legacy_calc_minT_list(deltat_list:List[float], datetime_list:List[datetime]) -> List[float]:
+    """the per-reading minT calculation data_analyzer used before it was vectorized"""
+    tempminT:Dict[datetime,Tuple[float,int]] = {}
+    datetimelen = len(datetime_list)
+    prevdatetime = datetime_list[0]
+    dayreadingscount = 1
+    nightreadingstotaldt = 0.0
+    nightreadingscount = 0
+    if prevdatetime.hour >= 0 and prevdatetime.hour <= 7:
+        nightreadingstotaldt = deltat_list[0]
+        nightreadingscount = 1
+    for i,(currdatetime,dt) in enumerate(dict(zip(datetime_list[1:], deltat_list[1:])).items()):
+        if currdatetime.day==prevdatetime.day and currdatetime.month==prevdatetime.month  and  currdatetime.year==prevdatetime.year:
+            if currdatetime.hour >= 0 and currdatetime.hour <= 7:
+                nightreadingstotaldt += dt
+                nightreadingscount += 1
+            dayreadingscount += 1
+        else:
+            if currdatetime.hour >= 0 and currdatetime.hour <= 7:
+                tempminT[datetime(prevdatetime.year,prevdatetime.month,prevdatetime.day)] = (nightreadingstotaldt / nightreadingscount,dayreadingscount)
+                nightreadingstotaldt = dt
+                nightreadingscount = 1
+            dayreadingscount = 1
+        if i+1 >= datetimelen-1:
+            tempminT[datetime(prevdatetime.year,prevdatetime.month,prevdatetime.day)] = (nightreadingstotaldt / nightreadingscount,dayreadingscount)
+        prevdatetime = currdatetime
+    minT_list = []
+    for t_tup in tempminT.values():
+        minT_list.extend( [t_tup[0] for n in range(t_tup[1])] )
+    return minT_list
+
+def legacy_calc_sap_series(value1:List[int], value2:List[int], timestamps:List[datetime], a:float, b:float) -> Dict[str, List[float]]:
+    """the list comprehension based analysis data_analyzer used before it was vectorized"""
+    deltat = [ (x-1000)/20 for x in value1]
+    minT = legacy_calc_minT_list(deltat, timestamps)
+    K = [ -( minT[i] -dt)/dt for i,dt in enumerate(deltat)]
+    return {
+        "ΔT": deltat,
+        "minT": minT,
+        "K": K,
+        "Sap Flux Density": [ max(0,118.99*pow(10,-6)*k ) for k in K],
+        "Relative Moisture %": [ max(0,min(100,(a * x) + b)) for x in value2],
+    }
@@ -0,0 +1,83 @@
+"""tests of the sap flux / minT / relative moisture kernel in data_analyzer.py, against the list based implementation it replaced (see legacy_analyzer.py)"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import data_calibration
+from data_analyzer import calc_minT, calc_sap_series
+from data_parser import Parser
+from data_processor import Processor
+from definitions import Configs, Data_Sensor_Type
+from legacy_analyzer import legacy_calc_sap_series
+
+SAP = Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR
+
+A, B = -0.05, 210.0
+
+def readings(timestamps:list) -> tuple:
+    """(value1, value2, timestamps) of readings at the given times, with value1 (and so ΔT) changing every reading"""
+    timestamps = np.array(timestamps, dtype='datetime64[s]')
+    value1 = 1060 + (np.arange(len(timestamps)) * 7) % 50
+    value2 = 2700 + (np.arange(len(timestamps)) * 13) % 300
+    return value1, value2, timestamps
+
+@pytest.fixture
+def hourly():
+    """a reading every hour of the 1st and 2nd of March 2022, in order"""
+    return readings(np.datetime64('2022-03-01T00:00:00') + np.arange(48) * np.timedelta64(1, 'h'))
+
+def test_matches_list_based_implementation(hourly):
+    value1, value2, timestamps = hourly
+    expected = legacy_calc_sap_series(value1.tolist(), value2.tolist(), timestamps.tolist(), A, B)
+    actual = calc_sap_series(value1, value2, timestamps, A, B)
+    for field, values in expected.items():
+        np.testing.assert_allclose(actual[field], values, rtol=1e-12, atol=0, err_msg=field)
+
+@pytest.mark.parametrize("id", Configs.ALMOND.get_sensor_ids(SAP))
+@pytest.mark.parametrize("interval", [None, timedelta(hours=1)])
+def test_matches_list_based_implementation_on_almond_data(id, interval):
+    """every day of the almond data in data/ (every reading, and smoothened hourly) that the old implementation could analyze"""
+    calibration = data_calibration.load(Configs.ALMOND).get(id)
+    compared = 0
+    for year, month in Configs.ALMOND.get_periods(SAP, datetime(2022, 3, 1), datetime(2022, 6, 30)):
+        processor = Processor(Parser.run(Configs.ALMOND, SAP, id=id, year=year, month=month), Configs.ALMOND, SAP, sensor_id=id)
+        if interval is not None:
+            processor.smoothen_data(datetime(2000 + year, month, 1), interval)
+        data = processor.data.sort_by_time()
+        days = data.timestamps.astype('datetime64[D]')
+        for day in np.unique(days):
+            #the old implementation only handles days that start with a nighttime reading
+            day_data = data.take(days == day)
+            timestamps = day_data.timestamps.tolist()
+            if timestamps[0].hour > 7 or len(timestamps) < 2:
+                continue
+            expected = legacy_calc_sap_series(day_data["Value 1"].tolist(), day_data["Value 2"].tolist(), timestamps, calibration.a, calibration.b)
+            actual = calc_sap_series(day_data["Value 1"], day_data["Value 2"], day_data.timestamps, calibration.a, calibration.b)
+            for field, values in expected.items():
+                np.testing.assert_allclose(actual[field], values, rtol=1e-12, atol=0, err_msg="{} on {}".format(field, day))
+            compared += 1
+    assert compared > 0
+
+def test_order_doesnt_matter(hourly):
+    value1, value2, timestamps = hourly
+    expected = calc_sap_series(value1, value2, timestamps, A, B)
+    order = np.random.default_rng(0).permutation(len(timestamps))
+    actual = calc_sap_series(value1[order], value2[order], timestamps[order], A, B)
+    for field, values in expected.items():
+        np.testing.assert_allclose(actual[field], values[order], rtol=1e-12, atol=0, err_msg=field)
+
+def test_day_boundaries():
+    _, _, timestamps = readings(['2022-03-01T07:59:59', '2022-03-01T08:00:00', '2022-03-01T23:59:59', '2022-03-02T00:00:00', '2022-03-02T12:00:00'])
+    deltat = np.array([1.0, 100.0, 100.0, 3.0, 100.0])
+    #7:59:59 is the last nighttime second, midnight starts the next day
+    np.testing.assert_array_equal(calc_minT(deltat, timestamps), [1.0, 1.0, 1.0, 3.0, 3.0])
+
+def test_days_without_nighttime_readings_are_nan():
+    value1, value2, timestamps = readings(['2022-03-01T00:00:00', '2022-03-01T09:00:00', '2022-03-02T08:00:00', '2022-03-02T20:00:00', '2022-03-03T01:00:00'])
+    series = calc_sap_series(value1, value2, timestamps, A, B)
+    for field in ("minT", "K", "Sap Flux Density"):
+        assert np.isnan(series[field][2:4]).all(), field
+        assert not np.isnan(series[field][[0, 1, 4]]).any(), field
+    assert not np.isnan(series["Relative Moisture %"]).any()
+    assert series["minT"][0] == series["minT"][1] == series["ΔT"][0]
@@ -0,0 +1,37 @@
+"""tests of data_catalog.py"""
+from datetime import datetime
+
+import pytest
+
+import data_catalog
+from data_catalog import Catalog, find_periods
+from definitions import Configs, Data_Sensor_Type
+
+SAP = Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR
+HEADER = "Date and Time,Field,Sensor ID,Value 1,Value 2\n"
+
+def row(timestamp:str) -> str:
+    return "{},Stevinson Almond,TREW 1,1080,2500\n".format(timestamp)
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """the almond catalog, of a data directory holding one file with readings on the 1st and 2nd of March 2022"""
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "Data_TREWid1_22_03_almond.csv").write_text(HEADER + row("2022-03-02 00:00:00") + row("2022-03-01 00:00:00"))
+    catalog = Catalog(Configs.ALMOND, data_dir=str(data_dir))
+    monkeypatch.setitem(data_catalog._catalogs, Configs.ALMOND.name, catalog)
+    return catalog
+
+def test_appended_readings_are_found(catalog):
+    assert find_periods(Configs.ALMOND, SAP, 1, datetime(2022, 3, 10), datetime(2022, 3, 20)) == []
+    with open(catalog.data_dir + "/Data_TREWid1_22_03_almond.csv", mode='a', encoding='utf-8') as datafile:
+        datafile.write(row("2022-03-15 00:00:00"))
+    assert find_periods(Configs.ALMOND, SAP, 1, datetime(2022, 3, 10), datetime(2022, 3, 20)) == [(22, 3)]
+    assert catalog.entries["Data_TREWid1_22_03_almond.csv"].rows == 3
+
+def test_new_files_are_found(catalog):
+    assert find_periods(Configs.ALMOND, SAP, 1, datetime(2022, 4, 1), datetime(2022, 4, 30)) == []
+    with open(catalog.data_dir + "/Data_TREWid1_22_04_almond.csv", mode='w', encoding='utf-8') as datafile:
+        datafile.write(HEADER + row("2022-04-01 00:10:00"))
+    assert find_periods(Configs.ALMOND, SAP, 1, datetime(2022, 3, 1), datetime(2022, 4, 30)) == [(22, 3), (22, 4)]
@@ -0,0 +1,48 @@
+"""tests of data_fetcher.py, against the stub webserver (see webserver_stub.py) on an ephemeral port"""
+import pytest
+
+from data_fetcher import Fetcher
+from data_parser import parse_webserver_response
+from definitions import Configs, Data_Sensor_Type
+from webserver_stub import start_stub
+
+SAP = Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR
+
+@pytest.fixture
+def start():
+    """start(fail_first) starts a stub failing the first fail_first requests, returns (server, url of July 2022 of sap sensor 1 on it)"""
+    servers = []
+    def start(fail_first:int = 0):
+        server, base_url = start_stub(fail_first=fail_first)
+        servers.append(server)
+        return server, base_url + "/trew/?id=1&m=7&y=22"
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_failed_requests_are_retried(start):
+    server, url = start(fail_first=2)
+    with Fetcher(retries=3, backoff=0.01) as fetcher:
+        response = fetcher.fetch(url)
+    assert server.requests == 3
+    assert len(parse_webserver_response(response, Configs.PISTACHIO, SAP)) == 31 * 144
+
+def test_gives_up_after_retries(start):
+    server, url = start(fail_first=1000)
+    with Fetcher(retries=2, backoff=0.01) as fetcher:
+        with pytest.raises(RuntimeError):
+            fetcher.fetch(url)
+    assert server.requests == 3 #the first try, and 2 retries
+
+def test_concurrent_fetches_keep_order(start):
+    server, url = start()
+    base_url = url.split("/trew/")[0]
+    periods = [(year, month) for year in (21, 22) for month in range(1, 13)]
+    urls = [base_url + "/trew/?id=1&m={}&y={}".format(month, year) for year, month in periods]
+    with Fetcher(workers=4) as fetcher:
+        responses = fetcher.fetch_all(urls)
+    assert server.requests == len(urls)
+    for (year, month), response in zip(periods, responses):
+        data = parse_webserver_response(response, Configs.PISTACHIO, SAP)
+        assert str(data.timestamps[0]).startswith("20{}-{:0>2}-01".format(year, month))
@@ -0,0 +1,27 @@
+"""tests of data_profiler.py"""
+import pytest
+
+from data_profiler import Profiler, profiled
+
+@profiled("failing", rows_in=lambda rows: len(rows), rows_out=lambda result, rows: len(result))
+def failing(rows:list) -> list:
+    raise OSError("unreadable")
+
+@profiled("succeeding", rows_in=lambda rows: len(rows), rows_out=lambda result, rows: len(result))
+def succeeding(rows:list) -> list:
+    return rows[:1]
+
+def test_errors_of_profiled_stages_are_raised():
+    with Profiler() as profiler:
+        with pytest.raises(OSError, match="unreadable"):
+            failing([1, 2, 3])
+    assert profiler.calls[0]["stage"] == "failing"
+    assert profiler.calls[0]["rows_in"] == 3
+    assert profiler.calls[0]["rows_out"] is None
+    assert profiler.stack == []
+
+def test_rows_are_recorded():
+    with Profiler() as profiler:
+        succeeding([1, 2, 3])
+    assert profiler.get_report()["succeeding"]["rows_in"] == 3
+    assert profiler.get_report()["succeeding"]["rows_out"] == 1
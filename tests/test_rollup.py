@@ -0,0 +1,45 @@
+"""tests of data_rollup.py"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import data_rollup
+import wrapper
+from definitions import Configs, Data_Sensor_Type
+from wrapper import Wrapper
+
+SAP = Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR
+START, END = datetime(2022, 3, 1), datetime(2022, 4, 30, 23, 59, 59)
+
+def test_only_changed_files_are_rewritten(monkeypatch):
+    rolled = data_rollup.load(Configs.ALMOND, SAP, 1, START, END, "hourly")
+    store_dir = data_rollup.get_store_dir(Configs.ALMOND, SAP, 1, "hourly")
+    march, april = (os.path.join(store_dir, "{}.npy".format(data_rollup.get_period_key(22, month))) for month in (3, 4))
+    written = {path: os.stat(path).st_mtime_ns for path in (march, april)}
+
+    #pretend april's file changed since it was rolled up
+    get_source = data_rollup._get_source
+    monkeypatch.setattr(data_rollup, "_get_source", lambda config, sensor_type, id, year, month:
+                        {**get_source(config, sensor_type, id, year, month), **({"size": -1} if month == 4 else {})})
+    reloaded = data_rollup.load(Configs.ALMOND, SAP, 1, START, END, "hourly")
+    assert os.stat(march).st_mtime_ns == written[march]
+    assert os.stat(april).st_mtime_ns != written[april]
+    assert data_rollup._read_meta(store_dir)["periods"]["22_04"]["size"] == -1
+    assert reloaded.fields == rolled.fields
+    for field in rolled.fields:
+        assert np.array_equal(reloaded[field], rolled[field], equal_nan=rolled[field].dtype.kind == 'f')
+
+def test_derived_series_are_rolled_up():
+    rolled = data_rollup.load(Configs.ALMOND, SAP, 1, START, END, "daily")
+    assert {"Sap Flux Density (sum)", "Sap Flux Density (min)", "Sap Flux Density (max)"} <= set(rolled.fields)
+    smoothened = data_rollup.load_smoothened(Configs.ALMOND, SAP, 1, START, END, timedelta(days=1), "daily", ("mean", "max"))
+    assert not any(field.startswith("Sap Flux Density") for field in smoothened.fields)
+
+def test_results_match_the_ones_without_rollups(monkeypatch):
+    monkeypatch.setattr(wrapper, "_results", None)
+    without = Wrapper.parse_process_analyze(Configs.ALMOND, SAP, START, END, smoothening_interval=timedelta(hours=1), sensorid=1, use_rollups=False).data
+    rolled = Wrapper.parse_process_analyze(Configs.ALMOND, SAP, START, END, smoothening_interval=timedelta(hours=1), sensorid=1, use_rollups=True).data
+    assert len(rolled) == len(without)
+    for field in ("Value 1", "ΔT", "minT", "K", "Sap Flux Density", "Relative Moisture %"):
+        np.testing.assert_allclose(rolled[field], without[field], rtol=1e-9, equal_nan=True, err_msg=field)
@@ -0,0 +1,39 @@
+"""tests of data_sync.py"""
+from datetime import datetime
+
+import pytest
+
+from data_fetcher import Fetcher
+from data_parser import Parser
+from data_store import TimeSeriesStore
+from data_sync import Syncer
+from definitions import Configs, Data_Sensor_Type
+
+SAP = Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR
+
+@pytest.fixture
+def syncer(stub, tmp_path):
+    Parser.memoize(False)
+    with Fetcher() as fetcher:
+        yield Syncer(Configs.PISTACHIO, fetcher=fetcher, store=TimeSeriesStore(Configs.PISTACHIO, store_dir=str(tmp_path)))
+    Parser.memoize(True)
+
+def test_newer_readings_are_appended(syncer):
+    added = syncer.sync(SAP, 1, since=datetime(2022, 7, 1), until=datetime(2022, 7, 31))
+    records_path = syncer.store.get_paths(SAP, 1)[0]
+    with open(records_path, mode='rb') as recordsfile:
+        before = recordsfile.read()
+    added += syncer.sync(SAP, 1, since=datetime(2022, 7, 1), until=datetime(2022, 8, 31))
+    with open(records_path, mode='rb') as recordsfile:
+        after = recordsfile.read()
+    assert after.startswith(before) and len(after) > len(before) #only appended to
+    data = syncer.load(SAP, 1)
+    assert len(data) == added == syncer.get_state(SAP, 1)["rows"]
+    assert data.is_sorted() and str(data.timestamps[0]) == "2022-07-01T00:00:00" and str(data.timestamps[-1]) == "2022-08-31T23:50:00"
+
+def test_older_readings_are_backfilled(syncer):
+    syncer.sync(SAP, 1, since=datetime(2022, 8, 1), until=datetime(2022, 8, 31))
+    added = syncer.sync(SAP, 1, since=datetime(2022, 7, 1), until=datetime(2022, 8, 31))
+    data = syncer.load(SAP, 1)
+    assert added == 31 * 144 and len(data) == 62 * 144
+    assert data.is_sorted() and str(data.timestamps[0]) == "2022-07-01T00:00:00"
@@ -0,0 +1,61 @@
+"""tests of data_tail.py"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import data_tail
+from data_table import TIME_FIELD, DataTable
+from data_tail import Tail
+from definitions import Configs, Data_Sensor_Type
+
+SAP = Data_Sensor_Type.SAP_AND_MOISTURE_SENSOR
+HEADER = "Date and Time,Field,Sensor ID,Value 1,Value 2\n"
+
+def row(timestamp:datetime) -> str:
+    return "{},Stevinson Almond,TREW 1,1080,2500\n".format(timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+
+@pytest.fixture
+def current_file(tmp_path, monkeypatch):
+    """path of this month's almond file, which the catalog doesn't know about"""
+    path = tmp_path / "current.csv"
+    monkeypatch.setattr(Configs, "get_path", lambda self, *args, **kwargs: str(path))
+    monkeypatch.setattr(data_tail, "find_periods", lambda *args: [])
+    return path
+
+def test_current_file_is_read_without_the_catalog(current_file):
+    midnight = datetime.combine(datetime.now().date(), datetime.min.time())
+    current_file.write_text(HEADER + row(midnight + timedelta(seconds=1)) + row(midnight + timedelta(seconds=2)))
+    tail = Tail(Configs.ALMOND, SAP, 1)
+    assert len(tail.day_readings) == 2
+    assert tail.poll() == 0
+    with open(current_file, mode='a', encoding='utf-8') as datafile:
+        datafile.write(row(midnight + timedelta(seconds=3)))
+    assert tail.poll() == 1
+    assert tail.last == np.datetime64(midnight + timedelta(seconds=3), 's')
+
+def test_buckets_outside_the_window_are_dropped(current_file):
+    since = datetime.combine(datetime.now().date(), datetime.min.time()) - timedelta(days=5)
+    tail = Tail(Configs.ALMOND, Data_Sensor_Type.WEATHER_STATION, since=since, window=timedelta(days=2))
+    for day in range(6):
+        tail.update(DataTable({TIME_FIELD: np.array([since + timedelta(days=day, hours=12)], dtype='datetime64[s]'),
+                                "Temperature": np.array([float(day)])}))
+    assert tail.get_buckets().timestamps[0] == np.datetime64(since + timedelta(days=3, hours=12), 's')
+    assert len(tail.get_buckets()) == 3
+
+def test_half_written_rows_are_read_once_written(current_file):
+    midnight = datetime.combine(datetime.now().date(), datetime.min.time())
+    current_file.write_text(HEADER + row(midnight + timedelta(seconds=1)) + row(midnight + timedelta(seconds=2))[:25])
+    tail = Tail(Configs.ALMOND, SAP, 1)
+    assert len(tail.day_readings) == 1
+    with open(current_file, mode='a', encoding='utf-8') as datafile:
+        datafile.write(row(midnight + timedelta(seconds=2))[25:])
+    assert tail.poll() == 1
+
+def test_newest_first_files_are_read(current_file):
+    midnight = datetime.combine(datetime.now().date(), datetime.min.time())
+    current_file.write_text(HEADER + row(midnight + timedelta(seconds=2)) + row(midnight + timedelta(seconds=1)).rstrip("\n"))
+    tail = Tail(Configs.ALMOND, SAP, 1)
+    assert len(tail.day_readings) == 2
+    current_file.write_text(HEADER + row(midnight + timedelta(seconds=3)) + row(midnight + timedelta(seconds=2)) + row(midnight + timedelta(seconds=1)).rstrip("\n"))
+    assert tail.poll() == 1